@@ -10,7 +10,7 @@ import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from flask import Flask, render_template, jsonify, request, send_file, Response, session, redirect, url_for
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 import zipfile
@@ -43,11 +43,21 @@ app.config.from_object(Config)
 app.secret_key = Config.SECRET_KEY
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Database helper
+# Database helper: blocking calls leave the eventlet hub (see dbpool.py)
 def get_db():
+    from dbpool import GreenConnection
+    
     conn = sqlite3.connect(Config.DB_NAME, check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    return conn
+    return GreenConnection(conn)
+
+def page_args():
+    """Cursor arguments of a paged admin list view"""
+    return {
+        'after': request.args.get('after'),
+        'before': request.args.get('before'),
+        'limit': request.args.get('limit', type=int)
+    }
 
 # Initialize database with new tables
 def init_db():
@@ -120,9 +130,19 @@ def init_db():
     conn.commit()
     conn.close()
 
+from pagination import InvalidCursor
+
+@app.errorhandler(InvalidCursor)
+def handle_invalid_cursor(error):
+    """Bad cursors in paged list views are client errors"""
+    return jsonify({'error': str(error)}), 400
+
 # Middleware for admin authentication
 @app.before_request
 def check_auth():
+    from events import start_listener
+    start_listener()
+    
     if request.endpoint in ['admin_login', 'static', 'api_status', 'index']:
         return
     
@@ -243,39 +263,24 @@ def admin_dashboard():
 @app.route('/admin/bots')
 def admin_bots():
     """Admin bot management"""
-    conn = get_db()
-    c = conn.cursor()
-    
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    offset = (page - 1) * per_page
-    
-    # Get all bots with user info
-    c.execute("""
-        SELECT d.*, u.username, u.id as user_id, 
-               n.name as node_name, n.region
-        FROM deployments d
-        LEFT JOIN users u ON d.user_id = u.id
-        LEFT JOIN nodes n ON d.node_id = n.id
-        ORDER BY d.id DESC
-        LIMIT ? OFFSET ?
-    """, (per_page, offset))
-    
-    bots = c.fetchall()
-    
-    # Count total bots
-    c.execute("SELECT COUNT(*) as total FROM deployments")
-    total = c.fetchone()['total']
-    
-    conn.close()
-    
-    total_pages = (total + per_page - 1) // per_page
+    from pagination import keyset_page
+    
+    # Get bots with user info, newest first
+    page = keyset_page(
+        """d.*, u.username, u.id as user_id,
+           n.name as node_name, n.region""",
+        """deployments d
+           LEFT JOIN users u ON d.user_id = u.id
+           LEFT JOIN nodes n ON d.node_id = n.id""",
+        keys=['d.id'],
+        count_source='deployments d',
+        **page_args()
+    )
     
     return render_template('admin_bots.html',
-                         bots=bots,
-                         page=page,
-                         total_pages=total_pages,
-                         total=total)
+                         bots=page['rows'],
+                         pagination=page,
+                         total=page['total'])
 
 @app.route('/admin/bot/<int:bot_id>')
 def admin_bot_detail(bot_id):
@@ -335,46 +340,68 @@ def admin_bot_detail(bot_id):
 
 @app.route('/admin/bot/<int:bot_id>/backup')
 def admin_bot_backup(bot_id):
-    """Download bot script backup"""
-    conn = get_db()
-    c = conn.cursor()
-    
-    c.execute("SELECT filename FROM deployments WHERE id = ?", (bot_id,))
-    bot = c.fetchone()
-    
-    if not bot:
-        return "Bot not found", 404
-    
-    file_path = Path(Config.PROJECT_DIR) / bot['filename']
-    
-    if not file_path.exists():
-        return "Bot file not found", 404
-    
-    # Create backup directory
-    backup_dir = Path(Config.SCRIPT_BACKUPS)
-    backup_dir.mkdir(exist_ok=True)
-    
-    # Create backup with timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f"bot_{bot_id}_{timestamp}.py"
-    backup_path = backup_dir / backup_filename
-    
-    # Copy file
-    import shutil
-    shutil.copy2(file_path, backup_path)
-    
-    return send_file(backup_path, as_attachment=True)
+    """Download bot script backup (a stored version, or a new one if the script changed)"""
+    from script_store import snapshot_bot, build_download
+    
+    version = request.args.get('version', type=int)
+    if version:
+        conn = get_db()
+        c = conn.cursor()
+        c.execute("SELECT id FROM script_backups WHERE bot_id = ? AND version = ?", (bot_id, version))
+        backup = c.fetchone()
+        conn.close()
+        if not backup:
+            return "Backup version not found", 404
+    else:
+        backup, error = snapshot_bot(bot_id)
+        if not backup:
+            return error, 404
+    
+    name, data = build_download(backup['id'])
+    return send_file(io.BytesIO(data), as_attachment=True, download_name=name)
 
 @app.route('/admin/bot/<int:bot_id>/test')
 def admin_bot_test(bot_id):
-    """Test run bot"""
-    from bot import test_run_bot
+    """Queue a sandboxed test run; poll admin_test_run for the result"""
+    from test_runner import submit_test, format_test_result
+    
+    run, future = submit_test(bot_id)
+    if run is None:
+        return jsonify({'success': False, 'message': future}), 404
+    
+    if future is None:
+        # Unchanged script: answered from the last finished run
+        return jsonify({
+            'success': run['status'] == 'passed',
+            'run_id': run['id'],
+            'status': run['status'],
+            'cached': True,
+            'message': format_test_result(run)
+        })
     
-    success, message = test_run_bot(bot_id)
+    return jsonify({
+        'success': True,
+        'run_id': run['id'],
+        'status': run['status'],
+        'poll': url_for('admin_test_run', run_id=run['id'])
+    }), 202
+
+@app.route('/admin/test/<int:run_id>')
+def admin_test_run(run_id):
+    """Status and output so far of a test run"""
+    from test_runner import get_test_run, format_test_result
     
+    run = get_test_run(run_id)
+    if not run:
+        return jsonify({'success': False, 'message': 'Test run not found'}), 404
+    
+    finished = run['status'] in ('passed', 'failed', 'timeout', 'error')
     return jsonify({
-        'success': success,
-        'message': message
+        'success': run['status'] == 'passed' if finished else True,
+        'run_id': run_id,
+        'status': run['status'],
+        'finished': finished,
+        'message': format_test_result(run) if finished else (run['output'] or '')
     })
 
 @app.route('/admin/bot/<int:bot_id>/analytics')
@@ -409,23 +436,25 @@ def admin_bot_analytics(bot_id):
 @app.route('/admin/marketplace')
 def admin_marketplace():
     """Admin marketplace management"""
+    from marketplace import get_marketplace_stats
+    from pagination import keyset_page
+    
+    # Marketplace listings, with order counts kept by triggers
+    page = keyset_page(
+        """mb.*, d.bot_name, u.username as seller_username,
+           COALESCE(s.orders, 0) as total_purchases""",
+        """marketplace_bots mb
+           JOIN deployments d ON mb.bot_id = d.id
+           JOIN users u ON mb.seller_id = u.id
+           LEFT JOIN marketplace_listing_stats s ON mb.id = s.listing_id""",
+        keys=['mb.created_at', 'mb.id'],
+        count_source='marketplace_bots mb',
+        **page_args()
+    )
+    
     conn = get_db()
     c = conn.cursor()
     
-    # Get all marketplace listings
-    c.execute("""
-        SELECT mb.*, d.bot_name, u.username as seller_username,
-               COUNT(mp.id) as total_purchases
-        FROM marketplace_bots mb
-        JOIN deployments d ON mb.bot_id = d.id
-        JOIN users u ON mb.seller_id = u.id
-        LEFT JOIN marketplace_purchases mp ON mb.id = mp.listing_id
-        GROUP BY mb.id
-        ORDER BY mb.created_at DESC
-    """)
-    
-    listings = c.fetchall()
-    
     # Get recent purchases
     c.execute("""
         SELECT mp.*, mb.title, u.username as buyer_username
@@ -441,8 +470,10 @@ def admin_marketplace():
     conn.close()
     
     return render_template('admin_marketplace.html',
-                         listings=listings,
-                         purchases=purchases)
+                         listings=page['rows'],
+                         pagination=page,
+                         purchases=purchases,
+                         stats=get_marketplace_stats())
 
 @app.route('/admin/marketplace/create', methods=['POST'])
 def admin_create_listing():
@@ -489,6 +520,9 @@ def admin_create_listing():
     conn.commit()
     conn.close()
     
+    from marketplace import invalidate_marketplace_cache
+    invalidate_marketplace_cache()
+    
     return jsonify({'success': True, 'message': 'Listing created successfully'})
 
 @app.route('/admin/marketplace/<int:listing_id>/update', methods=['POST'])
@@ -517,6 +551,9 @@ def admin_update_listing(listing_id):
     conn.commit()
     conn.close()
     
+    from marketplace import invalidate_marketplace_cache
+    invalidate_marketplace_cache()
+    
     return jsonify({'success': True, 'message': 'Listing updated successfully'})
 
 @app.route('/admin/marketplace/<int:listing_id>/delete')
@@ -529,37 +566,39 @@ def admin_delete_listing(listing_id):
     conn.commit()
     conn.close()
     
+    from marketplace import invalidate_marketplace_cache
+    invalidate_marketplace_cache()
+    
     return jsonify({'success': True, 'message': 'Listing deleted successfully'})
 
 @app.route('/admin/orders')
 def admin_orders():
     """Admin order management"""
-    conn = get_db()
-    c = conn.cursor()
+    from pagination import keyset_page
     
     status_filter = request.args.get('status', 'all')
-    
-    query = """
-        SELECT mp.*, mb.title, u.username as buyer_username,
-               s.username as seller_username
-        FROM marketplace_purchases mp
-        JOIN marketplace_bots mb ON mp.listing_id = mb.id
-        JOIN users u ON mp.buyer_id = u.id
-        JOIN users s ON mb.seller_id = s.id
-    """
-    
+    where, params = [], []
     if status_filter != 'all':
-        query += f" WHERE mp.status = '{status_filter}'"
-    
-    query += " ORDER BY mp.purchased_at DESC"
-    
-    c.execute(query)
-    orders = c.fetchall()
-    
-    conn.close()
+        where.append("mp.status = ?")
+        params.append(status_filter)
+    
+    page = keyset_page(
+        """mp.*, mb.title, u.username as buyer_username,
+           s.username as seller_username""",
+        """marketplace_purchases mp
+           JOIN marketplace_bots mb ON mp.listing_id = mb.id
+           JOIN users u ON mp.buyer_id = u.id
+           JOIN users s ON mb.seller_id = s.id""",
+        keys=['mp.purchased_at', 'mp.id'],
+        where=where,
+        params=params,
+        count_source='marketplace_purchases mp',
+        **page_args()
+    )
     
     return render_template('admin_orders.html',
-                         orders=orders,
+                         orders=page['rows'],
+                         pagination=page,
                          status_filter=status_filter)
 
 @app.route('/admin/order/<int:order_id>/update', methods=['POST'])
@@ -595,27 +634,34 @@ def admin_update_order(order_id):
     conn.commit()
     conn.close()
     
+    if new_status == 'completed' and order:
+        from events import publish
+        publish('order_approved', purchase_id=order_id, buyer_id=order['buyer_id'],
+                listing_id=order['listing_id'])
+    
     return jsonify({'success': True, 'message': f'Order marked as {new_status}'})
 
 @app.route('/admin/trials')
 def admin_trials():
     """Admin bot trial management"""
+    from pagination import keyset_page
+    
+    # Get trials, newest first
+    page = keyset_page(
+        """bt.*, d.bot_name, u.username,
+           u2.username as created_by_username""",
+        """bot_trials bt
+           JOIN deployments d ON bt.bot_id = d.id
+           JOIN users u ON bt.user_id = u.id
+           LEFT JOIN users u2 ON d.user_id = u2.id""",
+        keys=['bt.started_at', 'bt.id'],
+        count_source='bot_trials bt',
+        **page_args()
+    )
+    
     conn = get_db()
     c = conn.cursor()
     
-    # Get active trials
-    c.execute("""
-        SELECT bt.*, d.bot_name, u.username, 
-               u2.username as created_by_username
-        FROM bot_trials bt
-        JOIN deployments d ON bt.bot_id = d.id
-        JOIN users u ON bt.user_id = u.id
-        LEFT JOIN users u2 ON d.user_id = u2.id
-        ORDER BY bt.started_at DESC
-    """)
-    
-    trials = c.fetchall()
-    
     # Get bot options for creating trials
     c.execute("""
         SELECT d.id, d.bot_name, u.username
@@ -630,7 +676,8 @@ def admin_trials():
     conn.close()
     
     return render_template('admin_trials.html',
-                         trials=trials,
+                         trials=page['rows'],
+                         pagination=page,
                          admin_bots=admin_bots)
 
 @app.route('/admin/trial/create', methods=['POST'])
@@ -687,21 +734,18 @@ def admin_create_trial():
 @app.route('/admin/payments')
 def admin_payments():
     """Admin payment management"""
-    conn = get_db()
-    c = conn.cursor()
-    
-    c.execute("""
-        SELECT pl.*, u.username
-        FROM payment_logs pl
-        LEFT JOIN users u ON pl.user_id = u.id
-        ORDER BY pl.created_at DESC
-        LIMIT 100
-    """)
-    
-    payments = c.fetchall()
-    
-    # Payment statistics
-    c.execute("""
+    from pagination import keyset_page, cached_row
+    
+    page = keyset_page(
+        "pl.*, u.username",
+        "payment_logs pl LEFT JOIN users u ON pl.user_id = u.id",
+        keys=['pl.created_at', 'pl.id'],
+        count_source='payment_logs pl',
+        **page_args()
+    )
+    
+    # Payment statistics, recomputed at most once per cache period
+    stats = cached_row("""
         SELECT 
             COUNT(*) as total_payments,
             SUM(CASE WHEN status = 'completed' THEN amount ELSE 0 END) as total_revenue,
@@ -709,12 +753,9 @@ def admin_payments():
         FROM payment_logs
     """)
     
-    stats = dict(c.fetchone())
-    
-    conn.close()
-    
     return render_template('admin_payments.html',
-                         payments=payments,
+                         payments=page['rows'],
+                         pagination=page,
                          stats=stats,
                          payment_methods=Config.PAYMENT_METHODS)
 
@@ -773,98 +814,98 @@ def admin_nodes():
     """)
     
     stats = dict(c.fetchone())
-    
+
+    # Heartbeat health (latency in ms, phi = failure suspicion) and failover history
+    c.execute("SELECT AVG(heartbeat_latency) as avg_latency FROM nodes WHERE heartbeat_latency IS NOT NULL")
+    stats['avg_heartbeat_latency'] = round(c.fetchone()['avg_latency'] or 0, 1)
+    stats['down_nodes'] = sum(1 for node in nodes if node['status'] == 'down')
+
+    c.execute("""
+        SELECT f.*, n.name as node_name
+        FROM node_failovers f
+        LEFT JOIN nodes n ON f.node_id = n.id
+        ORDER BY f.id DESC
+        LIMIT 50
+    """)
+    failovers = c.fetchall()
+
     conn.close()
-    
+
     return render_template('admin_nodes.html',
                          nodes=nodes,
-                         stats=stats)
+                         stats=stats,
+                         failovers=failovers)
+
+@app.route('/admin/backups')
+def admin_backups():
+    """Database backup catalog; restore with `python backup.py restore`"""
+    from pagination import keyset_page, cached_row
+
+    page = keyset_page(
+        """id, kind, base_id, status, filename, size, db_size, pages, changed_pages,
+           duration, max_stall_ms, restarts, integrity, checksum, row_counts, error, created_at""",
+        "backup_runs",
+        keys=['id'],
+        **page_args()
+    )
+    backups = page['rows']
+    for entry in backups:
+        entry['row_counts'] = json.loads(entry['row_counts']) if entry['row_counts'] else None
+        entry['available'] = bool(entry['filename']) and (Path(Config.BACKUP_DIR) / entry['filename']).exists()
+
+    stats = cached_row("""
+        SELECT COUNT(CASE WHEN status = 'ok' THEN 1 END) as total,
+               COUNT(CASE WHEN status != 'ok' THEN 1 END) as failed,
+               COALESCE(SUM(CASE WHEN status = 'ok' THEN size END), 0) as total_size,
+               MAX(CASE WHEN status = 'ok' THEN created_at END) as last_backup,
+               ROUND(COALESCE(AVG(CASE WHEN status = 'ok' THEN duration END), 0), 3) as avg_duration,
+               COALESCE(MAX(CASE WHEN status = 'ok' THEN max_stall_ms END), 0) as max_stall_ms
+        FROM backup_runs
+    """)
+    return jsonify({
+        'backups': backups,
+        'next': page['next'],
+        'prev': page['prev'],
+        'stats': stats
+    })
 
 @app.route('/admin/users')
 def admin_users():
     """Admin user management"""
-    conn = get_db()
-    c = conn.cursor()
-    
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    offset = (page - 1) * per_page
+    from pagination import keyset_page
     
-    c.execute("""
-        SELECT u.*, 
-               COUNT(d.id) as bot_count,
-               COUNT(CASE WHEN d.status = 'Running' THEN 1 END) as running_bots
-        FROM users u
-        LEFT JOIN deployments d ON u.id = d.user_id
-        GROUP BY u.id
-        ORDER BY u.id DESC
-        LIMIT ? OFFSET ?
-    """, (per_page, offset))
-    
-    users = c.fetchall()
-    
-    c.execute("SELECT COUNT(*) as total FROM users")
-    total = c.fetchone()['total']
-    
-    conn.close()
-    
-    total_pages = (total + per_page - 1) // per_page
+    # Bot counts are denormalized onto users by the deployments triggers
+    page = keyset_page(
+        "u.*, u.total_bots_deployed as bot_count",
+        "users u",
+        keys=['u.id'],
+        **page_args()
+    )
     
     return render_template('admin_users.html',
-                         users=users,
-                         page=page,
-                         total_pages=total_pages,
-                         total=total)
+                         users=page['rows'],
+                         pagination=page,
+                         total=page['total'])
 
 @app.route('/admin/analytics')
 def admin_analytics():
     """Admin analytics dashboard"""
-    conn = get_db()
-    c = conn.cursor()
-    
-    # Daily user registrations (last 30 days)
-    c.execute("""
-        SELECT DATE(join_date) as date, COUNT(*) as count
-        FROM users
-        WHERE join_date >= date('now', '-30 days')
-        GROUP BY DATE(join_date)
-        ORDER BY date
-    """)
+    from rollups import get_analytics
     
-    user_registrations = c.fetchall()
+    # Daily signups and deployments, monthly revenue and system snapshots,
+    # all read from the rollup tables
+    analytics = get_analytics()
     
-    # Daily bot deployments (last 30 days)
-    c.execute("""
-        SELECT DATE(created_at) as date, COUNT(*) as count
-        FROM deployments
-        WHERE created_at >= date('now', '-30 days')
-        GROUP BY DATE(created_at)
-        ORDER BY date
-    """)
-    
-    bot_deployments = c.fetchall()
-    
-    # Revenue by month
-    c.execute("""
-        SELECT strftime('%Y-%m', created_at) as month, 
-               SUM(amount) as revenue
-        FROM payment_logs
-        WHERE status = 'completed'
-        GROUP BY strftime('%Y-%m', created_at)
-        ORDER BY month
-        LIMIT 12
-    """)
-    
-    monthly_revenue = c.fetchall()
+    conn = get_db()
+    c = conn.cursor()
     
     # Top selling bots
     c.execute("""
-        SELECT mb.title, COUNT(mp.id) as sales, SUM(mp.price) as revenue
-        FROM marketplace_purchases mp
-        JOIN marketplace_bots mb ON mp.listing_id = mb.id
-        WHERE mp.status = 'completed'
-        GROUP BY mb.id
-        ORDER BY sales DESC
+        SELECT mb.title, s.completed as sales, s.revenue
+        FROM marketplace_listing_stats s
+        JOIN marketplace_bots mb ON s.listing_id = mb.id
+        WHERE s.completed > 0
+        ORDER BY s.completed DESC
         LIMIT 10
     """)
     
@@ -873,48 +914,58 @@ def admin_analytics():
     conn.close()
     
     return render_template('admin_analytics.html',
-                         user_registrations=user_registrations,
-                         bot_deployments=bot_deployments,
-                         monthly_revenue=monthly_revenue,
+                         user_registrations=analytics['signups'],
+                         bot_deployments=analytics['deployments'],
+                         monthly_revenue=analytics['monthly_revenue'],
+                         system_history=analytics['system'],
                          top_bots=top_bots)
 
 # API Endpoints
 @app.route('/api/marketplace')
 def api_marketplace():
-    """API for marketplace listings"""
-    conn = get_db()
-    c = conn.cursor()
+    """API for marketplace listings, one page at a time (follow next_cursor)"""
+    from marketplace import get_listings_page
     
     category = request.args.get('category', 'all')
     sort = request.args.get('sort', 'newest')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
     
-    query = """
-        SELECT mb.*, d.bot_name, u.username as seller_username,
-               d.filename, d.status as bot_status
-        FROM marketplace_bots mb
-        JOIN deployments d ON mb.bot_id = d.id
-        JOIN users u ON mb.seller_id = u.id
-        WHERE mb.status = 'available'
-    """
-    
-    if category != 'all':
-        query += f" AND mb.category = '{category}'"
+    try:
+        etag, body = get_listings_page(category, sort, cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if sort == 'price_low':
-        query += " ORDER BY mb.price ASC"
-    elif sort == 'price_high':
-        query += " ORDER BY mb.price DESC"
-    elif sort == 'popular':
-        query += " ORDER BY mb.purchases DESC"
-    else:  # newest
-        query += " ORDER BY mb.created_at DESC"
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
     
-    c.execute(query)
-    listings = c.fetchall()
-    
-    conn.close()
+    return Response(body, mimetype='application/json', headers=headers)
+
+@app.route('/api/marketplace/stats')
+def api_marketplace_stats():
+    """API for featured listings, top listings per category and category counts"""
+    from marketplace import get_marketplace_stats
     
-    return jsonify([dict(row) for row in listings])
+    return jsonify(get_marketplace_stats())
+
+@app.route('/api/marketplace/search')
+def api_marketplace_search():
+    """API for ranked full-text search over marketplace listings"""
+    from marketplace import search_listings
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+
+    result = search_listings(
+        query,
+        category=request.args.get('category', 'all'),
+        page=request.args.get('page', 1, type=int),
+        limit=request.args.get('limit', type=int)
+    )
+    result['query'] = query
+    return jsonify(result)
 
 @app.route('/api/bot/<int:bot_id>/details')
 def api_bot_details(bot_id):
@@ -1004,6 +1055,13 @@ def api_purchase():
     conn.commit()
     conn.close()
     
+    from marketplace import invalidate_marketplace_cache
+    invalidate_marketplace_cache()
+    
+    from events import publish
+    publish('purchase_created', purchase_id=purchase_id, listing_id=data['listing_id'],
+            buyer_id=data['buyer_id'], price=listing['price'], title=listing['title'])
+    
     return jsonify({
         'success': True,
         'message': 'Purchase recorded successfully',
@@ -1014,31 +1072,42 @@ def api_purchase():
 @socketio.on('connect')
 def handle_connect():
     """Handle WebSocket connection"""
+    from live import start_broadcaster
+    start_broadcaster(socketio)
     emit('connected', {'message': 'Connected to ZEN X Hosting'})
 
-@socketio.on('bot_status_update')
-def handle_bot_status_update(data):
-    """Handle bot status updates"""
-    # Broadcast to all clients
-    emit('bot_status_changed', data, broadcast=True)
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Join a live update room: global, or a user's or bot's room (admin only)"""
+    from live import room_for, current_stats
+    
+    room = room_for(data)
+    if room is None:
+        emit('subscribe_error', {'error': 'Unknown room'})
+        return
+    if room != 'global' and 'admin_logged_in' not in session:
+        emit('subscribe_error', {'error': 'Unauthorized', 'room': room})
+        return
+    
+    join_room(room)
+    emit('subscribed', {'room': room})
+    if room == 'global':
+        emit('system_stats', current_stats())
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    """Leave a live update room"""
+    from live import room_for
+    
+    room = room_for(data)
+    if room:
+        leave_room(room)
 
 @socketio.on('system_stats_update')
 def handle_system_stats_update():
-    """Send system stats update"""
-    conn = get_db()
-    c = conn.cursor()
-    
-    c.execute("""
-        SELECT 
-            (SELECT COUNT(*) FROM deployments WHERE status='Running') as running_bots,
-            (SELECT COUNT(*) FROM users) as total_users,
-            (SELECT COUNT(*) FROM nodes WHERE status='active') as active_nodes
-    """)
-    
-    stats = dict(c.fetchone())
-    conn.close()
-    
-    emit('system_stats', stats)
+    """Send the broadcaster's latest system stats"""
+    from live import current_stats
+    emit('system_stats', current_stats())
 
 if __name__ == '__main__':
     # Create necessary directories
@@ -1352,25 +1421,33 @@ def create_default_templates():
         </div>
     </div>
     
+    <script src="https://cdn.socket.io/4.7.5/socket.io.min.js"></script>
     <script>
-        // Fetch live stats
-        async function updateStats() {
-            try {
-                const response = await fetch('/status');
-                const data = await response.json();
-                
-                document.getElementById('total-bots').textContent = data.stats.running_bots;
-                document.getElementById('total-users').textContent = data.stats.total_users;
-            } catch (error) {
-                console.log('Error fetching stats:', error);
+        function showStats(stats) {
+            if (stats.running_bots !== undefined) {
+                document.getElementById('total-bots').textContent = stats.running_bots;
+            }
+            if (stats.total_users !== undefined) {
+                document.getElementById('total-users').textContent = stats.total_users;
+            }
+            if (stats.active_nodes !== undefined) {
+                document.getElementById('nodes').textContent = stats.active_nodes;
             }
         }
         
-        // Update stats on load
-        updateStats();
-        
-        // Update every 30 seconds
-        setInterval(updateStats, 30000);
+        // Live stats pushed by the server; deltas carry only what changed
+        if (window.io) {
+            const socket = io();
+            socket.on('connect', () => socket.emit('subscribe', {room: 'global'}));
+            socket.on('system_stats', showStats);
+            socket.on('system_stats_delta', showStats);
+        } else {
+            // Socket.IO client unavailable: load the stats once
+            fetch('/status')
+                .then(response => response.json())
+                .then(data => showStats(data.stats))
+                .catch(error => console.log('Error fetching stats:', error));
+        }
     </script>
 </body>
 </html>
@@ -1589,5 +1666,73 @@ def create_default_templates():
     """
     
     (templates_dir / 'admin_dashboard.html').write_text(dashboard_html)
-    
+
+    nodes_html = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Nodes - ZEN X Hosting</title>
+    <style>
+        body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 20px; }
+        table { border-collapse: collapse; width: 100%; margin-bottom: 30px; }
+        th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+        th { background: #667eea; color: white; }
+        .down { color: #e74c3c; font-weight: bold; }
+        .active { color: #27ae60; }
+    </style>
+</head>
+<body>
+    <h1>Nodes</h1>
+    <p>
+        {{ stats.active_nodes or 0 }}/{{ stats.total_nodes or 0 }} active,
+        {{ stats.down_nodes }} down &middot;
+        load {{ stats.current_load or 0 }}/{{ stats.total_capacity or 0 }} &middot;
+        avg heartbeat {{ stats.avg_heartbeat_latency }} ms
+    </p>
+
+    <table>
+        <tr><th>ID</th><th>Name</th><th>Region</th><th>Status</th><th>Load</th>
+            <th>Address</th><th>Heartbeat (ms)</th><th>Phi</th><th>Last check</th></tr>
+        {% for node in nodes %}
+        <tr>
+            <td>{{ node.id }}</td>
+            <td>{{ node.name }}</td>
+            <td>{{ node.region }}</td>
+            <td class="{{ node.status }}">{{ node.status }}</td>
+            <td>{{ node.current_load or 0 }}/{{ node.capacity or 0 }}</td>
+            <td>{{ node.address or 'local' }}</td>
+            <td>{{ node.heartbeat_latency if node.heartbeat_latency is not none else '-' }}</td>
+            <td>{{ '%.1f'|format(node.phi) if node.phi is not none else '-' }}</td>
+            <td>{{ node.last_check or '-' }}</td>
+        </tr>
+        {% endfor %}
+    </table>
+
+    <h2>Failovers</h2>
+    <table>
+        <tr><th>Node</th><th>Detected</th><th>Phi</th><th>Bots</th><th>Moved</th><th>Failed</th>
+            <th>Finished</th><th>Recovered</th></tr>
+        {% for failover in failovers %}
+        <tr>
+            <td>{{ failover.node_name or failover.node_id }}</td>
+            <td>{{ failover.detected_at }}</td>
+            <td>{{ failover.phi }}</td>
+            <td>{{ failover.bots }}</td>
+            <td>{{ failover.moved }}</td>
+            <td>{{ failover.failed }}</td>
+            <td>{{ failover.finished_at or '-' }}</td>
+            <td>{{ failover.recovered_at or '-' }}</td>
+        </tr>
+        {% else %}
+        <tr><td colspan="8">No failovers recorded</td></tr>
+        {% endfor %}
+    </table>
+</body>
+</html>
+    """
+
+    (templates_dir / 'admin_nodes.html').write_text(nodes_html)
+
     print("✅ Default templates created successfully")
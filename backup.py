@@ -0,0 +1,424 @@
+"""
+ZEN X HOST BOT v4.0 - Database Backups
+Online snapshots with sqlite3's backup API, verified and stream-compressed
+
+The live database is copied a few pages at a time through
+Connection.backup, so the bot and the web panel keep writing while a
+snapshot is taken; no global lock is held. The snapshot is checked with
+PRAGMA integrity_check before it is kept. With BACKUP_INCREMENTAL on, runs
+between full snapshots only store the pages that changed since the
+previous run, which restore_backup() applies on top of the last full one.
+Taken every BACKUP_SEGMENT_INTERVAL seconds, those increments are the
+archived segments point-in-time restores are built from.
+
+    python backup.py list [--json]
+    python backup.py run [--full]
+    python backup.py restore TARGET [--id N | --at "YYYY-MM-DD HH:MM:SS"]
+
+Files in BACKUP_DIR:
+    zenx_db_full_<ts>.db.gz    whole database
+    zenx_db_incr_<ts>.pages.gz header line + (page number, page) records
+    zenx_db_latest.pages       run id + page digests of the newest snapshot
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import struct
+import shutil
+import sqlite3
+import argparse
+import hashlib
+import logging
+from pathlib import Path
+from datetime import datetime
+
+from main import Config, execute_db, get_db, db_lock
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+DIGEST_SIZE = 16
+MANIFEST_NAME = 'zenx_db_latest.pages'
+PAGE_RECORD = struct.Struct('>I')
+MANIFEST_HEADER = struct.Struct('>Q')  # id of the run the digests belong to
+
+
+class BackupRestarted(Exception):
+    """The source kept changing under a stepped backup"""
+
+
+# ==================== SNAPSHOT ====================
+
+def snapshot_database(target_path):
+    """Copy the live database to target_path page by page; returns timing stats"""
+    stats = {'restarts': 0, 'steps': 0, 'max_stall_ms': 0.0, 'mode': 'stepped'}
+    source = sqlite3.connect(Config.DB_NAME, check_same_thread=False)
+    target = sqlite3.connect(str(target_path))
+
+    state = {'last': time.perf_counter(), 'remaining': None, 'first': True}
+
+    def progress(status, remaining, total):
+        now = time.perf_counter()
+        # Each step holds a read transaction on the source: that's the most a writer can wait
+        step = now - state['last'] - (0 if state['first'] else Config.BACKUP_STEP_SLEEP)
+        stats['max_stall_ms'] = max(stats['max_stall_ms'], step * 1000)
+        stats['steps'] += 1
+        if state['remaining'] is not None and remaining > state['remaining']:
+            # Another connection wrote to the database, so SQLite started over
+            stats['restarts'] += 1
+            if stats['restarts'] > Config.BACKUP_MAX_RESTARTS:
+                raise BackupRestarted()
+        state.update(last=now, remaining=remaining, first=False)
+
+    started = time.perf_counter()
+    try:
+        try:
+            source.backup(target, pages=Config.BACKUP_PAGES_PER_STEP, progress=progress,
+                          sleep=Config.BACKUP_STEP_SLEEP)
+        except BackupRestarted:
+            # Too busy to finish in steps: take it in one read transaction, which
+            # in WAL mode still doesn't block writers
+            stats['mode'] = 'single'
+            step_start = time.perf_counter()
+            source.backup(target)
+            stats['max_stall_ms'] = max(stats['max_stall_ms'], (time.perf_counter() - step_start) * 1000)
+
+        # Make the copy self-contained (no -wal/-shm companions)
+        target.execute("PRAGMA journal_mode=DELETE")
+        stats['page_size'] = target.execute("PRAGMA page_size").fetchone()[0]
+        stats['pages'] = target.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+    stats['duration'] = time.perf_counter() - started
+    stats['max_stall_ms'] = round(stats['max_stall_ms'], 2)
+    return stats
+
+
+def verify_database(path):
+    """Run PRAGMA integrity_check on a database file; returns its first result line"""
+    conn = sqlite3.connect(f"file:{Path(path).resolve()}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def count_rows(path):
+    """Row count of every table in a database file"""
+    conn = sqlite3.connect(f"file:{Path(path).resolve()}?mode=ro", uri=True)
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        conn.close()
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_digests(path, page_size):
+    """Digest of every page of a database file, concatenated"""
+    digests = bytearray()
+    with open(path, 'rb') as f:
+        for page in iter(lambda: f.read(page_size), b''):
+            digests += hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+    return bytes(digests)
+
+
+def compress_file(source_path, target_path):
+    """Gzip a file in fixed-size chunks; the output appears atomically"""
+    partial = Path(f"{target_path}.partial")
+    with open(source_path, 'rb') as src, gzip.open(partial, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(partial, target_path)
+
+
+def write_page_delta(snapshot_path, target_path, page_size, pages, changed, base_id):
+    """Store only the changed pages of a snapshot"""
+    partial = Path(f"{target_path}.partial")
+    header = {'format': 1, 'page_size': page_size, 'page_count': pages, 'base': base_id}
+    with open(snapshot_path, 'rb') as src, gzip.open(partial, 'wb', compresslevel=6) as dst:
+        dst.write(json.dumps(header).encode() + b'\n')
+        for page_no in changed:
+            src.seek(page_no * page_size)
+            dst.write(PAGE_RECORD.pack(page_no) + src.read(page_size))
+    os.replace(partial, target_path)
+
+
+# ==================== RUNS ====================
+
+def get_previous_run():
+    """Newest successful run the next incremental can build on"""
+    return execute_db("SELECT * FROM backup_runs WHERE status='ok' ORDER BY id DESC LIMIT 1", fetchone=True)
+
+
+def read_manifest(manifest_path, previous):
+    """Page digests of the previous run, or None if the manifest belongs to another run"""
+    if not previous or not manifest_path.exists():
+        return None
+    data = manifest_path.read_bytes()
+    if len(data) < MANIFEST_HEADER.size or MANIFEST_HEADER.unpack_from(data)[0] != previous['id']:
+        return None
+    return data[MANIFEST_HEADER.size:]
+
+
+def choose_kind(previous, manifest, page_size):
+    if not Config.BACKUP_INCREMENTAL or manifest is None or page_size != previous['page_size']:
+        return 'full'
+    since_full = execute_db("SELECT COUNT(*) FROM backup_runs WHERE status='ok' AND kind='incremental' "
+                            "AND id > COALESCE((SELECT MAX(id) FROM backup_runs WHERE status='ok' AND kind='full'), 0)",
+                            fetchone=True)[0]
+    return 'incremental' if since_full < Config.BACKUP_FULL_EVERY else 'full'
+
+
+def run_backup(force_full=False):
+    """Take one verified snapshot; returns the backup file path or None"""
+    backup_dir = Path(Config.BACKUP_DIR)
+    backup_dir.mkdir(exist_ok=True)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    snapshot_path = backup_dir / f".snapshot_{timestamp}.db"
+    manifest_path = backup_dir / MANIFEST_NAME
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    try:
+        stats = snapshot_database(snapshot_path)
+
+        integrity = verify_database(snapshot_path)
+        if integrity != 'ok':
+            raise ValueError(f"integrity_check failed: {integrity}")
+        row_counts = count_rows(snapshot_path)
+
+        previous = get_previous_run()
+        old = read_manifest(manifest_path, previous)
+        kind = 'full' if force_full else choose_kind(previous, old, stats['page_size'])
+        digests = page_digests(snapshot_path, stats['page_size'])
+
+        if kind == 'incremental':
+            changed = [
+                i for i in range(stats['pages'])
+                if digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] != old[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]
+            ]
+            backup_path = backup_dir / f"zenx_db_incr_{timestamp}.pages.gz"
+            write_page_delta(snapshot_path, backup_path, stats['page_size'], stats['pages'], changed, previous['id'])
+            base_id = previous['id']
+        else:
+            changed = range(stats['pages'])
+            backup_path = backup_dir / f"zenx_db_full_{timestamp}.db.gz"
+            compress_file(snapshot_path, backup_path)
+            base_id = None
+
+        with db_lock:
+            conn = get_db()
+            try:
+                cursor = conn.execute("""
+                    INSERT INTO backup_runs
+                    (kind, filename, base_id, status, db_size, size, page_size, pages, changed_pages,
+                     duration, max_stall_ms, restarts, mode, integrity, checksum, row_counts, created_at)
+                    VALUES (?, ?, ?, 'ok', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (kind, backup_path.name, base_id, snapshot_path.stat().st_size, backup_path.stat().st_size,
+                      stats['page_size'], stats['pages'], len(changed), round(stats['duration'], 3),
+                      stats['max_stall_ms'], stats['restarts'], stats['mode'], integrity,
+                      file_checksum(backup_path), json.dumps(row_counts), created_at))
+                run_id = cursor.lastrowid
+                conn.commit()
+            finally:
+                conn.close()
+
+        # Digests for the next incremental, tagged with the run they describe
+        manifest_tmp = backup_dir / f"{MANIFEST_NAME}.partial"
+        manifest_tmp.write_bytes(MANIFEST_HEADER.pack(run_id) + digests)
+        os.replace(manifest_tmp, manifest_path)
+
+        prune_backups()
+
+        logger.info(f"Database backup created: {backup_path.name} ({kind}, {len(changed)}/{stats['pages']} pages, "
+                    f"{stats['duration']:.2f}s, max stall {stats['max_stall_ms']:.1f} ms)")
+        return backup_path
+
+    except Exception as e:
+        logger.error(f"Backup failed: {e}")
+        execute_db("INSERT INTO backup_runs (kind, status, error, created_at) VALUES ('full', 'failed', ?, ?)",
+                   (str(e)[:500], created_at), commit=True)
+        return None
+
+    finally:
+        snapshot_path.unlink(missing_ok=True)
+
+
+def prune_backups():
+    """Keep the newest BACKUP_KEEP_FULL full snapshots and the increments built on them"""
+    fulls = execute_db("SELECT id FROM backup_runs WHERE status='ok' AND kind='full' ORDER BY id DESC",
+                       fetchall=True) or []
+    if len(fulls) <= Config.BACKUP_KEEP_FULL:
+        return
+
+    oldest_kept = fulls[Config.BACKUP_KEEP_FULL - 1]['id']
+    old = execute_db("SELECT id, filename FROM backup_runs WHERE id < ?", (oldest_kept,), fetchall=True) or []
+    for row in old:
+        if row['filename']:
+            (Path(Config.BACKUP_DIR) / row['filename']).unlink(missing_ok=True)
+    execute_db("DELETE FROM backup_runs WHERE id < ?", (oldest_kept,), commit=True)
+
+
+def backup_chain(run_id):
+    """Runs to apply, oldest first, to rebuild the snapshot of run_id"""
+    chain = []
+    row = execute_db("SELECT * FROM backup_runs WHERE id=? AND status='ok'", (run_id,), fetchone=True)
+    while row:
+        chain.append(row)
+        if row['kind'] == 'full':
+            return list(reversed(chain))
+        row = execute_db("SELECT * FROM backup_runs WHERE id=? AND status='ok'", (row['base_id'],), fetchone=True)
+    raise ValueError(f"Backup {run_id} has no complete chain back to a full snapshot")
+
+
+def restore_backup(run_id, target_path):
+    """Rebuild the database as of backup run_id into target_path (never the live file)"""
+    backup_dir = Path(Config.BACKUP_DIR)
+    target_path = Path(target_path)
+    if target_path.resolve() == Path(Config.DB_NAME).resolve():
+        raise ValueError("Restore into a new file, then swap it in while the system is stopped")
+
+    partial = Path(f"{target_path}.partial")
+    chain = backup_chain(run_id)
+
+    for run in chain:
+        path = backup_dir / run['filename']
+        if not path.exists():
+            raise ValueError(f"Backup file missing: {run['filename']}")
+        if run['checksum'] and file_checksum(path) != run['checksum']:
+            raise ValueError(f"Backup file corrupted (checksum mismatch): {run['filename']}")
+
+    with gzip.open(backup_dir / chain[0]['filename'], 'rb') as src, open(partial, 'wb') as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+    with open(partial, 'r+b') as dst:
+        for run in chain[1:]:
+            with gzip.open(backup_dir / run['filename'], 'rb') as delta:
+                header = json.loads(delta.readline())
+                page_size = header['page_size']
+                while True:
+                    record = delta.read(PAGE_RECORD.size)
+                    if not record:
+                        break
+                    dst.seek(PAGE_RECORD.unpack(record)[0] * page_size)
+                    dst.write(delta.read(page_size))
+                dst.truncate(header['page_count'] * page_size)
+
+    integrity = verify_database(partial)
+    if integrity != 'ok':
+        partial.unlink(missing_ok=True)
+        raise ValueError(f"Restored database failed integrity_check: {integrity}")
+
+    expected = chain[-1]['row_counts']
+    if expected and count_rows(partial) != json.loads(expected):
+        partial.unlink(missing_ok=True)
+        raise ValueError("Restored database row counts differ from the catalog")
+
+    os.replace(partial, target_path)
+    return target_path
+
+
+def find_backup_at(moment):
+    """Newest restorable run taken at or before `moment` ('%Y-%m-%d %H:%M:%S')"""
+    return execute_db("""
+        SELECT * FROM backup_runs WHERE status='ok' AND created_at <= ?
+        ORDER BY created_at DESC, id DESC LIMIT 1
+    """, (moment,), fetchone=True)
+
+
+def restore_to_time(moment, target_path):
+    """Rebuild the database as it was at `moment`, to the resolution of the backup schedule"""
+    run = find_backup_at(moment)
+    if not run:
+        raise ValueError(f"No backup at or before {moment}")
+    return run, restore_backup(run['id'], target_path)
+
+
+# ==================== CATALOG ====================
+
+def list_backups(limit=100):
+    """Catalog of backup runs, newest first"""
+    rows = execute_db("SELECT * FROM backup_runs ORDER BY id DESC LIMIT ?", (limit,), fetchall=True) or []
+    catalog = []
+    for row in rows:
+        entry = dict(row)
+        entry['row_counts'] = json.loads(entry['row_counts']) if entry['row_counts'] else None
+        entry['available'] = bool(entry['filename']) and (Path(Config.BACKUP_DIR) / entry['filename']).exists()
+        catalog.append(entry)
+    return catalog
+
+
+def print_catalog(catalog):
+    if not catalog:
+        print("No backups yet")
+    for entry in catalog:
+        if entry['status'] != 'ok':
+            print(f"  #{entry['id']:<5} {entry['created_at']}  FAILED  {entry['error']}")
+            continue
+        rows = sum((entry['row_counts'] or {}).values())
+        print(f"  #{entry['id']:<5} {entry['created_at']}  {entry['kind']:<11} "
+              f"{entry['size'] / 1024:10.1f} KB  {entry['changed_pages']:>7}/{entry['pages']} pages  "
+              f"{entry['duration']:6.2f}s  stall {entry['max_stall_ms']:6.1f} ms  {rows} rows"
+              f"{'' if entry['available'] else '  (file missing)'}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Database backup catalog and restore')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_cmd = commands.add_parser('list', help='show the backup catalog')
+    list_cmd.add_argument('--json', action='store_true')
+
+    run_cmd = commands.add_parser('run', help='take a backup now')
+    run_cmd.add_argument('--full', action='store_true', help='full snapshot even if incrementals are on')
+
+    restore_cmd = commands.add_parser('restore', help='rebuild a snapshot into a new database file')
+    restore_cmd.add_argument('target', help='output file; stop the system before swapping it in')
+    which = restore_cmd.add_mutually_exclusive_group()
+    which.add_argument('--id', type=int, help='backup run id (default: newest)')
+    which.add_argument('--at', help='point in time, "YYYY-MM-DD HH:MM:SS"')
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        catalog = list_backups()
+        if args.json:
+            json.dump(catalog, sys.stdout, indent=2)
+            print()
+        else:
+            print_catalog(catalog)
+
+    elif args.command == 'run':
+        path = run_backup(force_full=args.full)
+        print(f"Backup written to {path}" if path else "Backup failed, see zenx_system.log")
+        sys.exit(0 if path else 1)
+
+    else:
+        started = time.perf_counter()
+        try:
+            if args.at:
+                run, path = restore_to_time(args.at, args.target)
+            else:
+                run = execute_db("SELECT * FROM backup_runs WHERE status='ok' AND id=COALESCE(?, "
+                                 "(SELECT MAX(id) FROM backup_runs WHERE status='ok'))", (args.id,), fetchone=True)
+                if not run:
+                    raise ValueError("No such backup")
+                path = restore_backup(run['id'], args.target)
+        except ValueError as e:
+            print(f"Restore failed: {e}")
+            sys.exit(1)
+        print(f"Restored backup #{run['id']} ({run['created_at']}) to {path} "
+              f"in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,372 @@
+"""
+ZEN X HOST BOT v4.0 - Telegram Handler Replay Benchmark
+Per-handler latency, DB statements and Bot API calls per update for bot.py
+
+Runs bot.py's real dispatcher in this process against a fake Bot API
+server on localhost (telebot's API_URL is pointed at it) and a synthetic
+database (see synthetic.py). Updates are either synthetic, a weighted
+mix of menu commands, buttons and callbacks from simulated users
+(SCENARIOS), or recorded Telegram Update JSON objects, one per line
+(--replay). Each update is dispatched synchronously and measured alone:
+
+    latency         time in the handler, including fake API round trips
+    db statements   SQL statements run (trigger bodies excluded), via
+                    sqlite3 trace callbacks
+    db connections  sqlite3 connections opened
+    api calls       requests the fake Bot API received, by method
+
+--users takes several sizes; each gets a fresh database with that many
+users (and deployments, purchases and logs in proportion) and the same
+number of updates. Capacity is 1 / mean handler time, what one dispatcher
+thread can sustain. It is compared with the load those users offer at
+--updates-per-user updates per minute, to show where the single-process
+bot falls behind.
+
+Usage: python benchmarks/bench_bot.py [--users 100 1000 10000] [--updates 2000] [--api-latency 0]
+                                      [--replay updates.jsonl] [--json out.json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+import statistics
+from pathlib import Path
+from collections import Counter
+from urllib.parse import parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import build_database
+
+BOT_TOKEN = '123456:bench-token'
+
+# label -> (weight, update kind, payload maker(ids, rng))
+SCENARIOS = {
+    'handle_commands /start': (20, 'text', lambda ids, rng: '/start'),
+    'handle_my_bots': (20, 'text', lambda ids, rng: '🤖 My Bots'),
+    'handle_marketplace': (15, 'text', lambda ids, rng: '🛒 Marketplace'),
+    'handle_dashboard': (10, 'text', lambda ids, rng: '📊 Dashboard'),
+    'callback_manager bot_<id>': (15, 'callback', lambda ids, rng: f"bot_{rng.choice(ids['bots'])}"),
+    'callback_manager marketplace_view_<id>': (10, 'callback',
+                                               lambda ids, rng: f"marketplace_view_{rng.choice(ids['listings'])}"),
+    'callback_manager marketplace_browse': (5, 'callback', lambda ids, rng: 'marketplace_browse'),
+    'callback_manager my_bots': (5, 'callback', lambda ids, rng: 'my_bots'),
+}
+
+
+# ==================== FAKE BOT API ====================
+
+class FakeBotAPI(ThreadingHTTPServer):
+    """Answers Bot API methods with plausible results and counts them"""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(('127.0.0.1', 0), FakeBotAPIHandler)
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.next_message_id = 1
+
+    def record(self, method):
+        with self.lock:
+            self.calls[method] += 1
+            self.next_message_id += 1
+            return self.next_message_id
+
+    def snapshot(self):
+        with self.lock:
+            return Counter(self.calls)
+
+
+class FakeBotAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.answer()
+
+    def do_POST(self):
+        self.answer()
+
+    def answer(self):
+        path, _, query = self.path.partition('?')
+        method = path.rsplit('/', 1)[-1]
+        params = dict(parse_qsl(query))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if body and 'form-urlencoded' in (self.headers.get('Content-Type') or ''):
+            params.update(parse_qsl(body.decode()))
+
+        message_id = self.server.record(method)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if method == 'getMe':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'ZenX', 'username': 'zen_xbot'}
+        elif method.startswith('send') or method.startswith('edit'):
+            result = {'message_id': message_id, 'date': int(time.time()),
+                      'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'},
+                      'text': params.get('text', '')}
+        else:
+            result = True
+
+        payload = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# ==================== DB COUNTERS ====================
+
+db_counts = Counter()
+_connect = sqlite3.connect
+
+
+def counting_connect(*args, **kwargs):
+    """sqlite3.connect that counts connections and the statements run on them"""
+    conn = _connect(*args, **kwargs)
+    db_counts['connections'] += 1
+
+    def trace(statement):
+        # Statements inside triggers are reported as "-- TRIGGER ..." comments
+        if not statement.lstrip().startswith('--'):
+            db_counts['statements'] += 1
+
+    conn.set_trace_callback(trace)
+    return conn
+
+
+# ==================== UPDATES ====================
+
+def user_json(uid):
+    return {'id': uid, 'is_bot': False, 'first_name': f'User{uid}', 'username': f'user{uid}'}
+
+
+def make_update(update_id, uid, kind, payload):
+    """Telegram Update JSON for a text message or a button press"""
+    now = int(time.time())
+    chat = {'id': uid, 'type': 'private'}
+    if kind == 'text':
+        return {'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': now, 'chat': chat, 'from': user_json(uid), 'text': payload}}
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': user_json(uid), 'chat_instance': str(uid), 'data': payload,
+        'message': {'message_id': update_id, 'date': now, 'chat': chat,
+                    'from': {'id': 123456, 'is_bot': True, 'first_name': 'ZenX'}, 'text': 'menu'}}}
+
+
+def synthetic_updates(count, ids, rng):
+    """(label, update) pairs following the SCENARIOS weights"""
+    labels = list(SCENARIOS)
+    weights = [SCENARIOS[label][0] for label in labels]
+    for update_id in range(1, count + 1):
+        label = rng.choices(labels, weights)[0]
+        _, kind, payload = SCENARIOS[label]
+        yield label, make_update(update_id, rng.choice(ids['users']), kind, payload(ids, rng))
+
+
+def classify(update):
+    """Label for a recorded update: command, button text or callback data with ids masked"""
+    if 'callback_query' in update:
+        return 'callback ' + re.sub(r'\d+', '<id>', update['callback_query'].get('data') or '')
+    message = update.get('message') or {}
+    if 'document' in message:
+        return 'document'
+    text = message.get('text') or ''
+    return text.split()[0] if text.startswith('/') else f"text {text[:24]}"
+
+
+def recorded_updates(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                update = json.loads(line)
+                yield classify(update), update
+
+
+# ==================== RUNNER ====================
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def load_ids(db_name):
+    conn = _connect(db_name)
+    try:
+        return {
+            'users': [row[0] for row in conn.execute("SELECT id FROM users")],
+            'bots': [row[0] for row in conn.execute("SELECT id FROM deployments")],
+            'listings': [row[0] for row in conn.execute("SELECT id FROM marketplace_bots WHERE status='available'")],
+        }
+    finally:
+        conn.close()
+
+
+def replay(bot_module, api, updates):
+    """Dispatch updates one at a time; per-label samples"""
+    from telebot import types
+
+    per_label = {}
+    for label, raw in updates:
+        update = types.Update.de_json(raw)
+        api_before, db_before = api.snapshot(), Counter(db_counts)
+
+        start = time.perf_counter()
+        bot_module.bot.process_new_updates([update])
+        elapsed = (time.perf_counter() - start) * 1000
+
+        api_calls = api.snapshot() - api_before
+        entry = per_label.setdefault(label, {'ms': [], 'statements': 0, 'connections': 0,
+                                             'api_calls': 0, 'api_methods': Counter()})
+        entry['ms'].append(elapsed)
+        entry['statements'] += db_counts['statements'] - db_before['statements']
+        entry['connections'] += db_counts['connections'] - db_before['connections']
+        entry['api_calls'] += sum(api_calls.values())
+        entry['api_methods'].update(api_calls)
+    return per_label
+
+
+def summarize(per_label):
+    handlers = {}
+    for label, entry in sorted(per_label.items()):
+        count = len(entry['ms'])
+        handlers[label] = {
+            'updates': count,
+            'p50_ms': round(statistics.median(entry['ms']), 2),
+            'p95_ms': round(percentile(entry['ms'], 95), 2),
+            'p99_ms': round(percentile(entry['ms'], 99), 2),
+            'db_statements_per_update': round(entry['statements'] / count, 1),
+            'db_connections_per_update': round(entry['connections'] / count, 1),
+            'api_calls_per_update': round(entry['api_calls'] / count, 2),
+            'api_methods': dict(entry['api_methods']),
+        }
+    return handlers
+
+
+def run_step(users, args, api, bot_module, zenx, workdir):
+    """Fresh database with users users, then replay"""
+    step_dir = workdir / f'users_{users}'
+    step_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(step_dir)
+
+    zenx.init_db()
+    conn = _connect(zenx.Config.DB_NAME)  # untraced: the bulk insert is not what is measured
+    start = time.perf_counter()
+    build_database(conn, users=users, deployments=users * 3, listings=args.listings,
+                   purchases=users, logs=users * 5, seed=args.seed)
+    conn.close()
+    build_time = time.perf_counter() - start
+
+    # Caches and sessions from the previous step describe another database
+    from marketplace import clear_marketplace_cache
+    clear_marketplace_cache()
+    bot_module.user_sessions.clear()
+
+    rng = random.Random(args.seed)
+    if args.replay:
+        updates = list(recorded_updates(args.replay))
+    else:
+        updates = list(synthetic_updates(args.updates, load_ids(zenx.Config.DB_NAME), rng))
+
+    # Warm-up: first use of each handler path, not counted
+    replay(bot_module, api, updates[:args.warmup])
+
+    started = time.perf_counter()
+    per_label = replay(bot_module, api, updates)
+    total = time.perf_counter() - started
+
+    handlers = summarize(per_label)
+    capacity = len(updates) / total if total else 0
+    offered = users * args.updates_per_user / 60
+    print(f"\n{users} users: database built in {build_time:.1f}s, {len(updates)} updates in {total:.1f}s")
+    for label, stats in handlers.items():
+        print(f"  {label:<40} p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  "
+              f"p99 {stats['p99_ms']:7.2f} ms  db {stats['db_statements_per_update']:5.1f} stmts "
+              f"{stats['db_connections_per_update']:4.1f} conns  api {stats['api_calls_per_update']:4.2f}")
+    verdict = 'keeps up' if capacity >= offered else 'FALLS BEHIND'
+    print(f"  capacity {capacity:.0f} updates/s vs offered {offered:.0f} updates/s: {verdict}")
+
+    return {
+        'users': users,
+        'updates': len(updates),
+        'seconds': round(total, 2),
+        'capacity_updates_per_s': round(capacity, 1),
+        'offered_updates_per_s': round(offered, 1),
+        'keeps_up': capacity >= offered,
+        'handlers': handlers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[100, 1000, 10000], help='simulated user counts')
+    parser.add_argument('--updates', type=int, default=2000, help='synthetic updates per step')
+    parser.add_argument('--replay', help='recorded Update JSON objects, one per line, instead of synthetic ones')
+    parser.add_argument('--listings', type=int, default=2000)
+    parser.add_argument('--updates-per-user', type=float, default=1.0, help='offered load, updates per user per minute')
+    parser.add_argument('--api-latency', type=float, default=0, help='fake Bot API response time in ms')
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dir', help='scratch directory (default: a new temp dir, removed afterwards)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    workdir = Path(args.dir or tempfile.mkdtemp(prefix='zenx_bot_bench_')).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    json_path = Path(args.json).resolve() if args.json else None
+    replay_path = Path(args.replay).resolve() if args.replay else None
+    args.replay = replay_path
+    os.chdir(workdir)
+
+    # Before main/bot are imported: they read these at import time
+    os.environ['BOT_TOKEN'] = BOT_TOKEN
+    os.environ['ZENX_EVENT_DIR'] = str(workdir / 'events')
+    sqlite3.connect = counting_connect
+
+    api = FakeBotAPI(args.api_latency / 1000)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+
+    from telebot import apihelper
+    apihelper.API_URL = f"http://127.0.0.1:{api.server_address[1]}/bot{{0}}/{{1}}"
+
+    import main as zenx
+    import bot as bot_module
+
+    # Dispatch in this thread so each update is timed on its own
+    bot_module.bot.threaded = False
+
+    try:
+        results = {'api_latency_ms': args.api_latency, 'updates_per_user': args.updates_per_user,
+                   'replay': str(replay_path) if replay_path else None, 'steps': []}
+        for users in args.users:
+            results['steps'].append(run_step(users, args, api, bot_module, zenx, workdir))
+
+        if json_path:
+            json_path.write_text(json.dumps(results, indent=2))
+
+    finally:
+        api.shutdown()
+        os.chdir(ROOT)
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
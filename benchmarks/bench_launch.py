@@ -0,0 +1,138 @@
+"""
+ZEN X HOST BOT v4.0 - Launch Benchmark
+Deploy-to-ready latency and per-bot memory: cold spawn vs warm zygote fork
+
+Usage: python benchmarks/bench_launch.py [-n 20] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Typical bot: import the usual libraries, signal readiness, then idle
+BOT_SCRIPT = """
+import os, sys, time
+for name in ('telebot', 'requests', 'json', 'sqlite3', 'ssl', 'http.client', 'urllib.request', 'asyncio'):
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+open(os.environ['READY_FILE'], 'w').close()
+time.sleep(600)
+"""
+
+
+def read_memory(pid):
+    """RSS and PSS in KB (PSS counts shared pages fractionally)"""
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    rss = int(line.split()[1])
+                elif line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except OSError:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = pss = int(line.split()[1])
+    return rss, pss
+
+
+def wait_ready(ready_file, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while not os.path.exists(ready_file):
+        if time.perf_counter() > deadline:
+            raise TimeoutError(ready_file)
+        time.sleep(0.001)
+
+
+def run_mode(mode, count, workdir, script):
+    """Launch `count` bots and measure time until each reports ready"""
+    from zygote import spawn_from_zygote, get_zygote
+
+    latencies, rss, pss, pids, procs = [], [], [], [], []
+
+    if mode == 'zygote':
+        get_zygote(sys.executable)  # warm-up is paid once per node, not per deploy
+
+    for i in range(count):
+        ready_file = os.path.join(workdir, f"{mode}_{i}.ready")
+        log_file = os.path.join(workdir, f"{mode}_{i}.log")
+        env = dict(os.environ, READY_FILE=ready_file)
+
+        start = time.perf_counter()
+        if mode == 'zygote':
+            pid = spawn_from_zygote(sys.executable, script, workdir, log_file, env=env)
+        else:
+            with open(log_file, 'a') as f:
+                proc = subprocess.Popen([sys.executable, script], stdout=f, stderr=subprocess.STDOUT,
+                                        cwd=workdir, env=env, start_new_session=True)
+            procs.append(proc)
+            pid = proc.pid
+        wait_ready(ready_file)
+        latencies.append((time.perf_counter() - start) * 1000)
+        pids.append(pid)
+
+    time.sleep(0.5)
+    for pid in pids:
+        r, p = read_memory(pid)
+        rss.append(r)
+        pss.append(p)
+        os.kill(pid, 9)
+    for proc in procs:
+        proc.wait()
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'bots': count,
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 2),
+            'p50': round(latencies[len(latencies) // 2], 2),
+            'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        },
+        'rss_kb_avg': int(statistics.mean(rss)),
+        'pss_kb_avg': int(statistics.mean(pss)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--count', type=int, default=20)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='zenx_bench_')
+    script = os.path.join(workdir, 'bot.py')
+    Path(script).write_text(BOT_SCRIPT)
+
+    try:
+        results = [run_mode('cold', args.count, workdir, script),
+                   run_mode('zygote', args.count, workdir, script)]
+    finally:
+        from zygote import shutdown_zygotes
+        shutdown_zygotes()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for r in results:
+        print(f"{r['mode']:>7}: mean {r['latency_ms']['mean']:8.2f} ms  p50 {r['latency_ms']['p50']:8.2f} ms  "
+              f"p95 {r['latency_ms']['p95']:8.2f} ms  RSS {r['rss_kb_avg']:7d} KB  PSS {r['pss_kb_avg']:7d} KB")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
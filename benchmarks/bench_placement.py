@@ -0,0 +1,153 @@
+"""
+ZEN X HOST BOT v4.0 - Placement Simulation
+Replays thousands of deploy/exit events against a synthetic cluster and
+compares placement strategies on speed, rejections, balance and co-location
+
+Strategies:
+    legacy    lowest current_load/capacity, load never released on exit
+    count     lowest current_load/capacity, load released on exit
+    weighted  PlacementEngine: weighted CPU/RAM/count plus user anti-affinity
+
+Usage: python benchmarks/bench_placement.py [-n 20000] [--nodes 3] [--fill 0.5] [--seed 1] [--json out.json]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from placement import PlacementEngine  # noqa: E402
+
+
+class CountOnlyEngine(PlacementEngine):
+    """The old assign_bot_to_node: bot count only, optionally leaking load"""
+
+    def __init__(self, leak=False):
+        super().__init__(weights={'cpu': 0.0, 'memory': 0.0, 'count': 1.0}, anti_affinity=0.0)
+        self.leak = leak
+        self.leaked = {}  # node_id -> exits never subtracted from current_load
+
+    def _fits(self, node, footprint):
+        return node.status == 'active' and node.count + self.leaked.get(node.id, 0) < node.capacity
+
+    def score(self, node, user_id, footprint, region=None):
+        return (node.count + self.leaked.get(node.id, 0)) / node.capacity
+
+    def release(self, bot_id):
+        node = super().release(bot_id)
+        if node and self.leak:
+            self.leaked[node.id] = self.leaked.get(node.id, 0) + 1
+        return node
+
+
+def build_cluster(engine, nodes, capacity):
+    for i in range(nodes):
+        # Mixed hardware: the weighted engine should favour the bigger boxes
+        cores = (4, 8, 16)[i % 3]
+        engine.set_node(i + 1, f"Node-{i + 1}", capacity, 'Asia' if i % 3 < 2 else 'Europe',
+                        cpu_capacity=cores * 100.0, memory_mb=cores * 4096.0)
+
+
+def generate_events(count, users, target, seed):
+    """Deploys with random footprints interleaved with exits, hovering around `target` running bots"""
+    rng = random.Random(seed)
+    events, running, next_id = [], [], 1
+
+    for _ in range(count):
+        if running and rng.random() < 0.5 * len(running) / target:
+            events.append(('exit', running.pop(rng.randrange(len(running)))))
+            continue
+        # Most bots idle; a few are heavy
+        heavy = rng.random() < 0.1
+        footprint = {
+            'cpu': rng.uniform(10, 40) if heavy else rng.uniform(0.2, 3),
+            'memory_mb': rng.uniform(200, 450) if heavy else rng.uniform(30, 90)
+        }
+        events.append(('deploy', next_id, rng.randrange(users), footprint))
+        running.append(next_id)
+        next_id += 1
+
+    return events
+
+
+def replay(name, engine, events):
+    latencies, rejected = [], 0
+
+    for event in events:
+        if event[0] == 'exit':
+            engine.release(event[1])
+            continue
+        _, bot_id, user_id, footprint = event
+        start = time.perf_counter()
+        node = engine.place(bot_id, user_id, footprint)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        if node is None:
+            rejected += 1
+
+    nodes = list(engine.nodes.values())
+    cpu_util = [n.cpu_reserved / n.cpu_capacity for n in nodes]
+    mem_util = [n.memory_reserved / n.memory_mb for n in nodes]
+
+    # Bots sharing a node with another bot of the same user
+    colocated = sum(c - 1 for n in nodes for c in n.users.values() if c > 1)
+
+    latencies.sort()
+    return {
+        'strategy': name,
+        'placements': len(latencies),
+        'rejected': rejected,
+        'latency_us': {
+            'p50': round(latencies[len(latencies) // 2], 2),
+            'p99': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+        },
+        'running': sum(n.count for n in nodes),
+        'cpu_util_max': round(max(cpu_util), 3),
+        'cpu_util_spread': round(max(cpu_util) - min(cpu_util), 3),
+        'mem_util_max': round(max(mem_util), 3),
+        'mem_util_stdev': round(statistics.pstdev(mem_util), 3),
+        'colocated_bots': colocated,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--events', type=int, default=20000)
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--capacity', type=int, default=300)
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--fill', type=float, default=0.5, help='steady-state share of bot slots in use')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    target = max(1, int(args.nodes * args.capacity * args.fill))
+    events = generate_events(args.events, args.users, target, args.seed)
+    strategies = [
+        ('legacy', CountOnlyEngine(leak=True)),
+        ('count', CountOnlyEngine()),
+        ('weighted', PlacementEngine())
+    ]
+
+    results = []
+    for name, engine in strategies:
+        build_cluster(engine, args.nodes, args.capacity)
+        results.append(replay(name, engine, events))
+
+    for r in results:
+        print(f"{r['strategy']:>8}: p50 {r['latency_us']['p50']:7.2f} us  p99 {r['latency_us']['p99']:7.2f} us  "
+              f"rejected {r['rejected']:6d}  running {r['running']:5d}  "
+              f"cpu max {r['cpu_util_max']:.2f} spread {r['cpu_util_spread']:.2f}  "
+              f"mem max {r['mem_util_max']:.2f}  co-located {r['colocated_bots']}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+ZEN X HOST BOT v4.0 - Restore Benchmark
+Time-to-recover from the backup catalog for a large synthetic database
+
+Builds a database of --size-mb in a scratch directory, takes a full backup
+plus --segments incremental ones with --churn percent of rows changed
+between them, then restores the newest snapshot (full + every increment)
+and the full snapshot alone, timing each stage.
+
+Usage: python benchmarks/bench_restore.py [--size-mb 1024] [--segments 6] [--churn 1] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BATCH = 100000
+
+
+def build_database(db_name, size_mb):
+    """Fill a bots-like table until the file reaches size_mb"""
+    conn = sqlite3.connect(db_name)
+    conn.execute("""CREATE TABLE IF NOT EXISTS bench_events
+                    (id INTEGER PRIMARY KEY, bot_id INTEGER, event_type TEXT, details TEXT, created_at TEXT)""")
+    target = size_mb * 1024 * 1024
+    while True:
+        size = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+        if size >= target:
+            break
+        # Log-like rows: a random token in otherwise repetitive text, so compression is realistic
+        conn.execute(f"""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {BATCH})
+            INSERT INTO bench_events (bot_id, event_type, details, created_at)
+            SELECT abs(random()) % 5000, 'HEARTBEAT',
+                   'Bot process alive, cpu ' || (abs(random()) % 100) || '% token ' || hex(randomblob(24))
+                   || ' node Node-' || (abs(random()) % 3 + 1) || ' status Running',
+                   datetime('now')
+            FROM n
+        """)
+        conn.commit()
+    rows = conn.execute("SELECT COUNT(*) FROM bench_events").fetchone()[0]
+    conn.close()
+    return rows
+
+
+def churn(db_name, percent):
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute("SELECT MAX(id) FROM bench_events").fetchone()[0]
+    conn.execute("UPDATE bench_events SET event_type='RESTART' WHERE abs(random()) % 10000 < ?",
+                 (int(percent * 100),))
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {max(1, int(rows * percent / 100))})
+        INSERT INTO bench_events (bot_id, event_type, details, created_at)
+        SELECT abs(random()) % 5000, 'DEPLOY', 'Deployed to Node-1 token ' || hex(randomblob(24)), datetime('now')
+        FROM n
+    """)
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=1024)
+    parser.add_argument('--segments', type=int, default=6, help='incremental backups after the full one')
+    parser.add_argument('--churn', type=float, default=1.0, help='percent of rows changed per segment')
+    parser.add_argument('--dir', help='scratch directory (default: a new temp dir, removed afterwards)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    workdir = Path(args.dir or tempfile.mkdtemp(prefix='zenx_restore_bench_'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    json_path = Path(args.json).resolve() if args.json else None
+    os.chdir(workdir)
+
+    import main as zenx
+    import backup
+
+    zenx.init_db()
+    zenx.Config.BACKUP_INCREMENTAL = True
+    zenx.Config.BACKUP_FULL_EVERY = args.segments
+
+    try:
+        rows, build_time = timed(build_database, zenx.Config.DB_NAME, args.size_mb)
+        db_size = os.path.getsize(zenx.Config.DB_NAME)
+        print(f"Built {db_size / 2**20:.0f} MB database ({rows} rows) in {build_time:.1f}s")
+
+        full_path, full_time = timed(backup.run_backup, True)
+        for _ in range(args.segments):
+            churn(zenx.Config.DB_NAME, args.churn)
+            backup.run_backup()
+
+        catalog = backup.list_backups()
+        full = catalog[-1]
+        newest = catalog[0]
+        print(f"Full backup: {full['size'] / 2**20:.0f} MB in {full_time:.1f}s "
+              f"(max stall {full['max_stall_ms']:.1f} ms)")
+
+        _, restore_full_time = timed(backup.restore_backup, full['id'], 'restored_full.db')
+        _, restore_chain_time = timed(backup.restore_backup, newest['id'], 'restored_latest.db')
+
+        # Stages of the chain restore, measured on the restored file
+        _, checksum_time = timed(lambda: [backup.file_checksum(Path(zenx.Config.BACKUP_DIR) / e['filename'])
+                                          for e in catalog if e['status'] == 'ok'])
+        _, integrity_time = timed(backup.verify_database, 'restored_latest.db')
+        _, count_time = timed(backup.count_rows, 'restored_latest.db')
+
+        results = {
+            'db_mb': round(db_size / 2**20, 1),
+            'rows': rows,
+            'segments': args.segments,
+            'churn_percent': args.churn,
+            'full_backup_s': round(full_time, 2),
+            'full_backup_mb': round(full['size'] / 2**20, 1),
+            'incremental_mb': [round(e['size'] / 2**20, 2) for e in reversed(catalog[:-1])],
+            'restore_full_s': round(restore_full_time, 2),
+            'restore_latest_s': round(restore_chain_time, 2),
+            'stages_s': {
+                'checksums': round(checksum_time, 2),
+                'integrity_check': round(integrity_time, 2),
+                'row_counts': round(count_time, 2),
+            },
+        }
+
+        print(f"Time to recover: full snapshot {restore_full_time:.1f}s, "
+              f"latest (full + {args.segments} segments) {restore_chain_time:.1f}s")
+        print(f"  of which checksums {checksum_time:.1f}s, integrity_check {integrity_time:.1f}s, "
+              f"row counts {count_time:.1f}s")
+
+        if json_path:
+            json_path.write_text(json.dumps(results, indent=2))
+
+    finally:
+        os.chdir(ROOT)
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
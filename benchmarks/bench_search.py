@@ -0,0 +1,124 @@
+"""
+ZEN X HOST BOT v4.0 - Marketplace Search Benchmark
+Search latency over a large synthetic marketplace
+
+Fills a scratch database with --listings available listings whose words
+follow a Zipf-like distribution (plus "telegram bot" in every
+description, the worst case for a common word), then times
+search_listings for a mix of common, rare, prefix and category-filtered
+queries. Reports p50/p95/p99 per query.
+
+Usage: python benchmarks/bench_search.py [--listings 100000] [--runs 50] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+CATEGORIES = ['general', 'media', 'tools', 'finance', 'games']
+KEYWORDS = ['music', 'video', 'crypto', 'trading', 'weather', 'news', 'quiz', 'shop', 'support',
+            'translate', 'image', 'chat', 'reminder', 'poll', 'moderation', 'welcome', 'download']
+
+QUERIES = [
+    ('common word', 'bot', None),
+    ('two common words', 'telegram bot', None),
+    ('keyword', 'music', None),
+    ('prefix as typed', 'mu', None),
+    ('two keywords', 'crypto trading', None),
+    ('keyword in category', 'weather', 'tools'),
+    ('rare word', 'w1234', None),
+    ('no match', 'zzzz', None),
+]
+
+
+def build_marketplace(conn, listings):
+    words = [f"w{i}" for i in range(3000)] + KEYWORDS
+    weights = [1 / (i + 1) for i in range(len(words))]
+    random.shuffle(weights)
+
+    conn.execute("INSERT OR IGNORE INTO users (id, username) VALUES (1, 'seller')")
+    conn.execute("INSERT OR IGNORE INTO deployments (id, user_id, bot_name, filename) VALUES (1, 1, 'bench', 'bench.py')")
+    conn.executemany("""
+        INSERT INTO marketplace_bots
+        (bot_id, title, description, tags, price, category, seller_id, status, purchases, rating, created_at)
+        VALUES (1, ?, ?, ?, ?, ?, 1, 'available', ?, ?, datetime('now'))
+    """, ((' '.join(random.choices(words, weights, k=3)).title() + ' Bot',
+           'Telegram bot ' + ' '.join(random.choices(words, weights, k=25)),
+           ','.join(random.choices(words, weights, k=2)),
+           round(random.uniform(1, 50), 2), random.choice(CATEGORIES),
+           random.randint(0, 500), round(random.uniform(0, 5), 1)) for _ in range(listings)))
+    conn.commit()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listings', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=50, help='timed runs per query')
+    parser.add_argument('--dir', help='scratch directory (default: a new temp dir, removed afterwards)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    workdir = Path(args.dir or tempfile.mkdtemp(prefix='zenx_search_bench_'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    json_path = Path(args.json).resolve() if args.json else None
+    os.chdir(workdir)
+
+    import main as zenx
+    import marketplace
+
+    zenx.init_db()
+
+    try:
+        conn = zenx.get_db()
+        start = time.perf_counter()
+        build_marketplace(conn, args.listings)
+        conn.close()
+        print(f"Indexed {args.listings} listings in {time.perf_counter() - start:.1f}s")
+
+        results = {'listings': args.listings, 'runs': args.runs, 'queries': {}}
+        for label, text, category in QUERIES:
+            marketplace.search_listings(text, category)  # warm-up run
+            samples, found = [], 0
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                found = len(marketplace.search_listings(text, category)['results'])
+                samples.append((time.perf_counter() - start) * 1000)
+
+            stats = {
+                'query': text,
+                'category': category,
+                'results': found,
+                'p50_ms': round(statistics.median(samples), 2),
+                'p95_ms': round(percentile(samples, 95), 2),
+                'p99_ms': round(percentile(samples, 99), 2),
+            }
+            results['queries'][label] = stats
+            print(f"{label:<22} {text!r:<16} p50 {stats['p50_ms']:6.2f} ms  p95 {stats['p95_ms']:6.2f} ms  "
+                  f"p99 {stats['p99_ms']:6.2f} ms  ({found} results)")
+
+        if json_path:
+            json_path.write_text(json.dumps(results, indent=2))
+
+    finally:
+        os.chdir(ROOT)
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
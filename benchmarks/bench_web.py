@@ -0,0 +1,385 @@
+"""
+ZEN X HOST BOT v4.0 - Web Endpoint Benchmark
+Throughput and p50/p95/p99 latency of the app.py endpoints on a synthetic database
+
+Builds a scratch cyber_v2.db at the sizes given (see synthetic.py), then
+times each endpoint for --duration seconds with --concurrency clients:
+
+    inprocess   Flask test client in this process: route, query and
+                template cost without a server
+    gunicorn    the app behind gunicorn's eventlet worker, as in the
+                Procfile, over real HTTP with keep-alive
+
+Admin pages are requested with a logged-in session. POST /api/purchase
+writes a real order each time, so run it last (it is listed last).
+Results go to --json. With --compare an earlier JSON is read and any
+endpoint whose p95 got worse by more than --max-regression percent is
+reported, and the run exits with status 1.
+
+Usage: python benchmarks/bench_web.py [--mode inprocess|gunicorn|both] [--users 1000 ...]
+                                      [--json out.json] [--compare baseline.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+import http.client
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from datetime import datetime
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import add_size_arguments, build_from_args
+
+# name -> (method, path, admin session needed)
+ENDPOINTS = {
+    'status': ('GET', '/status', False),
+    'marketplace': ('GET', '/api/marketplace', False),
+    'bot_details': ('GET', '/api/bot/{bot_id}/details', False),
+    'admin_dashboard': ('GET', '/admin/dashboard', True),
+    'admin_analytics': ('GET', '/admin/analytics', True),
+    'purchase': ('POST', '/api/purchase', False),
+}
+
+ADMIN_LOGIN = {'username': 'admin', 'password': 'admin123'}  # app.py's built-in admin
+
+# Pages app.py renders but create_default_templates doesn't write
+FALLBACK_TEMPLATES = {
+    'admin_analytics.html': """
+        {% for row in user_registrations %}{{ row.date }} {{ row.count }}
+        {% endfor %}{% for row in bot_deployments %}{{ row.date }} {{ row.count }}
+        {% endfor %}{% for row in monthly_revenue %}{{ row.month }} {{ row.revenue }}
+        {% endfor %}{% for row in top_bots %}{{ row.title }} {{ row.sales }} {{ row.revenue }}
+        {% endfor %}
+    """,
+}
+
+
+# ==================== APP & SERVER ====================
+
+def serve():
+    """The app with its default templates, for in-process runs and gunicorn 'bench_web:serve()'"""
+    from jinja2 import ChoiceLoader, DictLoader, FileSystemLoader
+    from app import app, create_default_templates
+
+    # create_default_templates writes into ./templates; Flask looks next to app.py
+    templates = Path.cwd() / 'templates'
+    if not templates.exists():
+        templates.mkdir()
+        create_default_templates()
+    app.jinja_loader = ChoiceLoader([FileSystemLoader(str(templates)), DictLoader(FALLBACK_TEMPLATES)])
+    return app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workdir, target, env=None):
+    """Run target under one eventlet worker in workdir; returns (process, base url)"""
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT), str(ROOT / 'benchmarks')]),
+               ZENX_EVENT_DIR=str(workdir / 'events'), **(env or {}))
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--worker-class', 'eventlet', '-w', '1',
+                             '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', target],
+                            cwd=workdir, env=env)
+    url = f'http://127.0.0.1:{port}'
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(url + '/status', timeout=1).read()
+            return proc, url
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Server did not come up within 30s")
+
+
+# ==================== CLIENTS ====================
+
+class InProcessClient:
+    """Flask test client; one per benchmark thread"""
+
+    def __init__(self, app, admin):
+        self.client = app.test_client()
+        if admin:
+            with self.client.session_transaction() as session:
+                session['admin_logged_in'] = True
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    """Keep-alive HTTP connection; one per benchmark thread"""
+
+    def __init__(self, url, admin):
+        parsed = urllib.parse.urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port
+        self.conn = None
+        self.headers = {}
+        if admin:
+            self.headers['Cookie'] = self.login()
+
+    def connect(self):
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def login(self):
+        self.connect()
+        self.conn.request('POST', '/admin/login', body=urllib.parse.urlencode(ADMIN_LOGIN),
+                          headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        response = self.conn.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if not cookie:
+            raise RuntimeError("Admin login failed")
+        return cookie.split(';', 1)[0]
+
+    def request(self, method, path, body=None):
+        headers = dict(self.headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.conn is None:
+                self.connect()
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, OSError):
+                # Server closed the keep-alive connection; retry once on a new one
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+# ==================== RUNNER ====================
+
+def load_ids(db_name):
+    """Ids the requests pick from"""
+    import sqlite3
+
+    conn = sqlite3.connect(db_name)
+    try:
+        return {
+            'bots': [row[0] for row in conn.execute("SELECT id FROM deployments")],
+            'listings': [row[0] for row in conn.execute("SELECT id FROM marketplace_bots WHERE status='available'")],
+            'users': [row[0] for row in conn.execute("SELECT id FROM users")],
+        }
+    finally:
+        conn.close()
+
+
+def make_request(name, ids, rng):
+    """(method, path, json body) for one request to an endpoint"""
+    method, path, _ = ENDPOINTS[name]
+    if name == 'bot_details':
+        return method, path.format(bot_id=rng.choice(ids['bots'])), None
+    if name == 'purchase':
+        return method, path, {
+            'listing_id': rng.choice(ids['listings']),
+            'buyer_id': rng.choice(ids['users']),
+            'payment_method': 'bkash',
+            'transaction_id': f'bench-{rng.getrandbits(64):016x}',
+        }
+    return method, path, None
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_endpoint(name, new_client, ids, concurrency, duration, warmup):
+    """Time one endpoint with concurrency clients for duration seconds"""
+    admin = ENDPOINTS[name][2]
+    clients = [new_client(admin) for _ in range(concurrency)]
+    rng = random.Random(name)
+    for _ in range(warmup):
+        clients[0].request(*make_request(name, ids, rng))
+
+    samples, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(client, seed):
+        local_rng, local_samples, local_errors = random.Random(seed), [], 0
+        while time.monotonic() < deadline:
+            method, path, body = make_request(name, ids, local_rng)
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except Exception:
+                status = None
+            if status != 200:
+                local_errors += 1
+                continue
+            local_samples.append((time.perf_counter() - start) * 1000)
+        with lock:
+            samples.extend(local_samples)
+            errors.append(local_errors)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(client, i)) for i, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    if not samples:
+        return {'requests': 0, 'errors': sum(errors)}
+    return {
+        'requests': len(samples),
+        'errors': sum(errors),
+        'rps': round(len(samples) / elapsed, 1),
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 95), 2),
+        'p99_ms': round(percentile(samples, 99), 2),
+    }
+
+
+def run_mode(mode, args, ids, url=None):
+    if mode == 'inprocess':
+        app = serve()
+        new_client = lambda admin: InProcessClient(app, admin)
+        concurrency = args.concurrency or 1
+    else:
+        new_client = lambda admin: HttpClient(url, admin)
+        concurrency = args.concurrency or 16
+
+    results = {}
+    for name in args.endpoints:
+        stats = bench_endpoint(name, new_client, ids, concurrency, args.duration, args.warmup)
+        results[name] = dict(stats, concurrency=concurrency)
+        print(f"{mode:<10} {name:<16} {stats.get('rps', 0):8.1f} req/s  p50 {stats.get('p50_ms', 0):7.2f} ms  "
+              f"p95 {stats.get('p95_ms', 0):7.2f} ms  p99 {stats.get('p99_ms', 0):7.2f} ms  ({stats['errors']} errors)")
+    return results
+
+
+def compare(results, baseline_path, max_regression):
+    """Print p95 and throughput changes against a baseline; returns the regressions"""
+    baseline = json.loads(Path(baseline_path).read_text())['results']
+    regressions = []
+    for mode, endpoints in results.items():
+        for name, stats in endpoints.items():
+            before = baseline.get(mode, {}).get(name)
+            if not before or not before.get('p95_ms') or not stats.get('p95_ms'):
+                continue
+            p95_change = (stats['p95_ms'] - before['p95_ms']) * 100 / before['p95_ms']
+            rps_change = (stats['rps'] - before['rps']) * 100 / before['rps']
+            flag = ''
+            if p95_change > max_regression:
+                regressions.append((mode, name, p95_change))
+                flag = '  REGRESSION'
+            print(f"{mode:<10} {name:<16} p95 {before['p95_ms']:7.2f} -> {stats['p95_ms']:7.2f} ms ({p95_change:+.0f}%)  "
+                  f"rps {rps_change:+.0f}%{flag}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn', 'both'], default='inprocess')
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--duration', type=float, default=5, help='seconds per endpoint')
+    parser.add_argument('--concurrency', type=int, help='clients per endpoint (default: 1 in-process, 16 gunicorn)')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per endpoint')
+    add_size_arguments(parser)
+    parser.add_argument('--dir', help='scratch directory (default: a new temp dir, removed afterwards)')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='earlier --json output to check for regressions')
+    parser.add_argument('--max-regression', type=float, default=25, help='allowed p95 increase in percent')
+    args = parser.parse_args()
+
+    workdir = Path(args.dir or tempfile.mkdtemp(prefix='zenx_web_bench_')).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    json_path = Path(args.json).resolve() if args.json else None
+    compare_path = Path(args.compare).resolve() if args.compare else None
+    os.chdir(workdir)
+    os.environ['ZENX_EVENT_DIR'] = str(workdir / 'events')
+
+    import main as zenx
+
+    zenx.init_db()
+
+    server = None
+    try:
+        conn = zenx.get_db()
+        start = time.perf_counter()
+        sizes = build_from_args(conn, args)
+        conn.close()
+        print(f"Built database in {time.perf_counter() - start:.1f}s: "
+              + ', '.join(f"{count} {name}" for name, count in sizes.items()))
+        ids = load_ids(zenx.Config.DB_NAME)
+
+        results = {}
+        modes = ['inprocess', 'gunicorn'] if args.mode == 'both' else [args.mode]
+        for mode in modes:
+            url = None
+            if mode == 'gunicorn':
+                server, url = start_gunicorn(workdir, 'bench_web:serve()')
+            results[mode] = run_mode(mode, args, ids, url)
+            if server:
+                server.terminate()
+                server.wait(timeout=10)
+                server = None
+
+        report = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'sizes': sizes,
+            'duration': args.duration,
+            'results': results,
+        }
+        if json_path:
+            json_path.write_text(json.dumps(report, indent=2))
+
+        if compare_path:
+            regressions = compare(results, compare_path, args.max_regression)
+            if regressions:
+                print(f"{len(regressions)} endpoint(s) regressed by more than {args.max_regression:.0f}%")
+                sys.exit(1)
+
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        os.chdir(ROOT)
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+ZEN X HOST BOT v4.0 - Web Load Test
+HTTP throughput of /status and /api/marketplace with SocketIO clients attached
+
+Starts the web app the way the Procfile does (gunicorn, one eventlet
+worker) on a synthetic scratch database (see synthetic.py). Each
+endpoint is driven with --concurrency requests in flight for --duration
+seconds, first with no SocketIO clients and then with --clients clients
+connected and subscribed to the global room. Reports requests/s,
+p50/p95/p99 latency and errors per phase, and how many SocketIO clients
+were still connected at the end. Run it again with --no-tpool to see
+the same load with SQLite calls blocking the event loop.
+
+Usage: python benchmarks/load_web.py [--clients 500] [--concurrency 50] [--duration 15] [--json out.json]
+       python benchmarks/load_web.py --url http://host:port   (load a server that is already running)
+
+Needs gunicorn, eventlet, aiohttp and python-socketio (all in requirements.txt).
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+import aiohttp
+import socketio
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import add_size_arguments, build_from_args
+from bench_web import start_gunicorn
+
+ENDPOINTS = ['/status', '/api/marketplace']
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def connect_clients(url, count):
+    """SocketIO clients subscribed to the global room; returns (clients, failures)"""
+    clients, failures = [], 0
+
+    async def connect_one():
+        client = socketio.AsyncClient(reconnection=False)
+        await client.connect(url, transports=['websocket'], wait_timeout=30)
+        await client.emit('subscribe', {'room': 'global'})
+        return client
+
+    for start in range(0, count, 50):
+        batch = await asyncio.gather(*(connect_one() for _ in range(min(50, count - start))),
+                                     return_exceptions=True)
+        for result in batch:
+            if isinstance(result, Exception):
+                failures += 1
+            else:
+                clients.append(result)
+    return clients, failures
+
+
+async def drive(url, concurrency, duration):
+    """Requests against one URL for duration seconds: throughput and latency"""
+    samples, errors = [], 0
+    deadline = time.monotonic() + duration
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                            continue
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                    continue
+                samples.append((time.perf_counter() - start) * 1000)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    if not samples:
+        return {'requests': 0, 'errors': errors}
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'rps': round(len(samples) / elapsed, 1),
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 95), 2),
+        'p99_ms': round(percentile(samples, 99), 2),
+    }
+
+
+async def run(url, args):
+    results = {'clients': args.clients, 'concurrency': args.concurrency, 'duration': args.duration,
+               'tpool': not args.no_tpool, 'phases': {}}
+
+    for phase in ('no clients', f'{args.clients} clients'):
+        clients, failures = [], 0
+        if phase != 'no clients':
+            start = time.perf_counter()
+            clients, failures = await connect_clients(url, args.clients)
+            print(f"Connected {len(clients)} SocketIO clients in {time.perf_counter() - start:.1f}s"
+                  f" ({failures} failed)")
+
+        endpoints = {}
+        for endpoint in ENDPOINTS:
+            stats = await drive(url + endpoint, args.concurrency, args.duration)
+            endpoints[endpoint] = stats
+            print(f"{phase:<14} {endpoint:<18} {stats.get('rps', 0):8.1f} req/s  "
+                  f"p50 {stats.get('p50_ms', 0):7.2f} ms  p95 {stats.get('p95_ms', 0):7.2f} ms  "
+                  f"p99 {stats.get('p99_ms', 0):7.2f} ms  ({stats['errors']} errors)")
+
+        connected = sum(1 for client in clients if client.connected)
+        results['phases'][phase] = {'endpoints': endpoints, 'connect_failures': failures,
+                                    'still_connected': connected}
+        if clients:
+            print(f"{connected}/{len(clients)} SocketIO clients still connected")
+            await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=500, help='SocketIO clients in the second phase')
+    parser.add_argument('--concurrency', type=int, default=50, help='HTTP requests in flight')
+    parser.add_argument('--duration', type=float, default=15, help='seconds per endpoint per phase')
+    add_size_arguments(parser)
+    parser.add_argument('--no-tpool', action='store_true', help='run SQLite calls on the event loop')
+    parser.add_argument('--url', help='load this running server instead of starting one')
+    parser.add_argument('--dir', help='scratch directory (default: a new temp dir, removed afterwards)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    json_path = Path(args.json).resolve() if args.json else None
+    if args.url:
+        results = asyncio.run(run(args.url.rstrip('/'), args))
+        if json_path:
+            json_path.write_text(json.dumps(results, indent=2))
+        return
+
+    workdir = Path(args.dir or tempfile.mkdtemp(prefix='zenx_load_')).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+    os.environ['ZENX_EVENT_DIR'] = str(workdir / 'events')
+
+    import main as zenx
+
+    zenx.init_db()
+
+    server = None
+    try:
+        conn = zenx.get_db()
+        build_from_args(conn, args)
+        conn.close()
+        server, url = start_gunicorn(workdir, 'wsgi:app', {'ZENX_DB_TPOOL': '0' if args.no_tpool else '1'})
+        results = asyncio.run(run(url, args))
+        if json_path:
+            json_path.write_text(json.dumps(results, indent=2))
+
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        os.chdir(ROOT)
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
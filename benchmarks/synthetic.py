@@ -0,0 +1,149 @@
+"""
+ZEN X HOST BOT v4.0 - Synthetic Database
+Realistic-looking cyber_v2.db contents at a chosen size, for the benchmarks
+
+Fills an initialized database (main.init_db) with users, their
+deployments, marketplace listings and purchases with matching payment
+logs, and server/bot log lines. Timestamps are spread over the past
+year, so analytics and keyset pages see many days and months.
+Deterministic for a given seed.
+
+    python benchmarks/synthetic.py --db /tmp/zenx_bench.db --users 5000 --purchases 20000
+
+--db is required and must be a new or empty database, so the live
+cyber_v2.db is never filled with fake users.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import uuid
+import random
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SIZES = {'users': 1000, 'deployments': 3000, 'listings': 2000, 'purchases': 5000, 'logs': 20000}
+
+CATEGORIES = ['general', 'media', 'tools', 'finance', 'games']
+STATUSES = ['Running'] * 4 + ['Stopped'] * 5 + ['Restarting']
+PURCHASE_STATUSES = ['completed'] * 6 + ['pending'] * 3 + ['rejected']
+METHODS = ['bkash', 'nagad', 'rocket', 'bank']
+WORDS = ['music', 'video', 'crypto', 'trading', 'weather', 'news', 'quiz', 'shop', 'support',
+         'translate', 'image', 'chat', 'reminder', 'poll', 'moderation', 'welcome', 'download']
+
+
+def build_database(conn, users=None, deployments=None, listings=None, purchases=None, logs=None, seed=1):
+    """Insert synthetic rows through conn; returns the row counts written"""
+    sizes = {name: value if value is not None else SIZES[name]
+             for name, value in dict(users=users, deployments=deployments, listings=listings,
+                                     purchases=purchases, logs=logs).items()}
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    def stamp(days=365):
+        return (now - timedelta(seconds=rng.randint(0, days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+    base = 1000000  # clear of real Telegram ids such as the admin's
+    user_ids = [base + i for i in range(sizes['users'])]
+    conn.executemany("""
+        INSERT INTO users (id, username, expiry, file_limit, is_prime, join_date, last_active, balance)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, ((uid, f'user{uid}', (now + timedelta(days=rng.randint(-30, 90))).strftime('%Y-%m-%d %H:%M:%S'),
+           rng.choice([3, 10, 25]), rng.randint(0, 1), stamp(), stamp(30), round(rng.uniform(0, 100), 2))
+          for uid in user_ids))
+
+    conn.executemany("""
+        INSERT INTO deployments (user_id, bot_name, filename, pid, status, node_id, auto_restart, created_at, updated_at)
+        VALUES (?, ?, ?, 0, ?, ?, 1, ?, ?)
+    """, ((rng.choice(user_ids), f'bot{i}', f'bot{i}.py', rng.choice(STATUSES), rng.randint(1, 3),
+           created, created) for i, created in ((i, stamp()) for i in range(sizes['deployments']))))
+    bot_ids = [row[0] for row in conn.execute("SELECT id FROM deployments")]
+
+    conn.executemany("""
+        INSERT INTO marketplace_bots
+        (bot_id, title, description, tags, price, category, seller_id, status, purchases, rating, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, ((rng.choice(bot_ids), ' '.join(rng.sample(WORDS, 2)).title() + ' Bot',
+           'Telegram bot for ' + ' '.join(rng.choices(WORDS, k=12)), ','.join(rng.sample(WORDS, 2)),
+           round(rng.uniform(1, 50), 2), rng.choice(CATEGORIES), rng.choice(user_ids),
+           'available' if rng.random() < 0.9 else 'sold', rng.randint(0, 500),
+           round(rng.uniform(0, 5), 1), created, created)
+          for created in (stamp() for _ in range(sizes['listings']))))
+    listings = [tuple(row) for row in conn.execute("SELECT id, price FROM marketplace_bots")]
+
+    purchase_rows, payment_rows = [], []
+    for _ in range(sizes['purchases']):
+        listing_id, price = rng.choice(listings)
+        buyer, status, method, purchased = rng.choice(user_ids), rng.choice(PURCHASE_STATUSES), rng.choice(METHODS), stamp()
+        transaction_id = uuid.UUID(int=rng.getrandbits(128)).hex
+        purchase_rows.append((listing_id, buyer, price, status, method, transaction_id, purchased,
+                              purchased if status == 'completed' else None, int(status == 'completed')))
+        payment_rows.append((buyer, price, method, transaction_id, status, f'Purchase: listing {listing_id}', purchased))
+    conn.executemany("""
+        INSERT INTO marketplace_purchases
+        (listing_id, buyer_id, price, status, payment_method, transaction_id, purchased_at, completed_at, bot_delivered)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, purchase_rows)
+    conn.executemany("""
+        INSERT INTO payment_logs (user_id, amount, method, transaction_id, status, purpose, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, payment_rows)
+
+    conn.executemany("INSERT INTO server_logs (timestamp, event, details, user_id) VALUES (?, ?, ?, ?)",
+                     ((stamp(30), rng.choice(['DEPLOY', 'STOP', 'LOGIN', 'MARKETPLACE_PURCHASE']),
+                       'synthetic event', rng.choice(user_ids)) for _ in range(sizes['logs'] // 2)))
+    conn.executemany("INSERT INTO bot_logs (bot_id, timestamp, log_type, message) VALUES (?, ?, ?, ?)",
+                     ((rng.choice(bot_ids), stamp(30), rng.choice(['DEPLOY_SUCCESS', 'STOP', 'AUTO_RESTART']),
+                       'synthetic log line') for _ in range(sizes['logs'] - sizes['logs'] // 2)))
+    conn.commit()
+    return sizes
+
+
+def add_size_arguments(parser):
+    """--users/--deployments/... options, defaulting to SIZES"""
+    for name, default in SIZES.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def build_from_args(conn, args):
+    return build_database(conn, **{name: getattr(args, name) for name in SIZES}, seed=args.seed)
+
+
+def has_users(path):
+    """Whether the database at path exists and already holds users"""
+    if not os.path.exists(path):
+        return False
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT EXISTS (SELECT 1 FROM users)").fetchone()[0] == 1
+    except sqlite3.OperationalError:
+        return False  # no users table yet
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='database file to create (must not hold users yet)')
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    if has_users(args.db):
+        parser.error(f"{args.db} already has users; synthetic data only goes into a new database")
+
+    import main as zenx
+
+    zenx.Config.DB_NAME = args.db
+    zenx.init_db()
+    conn = zenx.get_db()
+    start = time.perf_counter()
+    sizes = build_from_args(conn, args)
+    conn.close()
+    print(f"Built {zenx.Config.DB_NAME} in {time.perf_counter() - start:.1f}s: "
+          + ', '.join(f"{count} {name}" for name, count in sizes.items()))
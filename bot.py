@@ -4,6 +4,7 @@ All bot commands, callbacks, and message handlers
 """
 
 import os
+import shutil
 import telebot
 import threading
 import time
@@ -23,7 +24,8 @@ from main import (
     backup_database, get_system_stats, get_available_nodes,
     check_prime_expiry, update_user_bot_count, create_progress_bar,
     log_event, log_bot_event, send_notification, start_bot_monitoring,
-    assign_bot_to_node, extract_zip_file
+    assign_bot_to_node, extract_zip_file, activate_bot_version, redeploy_bot,
+    rollback_bot
 )
 
 bot = telebot.TeleBot(Config.TOKEN, parse_mode="Markdown")
@@ -202,6 +204,26 @@ def handle_admin(message):
     else:
         bot.reply_to(message, "⛔ **Access Denied!**")
 
+@bot.message_handler(commands=['rollback'])
+def handle_rollback(message):
+    """Switch a bot back to its previous version: /rollback <bot name>"""
+    uid = message.from_user.id
+    bot_name = message.text.partition(' ')[2].strip()
+    
+    if not bot_name:
+        bot.reply_to(message, "↩️ **Usage:** `/rollback <bot name>`")
+        return
+    
+    bot_info = execute_db("SELECT id FROM deployments WHERE user_id=? AND bot_name=? ORDER BY id DESC LIMIT 1",
+                          (uid, bot_name), fetchone=True)
+    if not bot_info:
+        bot.reply_to(message, f"❌ No bot named **{bot_name}**.")
+        return
+    
+    status_msg = bot.reply_to(message, f"↩️ Rolling back **{bot_name}**...")
+    success, result = rollback_bot(bot_info['id'])
+    bot.edit_message_text(f"{'✅' if success else '❌'} {result}", message.chat.id, status_msg.message_id)
+
 @bot.message_handler(func=lambda message: True)
 def handle_text_messages(message):
     """Handle all text messages"""
@@ -222,6 +244,8 @@ def handle_text_messages(message):
         process_marketplace_price(message)
     elif session.get('state') == 'waiting_for_payment':
         process_payment_info(message)
+    elif session.get('state') == 'waiting_for_marketplace_search':
+        process_marketplace_search(message)
     else:
         # Handle main menu buttons
         handle_main_menu_buttons(message)
@@ -363,27 +387,12 @@ def handle_marketplace(message):
             "⚠️ **Prime Required**\n\nYou need active Prime to access marketplace.")
         return
     
-    conn = get_db()
-    c = conn.cursor()
-    
-    # Get featured bots
-    c.execute("""
-        SELECT mb.*, d.bot_name, u.username as seller_username
-        FROM marketplace_bots mb
-        JOIN deployments d ON mb.bot_id = d.id
-        JOIN users u ON mb.seller_id = u.id
-        WHERE mb.status = 'available'
-        ORDER BY mb.purchases DESC
-        LIMIT 5
-    """)
-    
-    featured = c.fetchall()
-    
-    # Get categories
-    c.execute("SELECT DISTINCT category FROM marketplace_bots WHERE status='available'")
-    categories = [row[0] for row in c.fetchall()]
+    from marketplace import get_marketplace_stats
     
-    conn.close()
+    # Featured bots and categories, from the materialized leaderboards
+    stats = get_marketplace_stats()
+    featured = stats['featured'][:5]
+    categories = [f for f in stats['categories'] if f['available'] > 0]
     
     text = """
 🛒 **BOT MARKETPLACE v4.0**
@@ -406,7 +415,8 @@ def handle_marketplace(message):
     
     # Category buttons
     for cat in categories[:4]:
-        markup.add(types.InlineKeyboardButton(f"📁 {cat}", callback_data=f"marketplace_cat_{cat}"))
+        markup.add(types.InlineKeyboardButton(f"📁 {cat['category']} ({cat['available']})",
+                                              callback_data=f"marketplace_cat_{cat['category']}"))
     
     markup.add(
         types.InlineKeyboardButton("🔍 Search", callback_data="marketplace_search"),
@@ -418,6 +428,61 @@ def handle_marketplace(message):
     
     bot.send_message(message.chat.id, text, reply_markup=markup)
 
+def start_marketplace_search(call):
+    """Ask for search keywords"""
+    user_sessions[call.from_user.id] = {'state': 'waiting_for_marketplace_search'}
+    bot.answer_callback_query(call.id)
+    bot.send_message(call.message.chat.id,
+        "🔍 **Marketplace Search**\n\nSend keywords to search listing titles, descriptions and tags:")
+
+def process_marketplace_search(message):
+    """Run a marketplace search from the user's keywords"""
+    uid = message.from_user.id
+    user_sessions[uid] = {'state': 'marketplace_search_results', 'query': message.text.strip()}
+    show_search_results(message.chat.id, uid, 1)
+
+def show_search_results(chat_id, uid, page, message_id=None):
+    """Show one page of search results, editing the previous page in place"""
+    from marketplace import search_listings
+    
+    query = user_sessions.get(uid, {}).get('query')
+    if not query:
+        bot.send_message(chat_id, "⌛ Search expired. Tap 🔍 Search to start a new one.")
+        return
+    
+    result = search_listings(query, page=page, limit=Config.MARKETPLACE_SEARCH_PAGE_SIZE)
+    
+    text = f"""
+🔍 **SEARCH:** `{query.replace('`', '')[:50]}`
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+    if result['results']:
+        text += f"📄 Page {page} • Best matches first\n💡 *Tap a listing to view it*"
+    else:
+        text += "❌ No listings found. Try fewer or shorter keywords."
+    
+    markup = types.InlineKeyboardMarkup(row_width=2)
+    
+    # Titles go on buttons, which aren't parsed as Markdown
+    for listing in result['results']:
+        markup.add(types.InlineKeyboardButton(
+            f"🤖 {listing['title'][:40]} • ${listing['price']:.2f}",
+            callback_data=f"marketplace_view_{listing['id']}"))
+    
+    nav = []
+    if page > 1:
+        nav.append(types.InlineKeyboardButton("◀️ Prev", callback_data=f"marketplace_sp_{page - 1}"))
+    if result['next_page']:
+        nav.append(types.InlineKeyboardButton("Next ▶️", callback_data=f"marketplace_sp_{result['next_page']}"))
+    if nav:
+        markup.row(*nav)
+    markup.add(types.InlineKeyboardButton("🔍 New Search", callback_data="marketplace_search"))
+    
+    if message_id:
+        bot.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+    else:
+        bot.send_message(chat_id, text, reply_markup=markup)
+
 # ==================== ADMIN HANDLERS ====================
 
 def handle_admin_panel(message):
@@ -465,20 +530,12 @@ def handle_admin_buttons(message, button_text):
 
 def admin_marketplace(message):
     """Admin marketplace management"""
-    conn = get_db()
-    c = conn.cursor()
+    from marketplace import get_marketplace_stats
     
-    # Get marketplace stats
-    c.execute("""
-        SELECT 
-            COUNT(*) as total_listings,
-            SUM(price) as total_value,
-            COUNT(CASE WHEN status='available' THEN 1 END) as available,
-            COUNT(CASE WHEN status='sold' THEN 1 END) as sold
-        FROM marketplace_bots
-    """)
+    stats = get_marketplace_stats()['totals']
     
-    stats = dict(c.fetchone())
+    conn = get_db()
+    c = conn.cursor()
     
     # Get recent sales
     c.execute("""
@@ -498,10 +555,10 @@ def admin_marketplace(message):
 🛒 **MARKETPLACE ADMIN**
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 📊 **Statistics:**
-• Total Listings: {stats['total_listings']}
+• Total Listings: {stats['listings']}
 • Available: {stats['available']}
 • Sold: {stats['sold']}
-• Total Value: ${stats['total_value'] or 0:.2f}
+• Total Value: ${stats['total_value']:.2f}
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 💰 **Recent Sales:**
 """
@@ -712,6 +769,12 @@ def handle_marketplace_callbacks(call):
     elif data.startswith("marketplace_cat_"):
         category = data.split("_")[2]
         browse_category(call, category)
+    elif data == "marketplace_search":
+        start_marketplace_search(call)
+    elif data.startswith("marketplace_sp_"):
+        page = int(data.split("_")[2])
+        bot.answer_callback_query(call.id)
+        show_search_results(call.message.chat.id, call.from_user.id, page, call.message.message_id)
 
 def handle_admin_callbacks(call):
     """Handle admin callbacks"""
@@ -876,6 +939,9 @@ def process_payment_info(message):
     conn.commit()
     conn.close()
     
+    from events import publish
+    publish('purchase_created', purchase_id=purchase_id, listing_id=bot_id, buyer_id=uid, price=float(price))
+    
     # Clear session
     user_sessions.pop(uid, None)
     
@@ -915,11 +981,51 @@ def process_payment_info(message):
 # ==================== BOT TESTING & BACKUP ====================
 
 def test_bot(call, bot_id):
-    """Test run a bot"""
-    from main import test_run_bot
-    
-    success, message = test_run_bot(bot_id)
-    
+    """Test run a bot in the sandbox, streaming its output into the chat"""
+    from test_runner import submit_test, format_test_result
+
+    chat_id = call.message.chat.id
+    progress = {}  # message_id of the live output message, once it's sent
+
+    def on_output(output):
+        if 'message_id' not in progress:
+            return
+        tail = output[-1500:] or "(no output yet)"
+        try:
+            bot.edit_message_text(f"🧪 Testing bot {bot_id}...\n\n{tail}", chat_id,
+                                  progress['message_id'], parse_mode=None)
+        except Exception:
+            pass  # Unchanged text or rate limited
+
+    def report(done):
+        try:
+            run = done.result()
+            success, message = run['status'] == 'passed', format_test_result(run)
+        except Exception as e:
+            success, message = False, f"❌ Test error: {e}"
+        try:
+            bot.delete_message(chat_id, progress['message_id'])
+        except Exception:
+            pass
+        show_test_result(chat_id, bot_id, success, message)
+
+    run, future = submit_test(bot_id, on_output=on_output)
+    if run is None:
+        bot.answer_callback_query(call.id, f"❌ {future}")
+        return
+
+    if future is None:
+        show_test_result(chat_id, bot_id, run['status'] == 'passed', format_test_result(run))
+        bot.answer_callback_query(call.id, "🧪 Test completed!")
+        return
+
+    bot.answer_callback_query(call.id, "🧪 Test started...")
+    progress['message_id'] = bot.send_message(chat_id, f"🧪 Testing bot {bot_id}...").message_id
+    # Runs in the test pool; the handler returns right away
+    future.add_done_callback(report)
+
+def show_test_result(chat_id, bot_id, success, message):
+    """Send the final test report"""
     if success:
         text = f"""
 🧪 **BOT TEST COMPLETED**
@@ -941,21 +1047,18 @@ def test_bot(call, bot_id):
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
     
-    bot.send_message(call.message.chat.id, text)
-    bot.answer_callback_query(call.id, "🧪 Test completed!")
+    bot.send_message(chat_id, text)
 
 def backup_bot_script(call, bot_id):
     """Backup bot script"""
     from main import backup_bot_script
     
-    backup_path = backup_bot_script(bot_id)
+    download = backup_bot_script(bot_id)
     
-    if backup_path:
+    if download:
         try:
-            with open(backup_path, 'rb') as f:
-                bot.send_document(call.message.chat.id, f,
-                                 caption=f"📦 **Bot Script Backup**\n\n🤖 Bot ID: {bot_id}\n📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            backup_path.unlink(missing_ok=True)
+            bot.send_document(call.message.chat.id, download,
+                             caption=f"📦 **Bot Script Backup**\n\n🤖 Bot ID: {bot_id}\n📄 {download.name}\n📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             bot.answer_callback_query(call.id, "✅ Backup sent!")
         except Exception as e:
             bot.answer_callback_query(call.id, f"❌ Error: {str(e)[:50]}")
@@ -1034,10 +1137,32 @@ def handle_document(message):
         downloaded = bot.download_file(file_info.file_path)
         original_name = message.document.file_name
         
+        if file_name.endswith('.zip'):
+            safe_name = ingest_uploaded_zip(message, downloaded, original_name)
+            if not safe_name:
+                return
+
+            user_sessions[uid] = {
+                'state': 'waiting_for_bot_name',
+                'filename': safe_name,
+                'original_name': original_name
+            }
+            bot.send_message(message.chat.id, """
+🤖 **BOT NAME SETUP**
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+✅ **Project extracted successfully!**
+📁 **Entrypoint:** `{safe_name}`
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Enter a name for your bot (max 50 chars):
+Use an existing bot's name to update it in place.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+""".format(safe_name=safe_name))
+            return
+
         # Save file
         project_path = Path(Config.PROJECT_DIR)
         safe_name = secure_filename(original_name)
-        
+
         # Check for duplicates
         counter = 1
         original_safe_name = safe_name
@@ -1049,6 +1174,14 @@ def handle_document(message):
         file_path = project_path / safe_name
         file_path.write_bytes(downloaded)
         
+        from preflight import preflight_check, format_preflight_errors
+        ok, report = preflight_check(file_path)
+        if not ok:
+            file_path.unlink()
+            bot.reply_to(message, f"❌ **Script Rejected!**\n\n{format_preflight_errors(report)}\n\n"
+                                  f"Fix the script and send it again.", parse_mode=None)
+            return
+        
         # Update session
         user_sessions[uid] = {
             'state': 'waiting_for_bot_name',
@@ -1064,6 +1197,7 @@ def handle_document(message):
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 Enter a name for your bot (max 50 chars):
 Example: `News Bot v2.0`, `Music Player`, `AI Assistant`
+Use an existing bot's name to update it in place.
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """.format(safe_name=safe_name))
         
@@ -1071,6 +1205,50 @@ Example: `News Bot v2.0`, `Music Player`, `AI Assistant`
         logger.error(f"Upload error: {e}")
         bot.reply_to(message, f"❌ **Error:** {str(e)[:100]}")
 
+def ingest_uploaded_zip(message, downloaded, original_name):
+    """Extract an uploaded ZIP project, reporting progress in the chat"""
+    from zip_ingest import ingest_zip_project
+
+    chat_id = message.chat.id
+    status_msg = bot.reply_to(message, f"📦 **Extracting project...**\n{create_progress_bar(0)} 0%")
+
+    def progress(percent):
+        bot.edit_message_text(f"📦 **Extracting project...**\n{create_progress_bar(percent)} {percent}%",
+                              chat_id, status_msg.message_id)
+
+    project_name = secure_filename(original_name.rsplit('.', 1)[0]) or f"project_{message.from_user.id}"
+
+    with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as tmp:
+        tmp.write(downloaded)
+        tmp_path = tmp.name
+
+    try:
+        success, result = ingest_zip_project(tmp_path, project_name, progress=progress)
+    finally:
+        os.unlink(tmp_path)
+
+    if not success:
+        bot.edit_message_text(f"❌ **ZIP Rejected!**\n\n{result}", chat_id, status_msg.message_id)
+        return None
+
+    # Also starts installing requirements so the first deploy doesn't wait
+    from preflight import preflight_check, format_preflight_errors
+    ok, report = preflight_check(Path(Config.PROJECT_DIR) / result['filename'])
+    if not ok:
+        shutil.rmtree(Path(Config.PROJECT_DIR) / result['project_dir'], ignore_errors=True)
+        bot.edit_message_text(f"❌ Project Rejected!\n\n{format_preflight_errors(report)}",
+                              chat_id, status_msg.message_id, parse_mode=None)
+        return None
+    deps_hash = report['deps_hash']
+
+    bot.edit_message_text(
+        f"✅ **Project extracted**\n📁 {result['files']} files, {result['size'] // 1024} KB\n"
+        f"🚀 Entrypoint: `{result['entrypoint']}`\n"
+        f"📦 Libraries: {'installing in background' if deps_hash else 'none required'}",
+        chat_id, status_msg.message_id)
+
+    return result['filename']
+
 def process_bot_name_input(message):
     """Process bot name input"""
     uid = message.from_user.id
@@ -1090,6 +1268,19 @@ def process_bot_name_input(message):
     filename = session['filename']
     original_name = session['original_name']
     
+    # Same name as an existing bot: this upload is its new version
+    existing = execute_db("SELECT id FROM deployments WHERE user_id=? AND bot_name=? ORDER BY id DESC LIMIT 1",
+                          (uid, bot_name), fetchone=True)
+    if existing:
+        user_sessions.pop(uid, None)
+        status_msg = bot.send_message(chat_id, f"🔄 Updating **{bot_name}**...")
+        success, result = redeploy_bot(existing['id'], filename)
+        text = f"{'✅' if success else '❌'} {result}"
+        if success:
+            text += f"\n\n↩️ Undo with `/rollback {bot_name}`"
+        bot.edit_message_text(text, chat_id, status_msg.message_id)
+        return
+    
     # Save to database
     created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     execute_db("""
@@ -1100,6 +1291,10 @@ def process_bot_name_input(message):
         uid, bot_name, filename, 0, None, "Uploaded", created_at, 1, created_at, created_at
     ), commit=True)
     
+    bot_id = execute_db("SELECT id FROM deployments WHERE user_id=? AND filename=? ORDER BY id DESC LIMIT 1",
+                        (uid, filename), fetchone=True)['id']
+    activate_bot_version(bot_id, filename)
+    
     # Update user bot count
     update_user_bot_count(uid)
     
@@ -1130,12 +1325,45 @@ def process_bot_name_input(message):
     bot.send_message(chat_id, text, reply_markup=markup)
     send_notification(uid, f"Bot '{bot_name}' uploaded successfully!")
 
+# ==================== EVENTS FROM OTHER PROCESSES ====================
+
+def on_bot_crashed(event):
+    """Tell the owner right away when the worker sees their bot crash"""
+    name = event.get('bot_name') or f"#{event['bot_id']}"
+    action = "Restarting it now." if event.get('auto_restart') else "Auto-restart is off; deploy it again from My Bots."
+    bot.send_message(event['user_id'], f"⚠️ Your bot {name} crashed. {action}", parse_mode=None)
+
+def on_purchase_created(event):
+    """Ask the admin to approve an order placed outside this bot"""
+    price = f" for ${float(event['price']):.2f}" if event.get('price') is not None else ""
+    bot.send_message(Config.ADMIN_ID,
+                     f"🛒 New order #{event['purchase_id']} from user {event['buyer_id']}{price}\n"
+                     f"Review it on the admin panel's Orders page.", parse_mode=None)
+
+def on_order_approved(event):
+    """Tell the buyer their order went through"""
+    text = f"✅ Order #{event['purchase_id']} approved."
+    if event.get('delivered'):
+        text += f" {event.get('bot_name') or 'Your bot'} is in My Bots, ready to deploy."
+    bot.send_message(event['buyer_id'], text, parse_mode=None)
+
+def listen_for_events():
+    """React to the worker and the web app as soon as they publish"""
+    from events import subscribe, start_listener
+    
+    subscribe('bot_crashed', on_bot_crashed)
+    subscribe('purchase_created', on_purchase_created)
+    subscribe('order_approved', on_order_approved)
+    start_listener()
+
 # ==================== START BOT POLLING ====================
 
 def start_bot():
     """Start the Telegram bot"""
     print("🤖 Telegram Bot starting...")
     
+    listen_for_events()
+    
     while True:
         try:
             bot.polling(none_stop=True, timeout=60)
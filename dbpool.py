@@ -0,0 +1,126 @@
+"""
+ZEN X HOST BOT v4.0 - Green-Safe Database Access
+SQLite calls made under eventlet run in a bounded pool of real threads
+
+Under gunicorn's eventlet worker every request and SocketIO connection
+is a green thread on one OS thread, so a blocking sqlite3 call stalls all
+of them until it returns. offload() hands the call to eventlet's tpool
+instead, with at most DB_POOL_SIZE calls in flight; the calling green
+thread yields until its result is back. GreenConnection and GreenCursor
+wrap a sqlite3 connection so existing code keeps its
+conn.cursor() / c.execute() / c.fetchall() shape.
+
+Outside an eventlet hub (the worker, bot.py, scripts) or with
+ZENX_DB_TPOOL=0, every call runs inline.
+"""
+
+import os
+import threading
+
+try:
+    from eventlet import tpool
+    from eventlet.patcher import is_monkey_patched
+    from eventlet.semaphore import Semaphore
+except ImportError:
+    tpool = None
+
+_pool = {'slots': None}
+_pool_lock = threading.Lock()
+
+
+def is_green():
+    """Whether blocking calls should leave this thread"""
+    return (tpool is not None and os.environ.get('ZENX_DB_TPOOL', '1') != '0'
+            and is_monkey_patched('thread'))
+
+
+def slots():
+    """Semaphore bounding calls in flight, sized on first use"""
+    if _pool['slots'] is None:
+        from main import Config
+        with _pool_lock:
+            if _pool['slots'] is None:
+                tpool.set_num_threads(Config.DB_POOL_SIZE)
+                _pool['slots'] = Semaphore(Config.DB_POOL_SIZE)
+    return _pool['slots']
+
+
+def offload(fn, *args, **kwargs):
+    """Run a blocking call in the thread pool when serving under eventlet, inline otherwise"""
+    if not is_green():
+        return fn(*args, **kwargs)
+    with slots():
+        return tpool.execute(fn, *args, **kwargs)
+
+
+class GreenCursor:
+    """sqlite3 cursor whose blocking calls go through offload()"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        offload(self._cursor.execute, sql, params)
+        return self
+
+    def executemany(self, sql, seq):
+        offload(self._cursor.executemany, sql, seq)
+        return self
+
+    def executescript(self, script):
+        offload(self._cursor.executescript, script)
+        return self
+
+    def fetchone(self):
+        return offload(self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return offload(self._cursor.fetchmany, size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return offload(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        # lastrowid, rowcount, description, close
+        return getattr(self._cursor, name)
+
+
+class GreenConnection:
+    """sqlite3 connection whose blocking calls go through offload()"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return GreenCursor(self._conn.cursor())
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def commit(self):
+        offload(self._conn.commit)
+
+    def rollback(self):
+        offload(self._conn.rollback)
+
+    def close(self):
+        offload(self._conn.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
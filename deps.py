@@ -0,0 +1,195 @@
+"""
+ZEN X HOST BOT v4.0 - Dependency Manager
+Shared virtualenvs keyed by requirements hash, built in a bounded background pool
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import logging
+import platform
+import threading
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from main import Config
+
+logger = logging.getLogger(__name__)
+
+READY_MARKER = '.ready'
+
+build_executor = ThreadPoolExecutor(max_workers=Config.DEP_BUILD_WORKERS)
+build_futures = {}
+build_lock = threading.Lock()
+
+
+def find_requirements(script_path):
+    """Locate requirements.txt for a script inside its project directory"""
+    project_root = Path(Config.PROJECT_DIR).resolve()
+    current = Path(script_path).resolve().parent
+
+    # Single-file uploads live directly in PROJECT_DIR and never have requirements
+    while current != project_root and project_root in current.parents:
+        candidate = current / 'requirements.txt'
+        if candidate.is_file():
+            return candidate
+        current = current.parent
+
+    return None
+
+
+def parse_requirements(text):
+    """Normalize requirement lines so equivalent files hash the same"""
+    lines = set()
+    for raw in text.splitlines():
+        line = raw.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith('-'):
+            # Nested files, editable installs and index overrides are not supported
+            logger.warning(f"Skipping unsupported requirements option: {line}")
+            continue
+        lines.add(' '.join(line.split()).lower())
+    return sorted(lines)
+
+
+def requirements_hash(requirements):
+    """Hash normalized requirements together with the interpreter version"""
+    digest = hashlib.sha256()
+    digest.update(f"{platform.python_implementation()}-{platform.python_version()}\n".encode())
+    digest.update('\n'.join(requirements).encode())
+    return digest.hexdigest()[:20]
+
+
+def venv_python(venv_dir):
+    """Path of the interpreter inside a virtualenv"""
+    if os.name == 'nt':
+        return Path(venv_dir) / 'Scripts' / 'python.exe'
+    return Path(venv_dir) / 'bin' / 'python'
+
+
+def _build_environment(req_hash, requirements):
+    """Create the virtualenv for one requirements hash"""
+    venv_root = Path(Config.VENV_DIR)
+    final_dir = venv_root / req_hash
+    build_dir = venv_root / f".build_{req_hash}_{os.getpid()}"
+    log_file = Path(Config.LOGS_DIR) / f"deps_{req_hash}.log"
+
+    shutil.rmtree(build_dir, ignore_errors=True)
+
+    try:
+        subprocess.run([sys.executable, '-m', 'venv', str(build_dir)],
+                       check=True, capture_output=True, timeout=Config.DEP_BUILD_TIMEOUT)
+
+        req_file = build_dir / 'requirements.txt'
+        req_file.write_text('\n'.join(requirements) + '\n')
+
+        env = dict(os.environ)
+        # One wheel cache for every environment, so shared packages download once
+        env['PIP_CACHE_DIR'] = str((venv_root / '.pip-cache').resolve())
+
+        with open(log_file, 'w') as f:
+            subprocess.run(
+                [str(venv_python(build_dir)), '-m', 'pip', 'install',
+                 '--disable-pip-version-check', '-r', str(req_file)],
+                stdout=f, stderr=subprocess.STDOUT, env=env,
+                check=True, timeout=Config.DEP_BUILD_TIMEOUT
+            )
+
+        (build_dir / READY_MARKER).write_text('\n'.join(requirements) + '\n')
+
+        # Bots start the interpreter directly (never the bin/ wrappers), so the
+        # finished venv can be moved into place atomically
+        if final_dir.exists():
+            shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(build_dir, final_dir)
+
+        logger.info(f"Dependency environment ready: {req_hash} ({len(requirements)} packages)")
+        return final_dir
+
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    finally:
+        with build_lock:
+            build_futures.pop(req_hash, None)
+
+
+def schedule_build(script_path):
+    """Start building a script's environment in the background; returns its hash or None"""
+    req_file = find_requirements(script_path)
+    if not req_file:
+        return None
+
+    requirements = parse_requirements(req_file.read_text(errors='ignore'))
+    if not requirements:
+        return None
+
+    req_hash = requirements_hash(requirements)
+    if (Path(Config.VENV_DIR) / req_hash / READY_MARKER).exists():
+        return req_hash
+
+    with build_lock:
+        if req_hash not in build_futures:
+            Path(Config.VENV_DIR).mkdir(exist_ok=True)
+            build_futures[req_hash] = build_executor.submit(_build_environment, req_hash, requirements)
+
+    return req_hash
+
+
+def planned_python(script_path):
+    """Interpreter a script will run with, starting its environment build without waiting for it"""
+    req_hash = schedule_build(script_path)
+    if not req_hash:
+        return sys.executable
+    return str(venv_python((Path(Config.VENV_DIR) / req_hash).resolve()))
+
+
+def resolve_python(script_path, timeout=None):
+    """Get the interpreter a script should run with, waiting for its environment if needed"""
+    try:
+        req_hash = schedule_build(script_path)
+    except Exception as e:
+        logger.error(f"Dependency scan error for {script_path}: {e}")
+        return False, f"Could not read requirements: {e}"
+
+    if not req_hash:
+        return True, sys.executable
+
+    venv_dir = (Path(Config.VENV_DIR) / req_hash).resolve()
+    if (venv_dir / READY_MARKER).exists():
+        return True, str(venv_python(venv_dir))
+
+    with build_lock:
+        future = build_futures.get(req_hash)
+
+    if future is None:
+        # Finished between the two checks
+        if (venv_dir / READY_MARKER).exists():
+            return True, str(venv_python(venv_dir))
+        return False, "Dependency install failed. Check requirements.txt."
+
+    try:
+        future.result(timeout=timeout if timeout is not None else Config.DEP_BUILD_TIMEOUT)
+        return True, str(venv_python(venv_dir))
+    except FutureTimeout:
+        return False, "Dependencies are still installing. Try again shortly."
+    except Exception as e:
+        logger.error(f"Dependency install failed for {req_hash}: {e}")
+        return False, "Dependency install failed. Check requirements.txt."
+
+
+def get_environment_stats():
+    """Summarize shared environments for admin views"""
+    venv_root = Path(Config.VENV_DIR)
+    ready = [p for p in venv_root.glob('*') if (p / READY_MARKER).exists()] if venv_root.exists() else []
+
+    with build_lock:
+        building = len(build_futures)
+
+    return {
+        'environments': len(ready),
+        'building': building
+    }
@@ -0,0 +1,200 @@
+"""
+ZEN X HOST BOT v4.0 - Event Bus
+Typed pub/sub events between the worker (main.py), bot.py and the web app
+
+Each process publishes what it just did (a bot started, crashed, an order
+was approved) and the others react right away instead of polling the
+database. Events go over Redis pub/sub when REDIS_URL is set (see
+render.yaml), and otherwise over Unix datagram sockets in
+EVENT_SOCKET_DIR, one per listening process, which is enough to run
+all three processes on one machine:
+
+    python main.py & python bot.py & python app.py
+
+Delivery is best effort. The database stays the source of truth, and an
+event lost while a process was down is only a delay. A process never
+receives its own events; it has already acted on them.
+
+An event is a JSON object: {"type": ..., "origin": ..., "at": ...} plus
+the fields EVENT_TYPES requires for its type.
+"""
+
+import os
+import json
+import atexit
+import time
+import uuid
+import socket
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+
+from main import Config
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# type -> fields every event of that type carries
+EVENT_TYPES = {
+    'bot_started': ('bot_id', 'user_id'),
+    'bot_stopped': ('bot_id', 'user_id'),
+    'bot_crashed': ('bot_id', 'user_id'),
+    'purchase_created': ('purchase_id', 'listing_id', 'buyer_id'),
+    'order_approved': ('purchase_id', 'buyer_id'),
+    'marketplace_changed': (),
+}
+
+MAX_EVENT = 64 * 1024
+
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_handlers = {}  # type or '*' -> [handler]
+_bus = {'transport': None, 'listening': False}
+_bus_lock = threading.Lock()
+
+
+# ==================== TRANSPORTS ====================
+
+class RedisTransport:
+    """Redis pub/sub on one channel"""
+
+    def __init__(self, url, channel):
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def send(self, data):
+        self.client.publish(self.channel, data)
+
+    def listen(self, deliver):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        try:
+            for message in pubsub.listen():
+                deliver(message['data'])
+        finally:
+            pubsub.close()
+
+
+class SocketTransport:
+    """One datagram socket per listening process in a shared directory"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sender.setblocking(False)
+        self.receiver = None
+
+    def send(self, data):
+        for path in self.directory.glob('*.sock'):
+            if path == self.path:
+                continue
+            try:
+                self.sender.sendto(data, str(path))
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Its process is gone
+                path.unlink(missing_ok=True)
+            except BlockingIOError:
+                logger.warning(f"Event dropped, {path.name} is not keeping up")
+
+    def listen(self, deliver):
+        if self.receiver is None:
+            self.receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.receiver.bind(str(self.path))
+            atexit.register(self.path.unlink, missing_ok=True)
+        while True:
+            deliver(self.receiver.recv(MAX_EVENT))
+
+
+def get_transport():
+    """This process's transport, created on first use"""
+    with _bus_lock:
+        if _bus['transport'] is None:
+            if Config.EVENT_BUS_URL and redis is not None:
+                _bus['transport'] = RedisTransport(Config.EVENT_BUS_URL, Config.EVENT_CHANNEL)
+            else:
+                if Config.EVENT_BUS_URL:
+                    logger.warning("REDIS_URL is set but redis is not installed; using Unix sockets")
+                _bus['transport'] = SocketTransport(Config.EVENT_SOCKET_DIR)
+        return _bus['transport']
+
+
+# ==================== PUBLISH / SUBSCRIBE ====================
+
+def publish(event_type, **fields):
+    """Send an event to the other processes; False if it couldn't be sent"""
+    required = EVENT_TYPES.get(event_type)
+    if required is None:
+        raise ValueError(f"Unknown event type: {event_type}")
+    missing = [name for name in required if name not in fields]
+    if missing:
+        raise ValueError(f"{event_type} event missing {', '.join(missing)}")
+
+    event = dict(fields, type=event_type, origin=ORIGIN,
+                 at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    data = json.dumps(event, default=str).encode()
+    if len(data) > MAX_EVENT:
+        raise ValueError(f"{event_type} event is too large")
+
+    try:
+        get_transport().send(data)
+        return True
+    except Exception as e:
+        logger.warning(f"Could not publish {event_type}: {e}")
+        return False
+
+
+def subscribe(event_type, handler):
+    """Call handler(event) for every event of a type ('*' for all) from other processes"""
+    if event_type != '*' and event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown event type: {event_type}")
+    with _bus_lock:
+        _handlers.setdefault(event_type, []).append(handler)
+
+
+def dispatch(data):
+    """Hand one received event to its handlers"""
+    try:
+        event = json.loads(data)
+    except (TypeError, ValueError):
+        logger.warning("Ignoring malformed event")
+        return
+    if not isinstance(event, dict) or event.get('origin') == ORIGIN:
+        return
+
+    handlers = _handlers.get(event.get('type'), []) + _handlers.get('*', [])
+    for handler in handlers:
+        try:
+            handler(event)
+        except Exception as e:
+            logger.error(f"Event handler error for {event.get('type')}: {e}")
+
+
+def listener():
+    """Receive events until the process exits, reconnecting after errors"""
+    while True:
+        try:
+            get_transport().listen(dispatch)
+        except Exception as e:
+            logger.error(f"Event bus error: {e}")
+        time.sleep(Config.EVENT_BUS_RETRY)
+
+
+def start_listener():
+    """Start receiving events in this process (once)"""
+    with _bus_lock:
+        if _bus['listening']:
+            return
+        _bus['listening'] = True
+    threading.Thread(target=listener, daemon=True, name='event-bus').start()
+
+
+def is_listening():
+    """Whether this process receives events, so it can skip polling for them"""
+    return _bus['listening']
@@ -2,15 +2,16 @@
 Gunicorn configuration for production
 """
 
-import multiprocessing
 import os
 
 # Server socket
 bind = "0.0.0.0:" + os.environ.get("PORT", "8080")
 backlog = 2048
 
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
+# Worker processes: one eventlet worker, as in the Procfile. SocketIO rooms
+# live in the worker's memory, and SQLite calls already run in real threads
+# (dbpool.py), so extra workers would split clients without adding throughput.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
 worker_class = "eventlet"
 worker_connections = 1000
 timeout = 120
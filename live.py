@@ -0,0 +1,169 @@
+"""
+ZEN X HOST BOT v4.0 - Live Dashboard Broadcaster
+Server-side pushes of system stats and bot state transitions over SocketIO
+
+Every status change of a deployment, made by the supervisor, a node or
+the bot, is recorded in bot_events by the init_db triggers. One
+background task per web process reads the events written since its last
+pass every LIVE_PUSH_INTERVAL seconds. It keeps only the latest
+transition of each bot and pushes it to that bot's room and its owner's
+room, then recomputes the stats once and sends only the values that
+changed to the global room. Work per pass is one event query and at most
+one stats query, however many dashboards are connected.
+
+While the event bus (events.py) is listening, bot_events is read only
+after a bot_started, bot_stopped or bot_crashed event has arrived, and
+otherwise every LIVE_STATS_REFRESH seconds in case an event was lost.
+Crashes are also pushed as 'bot_crashed' to the bot's and owner's rooms.
+
+Rooms:
+    global      system stats ('system_stats' on join, 'system_stats_delta' after)
+    user:<id>   'bot_statuses': every bot of that user that changed this pass
+    bot:<id>    'bot_status': that bot's latest transition
+    user/bot rooms also get 'bot_crashed' with the crash event
+"""
+
+import time
+import logging
+import threading
+
+from main import Config, execute_db
+from events import subscribe, start_listener, is_listening
+
+logger = logging.getLogger(__name__)
+
+STATS_QUERY = """
+    SELECT (SELECT COUNT(*) FROM users) AS total_users,
+           (SELECT COUNT(*) FROM deployments) AS total_bots,
+           (SELECT COALESCE(SUM(running_bots), 0) FROM users) AS running_bots,
+           (SELECT COUNT(*) FROM nodes WHERE status = 'active') AS active_nodes
+"""
+
+_state = {'started': False, 'last_event': None, 'stats': None, 'stats_at': 0.0, 'pruned_at': 0.0,
+          'dirty': False, 'crashes': []}
+_state_lock = threading.Lock()
+
+
+def room_for(data):
+    """Room name for a subscribe request, or None if it names no room"""
+    if not isinstance(data, dict):
+        return None
+    kind = data.get('room')
+    if kind == 'global':
+        return 'global'
+    if kind in ('user', 'bot'):
+        try:
+            return f"{kind}:{int(data.get('id'))}"
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def current_stats():
+    """Latest system stats, computed now if no pass has run yet"""
+    if _state['stats'] is None:
+        refresh_stats()
+    return dict(_state['stats'])
+
+
+def refresh_stats():
+    """Recompute the stats; returns the values that changed"""
+    row = execute_db(STATS_QUERY, fetchone=True)
+    stats = dict(row) if row else {}
+    previous = _state['stats'] or {}
+    _state['stats'] = stats
+    _state['stats_at'] = time.monotonic()
+    return {key: value for key, value in stats.items() if previous.get(key) != value}
+
+
+def collect_events():
+    """Latest transition per bot since the last pass"""
+    if _state['last_event'] is None:
+        # Start from now; dashboards get current state from their own first load
+        row = execute_db("SELECT COALESCE(MAX(id), 0) FROM bot_events", fetchone=True)
+        _state['last_event'] = row[0] if row else 0
+        return {}
+
+    rows = execute_db("SELECT * FROM bot_events WHERE id > ? ORDER BY id",
+                      (_state['last_event'],), fetchall=True) or []
+    latest = {}
+    for row in rows:
+        event = dict(row)
+        first = latest.get(event['bot_id'])
+        if first:
+            # Collapse a burst (Stopping -> Stopped -> Running) into one transition
+            event['previous'] = first['previous']
+        latest[event['bot_id']] = event
+        _state['last_event'] = event['id']
+    return latest
+
+
+def on_bot_event(event):
+    """Bus handler: have the next pass read bot_events"""
+    if event['type'] == 'bot_crashed':
+        _state['crashes'].append(event)
+    _state['dirty'] = True
+
+
+def push_once(socketio):
+    """One broadcaster pass: bot transitions to their rooms, stat deltas to global"""
+    now = time.monotonic()
+    refresh_due = now - _state['stats_at'] >= Config.LIVE_STATS_REFRESH
+
+    crashes, _state['crashes'] = _state['crashes'], []
+    for event in crashes:
+        payload = {key: value for key, value in event.items() if key != 'origin'}
+        socketio.emit('bot_crashed', payload, to=f"bot:{event['bot_id']}")
+        socketio.emit('bot_crashed', payload, to=f"user:{event['user_id']}")
+
+    events = {}
+    if _state['dirty'] or refresh_due or not is_listening():
+        _state['dirty'] = False
+        events = collect_events()
+
+    by_user = {}
+    for bot_id, event in events.items():
+        payload = {
+            'bot_id': bot_id,
+            'status': event['status'],
+            'previous': event['previous'],
+            'at': event['created_at']
+        }
+        socketio.emit('bot_status', payload, to=f"bot:{bot_id}")
+        by_user.setdefault(event['user_id'], []).append(payload)
+    for user_id, payloads in by_user.items():
+        socketio.emit('bot_statuses', payloads, to=f"user:{user_id}")
+
+    if events or refresh_due:
+        delta = refresh_stats()
+        if delta:
+            socketio.emit('system_stats_delta', delta, to='global')
+
+    if now - _state['pruned_at'] >= Config.BOT_EVENT_RETENTION:
+        execute_db("DELETE FROM bot_events WHERE created_at < datetime('now', ?)",
+                   (f"-{Config.BOT_EVENT_RETENTION} seconds",), commit=True)
+        _state['pruned_at'] = now
+
+    return len(events)
+
+
+def broadcaster(socketio):
+    """Push live updates until the process exits"""
+    while True:
+        socketio.sleep(Config.LIVE_PUSH_INTERVAL)
+        try:
+            push_once(socketio)
+        except Exception as e:
+            logger.error(f"Live broadcaster error: {e}")
+
+
+def start_broadcaster(socketio):
+    """Start this process's broadcaster once"""
+    with _state_lock:
+        if _state['started']:
+            return
+        _state['started'] = True
+    for event_type in ('bot_started', 'bot_stopped', 'bot_crashed'):
+        subscribe(event_type, on_bot_event)
+    start_listener()
+    socketio.start_background_task(broadcaster, socketio)
@@ -3,7 +3,9 @@ ZEN X HOST BOT v4.0 - Core System Functions
 Bot deployment, monitoring, auto-recovery, and system management
 """
 
+import io
 import os
+import sys
 import sqlite3
 import threading
 import time
@@ -11,8 +13,8 @@ import uuid
 import signal
 import random
 import platform
-import zipfile
 import json
+import hashlib
 import logging
 import subprocess
 import shutil
@@ -20,6 +22,8 @@ from pathlib import Path
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 
+from dbpool import offload
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -56,13 +60,135 @@ class Config:
     BOT_TIMEOUT = 300
     MAX_LOG_SIZE = 10000
     TRIAL_DURATION = 24  # hours
-    
+
+    # ZIP upload limits
+    ZIP_MAX_ENTRIES = 500
+    ZIP_MAX_TOTAL_SIZE = 50 * 1024 * 1024  # uncompressed bytes
+    ZIP_MAX_FILE_SIZE = 20 * 1024 * 1024
+    ZIP_MAX_RATIO = 100  # uncompressed / compressed
+    ZIP_PARALLEL_THRESHOLD = 4 * 1024 * 1024
+    ZIP_WORKERS = 4
+
+    # Dependency environments
+    VENV_DIR = 'venvs'
+    DEP_BUILD_WORKERS = 2
+    DEP_BUILD_TIMEOUT = 600
+
+    # Warm interpreter launcher
+    USE_ZYGOTE = os.environ.get('ZENX_ZYGOTE', '1') == '1'
+    ZYGOTE_MAX = 8
+
+    # Per-bot resource limits by plan
+    CGROUP_ROOT = os.environ.get('ZENX_CGROUP_ROOT')
+    PLAN_LIMITS = {
+        'free': {'cpu_percent': 25, 'memory_mb': 128, 'pids': 32},
+        'prime': {'cpu_percent': 100, 'memory_mb': 512, 'pids': 128}
+    }
+
     # 300-Capacity Nodes
+    # Nodes without an agent address run their bots on this machine
     HOSTING_NODES = [
-        {"name": "Node-1", "status": "active", "capacity": 300, "region": "Asia"},
-        {"name": "Node-2", "status": "active", "capacity": 300, "region": "Asia"},
-        {"name": "Node-3", "status": "active", "capacity": 300, "region": "Europe"}
+        {"name": "Node-1", "status": "active", "capacity": 300, "region": "Asia",
+         "cpu_cores": 4, "memory_mb": 4096, "address": os.environ.get('ZENX_NODE_1_ADDR')},
+        {"name": "Node-2", "status": "active", "capacity": 300, "region": "Asia",
+         "cpu_cores": 4, "memory_mb": 4096, "address": os.environ.get('ZENX_NODE_2_ADDR')},
+        {"name": "Node-3", "status": "active", "capacity": 300, "region": "Europe",
+         "cpu_cores": 4, "memory_mb": 4096, "address": os.environ.get('ZENX_NODE_3_ADDR')}
     ]
+    NODE_TOKEN = os.environ.get('ZENX_NODE_TOKEN', '')
+    NODE_HEARTBEAT_INTERVAL = 10
+    NODE_PHI_THRESHOLD = 8.0
+    NODE_PHI_MIN_STD = 2.0  # seconds
+    NODE_ACCEPTABLE_PAUSE = 10  # silence tolerated on top of the usual interval
+    NODE_DOWN_TIMEOUT = 120  # declare a node down after this much silence regardless of phi
+    
+    # Placement: weights for projected CPU/RAM/bot-count utilization, plus a
+    # penalty for each bot the same user already has on a node
+    PLACEMENT_WEIGHTS = {'cpu': 0.4, 'memory': 0.4, 'count': 0.2}
+    PLACEMENT_ANTI_AFFINITY = 0.25
+    
+    # Rebalancer: move bots off nodes above the high watermark (weighted
+    # utilization) to nodes that stay below the low one
+    REBALANCE_INTERVAL = 300
+    REBALANCE_HIGH_WATERMARK = 0.8
+    REBALANCE_LOW_WATERMARK = 0.6
+    REBALANCE_MAX_MOVES = 3  # per pass
+    REBALANCE_MOVE_DELAY = 10  # seconds between moves
+    REBALANCE_MIN_UPTIME = 600  # leave freshly (re)started bots alone
+    REBALANCE_BOT_COOLDOWN = 3600
+    REBALANCE_DRY_RUN = os.environ.get('ZENX_REBALANCE_DRY_RUN', '0') == '1'
+    
+    STOP_GRACE_PERIOD = 10  # seconds between SIGTERM and SIGKILL
+    
+    # Redeploys: the new version takes over once it creates $ZENX_READY_FILE
+    # or has stayed up this many seconds (see blue_green_launch)
+    REDEPLOY_WARMUP = 5
+    
+    # Test runs: sandboxed, at most TEST_WORKERS at a time
+    TEST_WORKERS = 2
+    TEST_TIMEOUT = 30
+    TEST_CPU_SECONDS = 20
+    TEST_MEMORY_MB = 256
+    TEST_FILE_SIZE_MB = 16
+    TEST_OUTPUT_LIMIT = 64 * 1024  # bytes of output kept per run
+    TEST_SCRATCH_DIR = os.environ.get('ZENX_TEST_SCRATCH')  # defaults to /dev/shm
+    
+    # Database backups: online snapshots, BACKUP_PAGES_PER_STEP pages per read
+    # transaction; with BACKUP_INCREMENTAL only changed pages are stored
+    # between full snapshots
+    BACKUP_PAGES_PER_STEP = 256
+    BACKUP_STEP_SLEEP = 0.01  # seconds between steps, for writers
+    BACKUP_MAX_RESTARTS = 3  # then finish in a single step
+    BACKUP_INCREMENTAL = os.environ.get('ZENX_BACKUP_INCREMENTAL', '0') == '1'
+    BACKUP_SEGMENT_INTERVAL = 300  # seconds between incremental runs: the point-in-time resolution
+    BACKUP_FULL_EVERY = 12  # incremental runs between full snapshots
+    BACKUP_KEEP_FULL = 30
+    
+    # Script backups: deduplicated objects, optionally stored as line deltas
+    SCRIPT_STORE_DELTAS = True
+    SCRIPT_STORE_MAX_CHAIN = 10  # deltas before a file is stored whole again
+    SCRIPT_BACKUP_MAX_AGE = 14  # days
+    SCRIPT_BACKUP_KEEP = 5  # newest versions per bot kept regardless of age
+    
+    # Marketplace API pages and their response cache
+    MARKETPLACE_PAGE_SIZE = 20
+    MARKETPLACE_MAX_PAGE_SIZE = 100
+    MARKETPLACE_CACHE_TTL = 30  # seconds; bounds staleness from other processes
+    MARKETPLACE_CACHE_SIZE = 512  # pages
+    
+    # Marketplace search: text matches are re-ranked by popularity
+    MARKETPLACE_SEARCH_MAX_TERMS = 8
+    MARKETPLACE_SEARCH_PAGE_SIZE = 8  # results per Telegram message
+    MARKETPLACE_SEARCH_PURCHASE_BOOST = 0.5  # up to +50% for heavily bought listings
+    MARKETPLACE_SEARCH_RATING_BOOST = 0.3  # up to +30% for a 5-star rating
+    
+    # Marketplace leaderboards and category facets, materialized by triggers
+    MARKETPLACE_LEADERBOARD_SIZE = 10  # listings kept per board
+    MARKETPLACE_STATS_CHECK_INTERVAL = 2  # seconds between version checks by each process
+    
+    # Admin list views: keyset pages with cached approximate totals
+    ADMIN_PAGE_SIZE = 20
+    ADMIN_MAX_PAGE_SIZE = 100
+    ADMIN_COUNT_CACHE_TTL = 60  # seconds
+    
+    # Analytics rollups and system snapshots
+    ROLLUP_INTERVAL = 3600  # seconds between system_analytics snapshots
+    ANALYTICS_DAYS = 30
+    ANALYTICS_MONTHS = 12
+    
+    # Live dashboard pushes over SocketIO
+    LIVE_PUSH_INTERVAL = 1.0  # seconds of bot events coalesced into one push
+    LIVE_STATS_REFRESH = 15  # seconds between stat recomputes when no bot changed
+    BOT_EVENT_RETENTION = 3600  # seconds bot_events rows are kept
+    
+    # Cross-process event bus: Redis when REDIS_URL is set, else Unix sockets in EVENT_SOCKET_DIR
+    EVENT_BUS_URL = os.environ.get('REDIS_URL', '')
+    EVENT_CHANNEL = 'zenx:events'
+    EVENT_SOCKET_DIR = os.environ.get('ZENX_EVENT_DIR', '/tmp/zenx_events')
+    EVENT_BUS_RETRY = 5  # seconds before reconnecting after a bus error
+    
+    # Web server DB calls: real threads that may run SQLite at once under eventlet (see dbpool.py)
+    DB_POOL_SIZE = int(os.environ.get('ZENX_DB_POOL_SIZE', 8))
     
     # Payment settings
     PAYMENT_METHODS = ['bkash', 'nagad', 'rocket', 'bank']
@@ -72,7 +198,7 @@ project_path = Path(Config.PROJECT_DIR)
 project_path.mkdir(exist_ok=True)
 
 for dir_name in [Config.BACKUP_DIR, Config.LOGS_DIR, Config.EXPORTS_DIR, 
-                 Config.SCRIPT_BACKUPS, Config.TRIAL_DIR]:
+                 Config.SCRIPT_BACKUPS, Config.TRIAL_DIR, Config.VENV_DIR]:
     Path(dir_name).mkdir(exist_ok=True)
 
 # Thread pool
@@ -80,8 +206,13 @@ executor = ThreadPoolExecutor(max_workers=10)
 
 # Bot monitors dictionary
 bot_monitors = {}
+bot_processes = {}
 active_trials = {}
 
+# Live node capacity view, built from the database on first use
+placement_engine = None
+placement_lock = threading.Lock()
+
 # ==================== DATABASE FUNCTIONS ====================
 
 def get_db():
@@ -93,31 +224,37 @@ def get_db():
 
 def execute_db(query, params=(), fetchone=False, fetchall=False, commit=False):
     """Execute database query with thread safety"""
-    with db_lock:
-        conn = sqlite3.connect(Config.DB_NAME, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
+    # Each query has its own connection and SQLite serializes writers itself, so no
+    # process-wide lock here; under the web server's eventlet hub this runs in one of
+    # DB_POOL_SIZE real threads
+    return offload(run_query, query, params, fetchone, fetchall, commit)
+
+def run_query(query, params, fetchone, fetchall, commit):
+    """One query on its own connection; None on error"""
+    conn = sqlite3.connect(Config.DB_NAME, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    
+    try:
+        c.execute(query, params)
         
-        try:
-            c.execute(query, params)
-            
-            if commit:
-                conn.commit()
-            
-            if fetchone:
-                result = c.fetchone()
-            elif fetchall:
-                result = c.fetchall()
-            else:
-                result = None
-            
-            conn.close()
-            return result
-            
-        except Exception as e:
-            logger.error(f"Database error: {e}")
-            conn.close()
-            return None
+        if commit:
+            conn.commit()
+        
+        if fetchone:
+            result = c.fetchone()
+        elif fetchall:
+            result = c.fetchall()
+        else:
+            result = None
+        
+        conn.close()
+        return result
+        
+    except Exception as e:
+        logger.error(f"Database error: {e}")
+        conn.close()
+        return None
 
 def init_db():
     """Initialize database with all tables"""
@@ -125,6 +262,9 @@ def init_db():
         conn = get_db()
         c = conn.cursor()
         
+        # WAL lets readers (including online backups) run alongside writers
+        c.execute("PRAGMA journal_mode=WAL")
+        
         # Create core tables
         c.execute('''CREATE TABLE IF NOT EXISTS users 
                     (id INTEGER PRIMARY KEY, username TEXT, expiry TEXT, file_limit INTEGER, 
@@ -225,11 +365,297 @@ def init_db():
                      reference_id TEXT, description TEXT, created_at TEXT,
                      FOREIGN KEY(user_id) REFERENCES users(id))''')
         
+        # Script versions per deployment (current / previous / retired / failed)
+        c.execute('''CREATE TABLE IF NOT EXISTS bot_versions
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, bot_id INTEGER, version INTEGER,
+                     filename TEXT, sha256 TEXT, status TEXT, created_at TEXT, activated_at TEXT,
+                     FOREIGN KEY(bot_id) REFERENCES deployments(id))''')
+        
+        # Node failure history
+        c.execute('''CREATE TABLE IF NOT EXISTS node_failovers
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, node_id INTEGER, detected_at TEXT,
+                     phi REAL, bots INTEGER, moved INTEGER DEFAULT 0, failed INTEGER DEFAULT 0,
+                     finished_at TEXT, recovered_at TEXT,
+                     FOREIGN KEY(node_id) REFERENCES nodes(id))''')
+        
+        # Sandboxed test runs, reused while the script hash is unchanged
+        c.execute('''CREATE TABLE IF NOT EXISTS test_runs
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, bot_id INTEGER, script_hash TEXT,
+                     status TEXT, returncode INTEGER, elapsed REAL, output TEXT, sandbox TEXT,
+                     created_at TEXT, finished_at TEXT,
+                     FOREIGN KEY(bot_id) REFERENCES deployments(id))''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_test_runs_hash ON test_runs(script_hash)")
+        
+        # Pre-flight analysis results keyed by script content hash
+        c.execute('''CREATE TABLE IF NOT EXISTS script_analysis
+                    (sha256 TEXT PRIMARY KEY, ok INTEGER, report TEXT, analyzed_at TEXT)''')
+        
+        # Database backup history and metrics
+        c.execute('''CREATE TABLE IF NOT EXISTS backup_runs
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, filename TEXT, base_id INTEGER,
+                     status TEXT, db_size INTEGER, size INTEGER, page_size INTEGER, pages INTEGER,
+                     changed_pages INTEGER, duration REAL, max_stall_ms REAL, restarts INTEGER,
+                     mode TEXT, integrity TEXT, error TEXT, created_at TEXT)''')
+        
+        # Script store: unique file contents and backup versions listing them
+        c.execute('''CREATE TABLE IF NOT EXISTS script_objects
+                    (sha256 TEXT PRIMARY KEY, size INTEGER, stored_size INTEGER, kind TEXT,
+                     base_sha256 TEXT, depth INTEGER DEFAULT 0, created_at TEXT)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS script_backups
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, bot_id INTEGER, version INTEGER,
+                     entrypoint TEXT, manifest TEXT, size INTEGER, created_at TEXT,
+                     FOREIGN KEY(bot_id) REFERENCES deployments(id))''')
+        
+        # Full-text index over available listings, kept in sync by triggers.
+        # Counter updates (views, purchases) don't touch it.
+        c.execute("SELECT 1 FROM sqlite_master WHERE name='marketplace_fts'")
+        fts_exists = c.fetchone() is not None
+        c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS marketplace_fts USING fts5
+                    (title, description, tags,
+                     content='marketplace_bots', content_rowid='id',
+                     tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS marketplace_fts_insert AFTER INSERT ON marketplace_bots
+                    WHEN new.status = 'available' BEGIN
+                        INSERT INTO marketplace_fts (rowid, title, description, tags)
+                        VALUES (new.id, new.title, new.description, new.tags);
+                    END''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS marketplace_fts_delete AFTER DELETE ON marketplace_bots
+                    WHEN old.status = 'available' BEGIN
+                        INSERT INTO marketplace_fts (marketplace_fts, rowid, title, description, tags)
+                        VALUES ('delete', old.id, old.title, old.description, old.tags);
+                    END''')
+        # One update trigger: SQLite fires triggers newest-first, and the old row must leave first
+        c.execute('''CREATE TRIGGER IF NOT EXISTS marketplace_fts_update
+                    AFTER UPDATE OF title, description, tags, category, status ON marketplace_bots BEGIN
+                        INSERT INTO marketplace_fts (marketplace_fts, rowid, title, description, tags)
+                        SELECT 'delete', old.id, old.title, old.description, old.tags
+                        WHERE old.status = 'available';
+                        INSERT INTO marketplace_fts (rowid, title, description, tags)
+                        SELECT new.id, new.title, new.description, new.tags
+                        WHERE new.status = 'available';
+                    END''')
+        if not fts_exists:
+            c.execute('''INSERT INTO marketplace_fts (rowid, title, description, tags)
+                        SELECT id, title, description, tags FROM marketplace_bots
+                        WHERE status = 'available' ''')
+        
+        # Materialized marketplace aggregates, maintained by triggers so every
+        # writer (bot, web panel, worker) keeps them exact: listing counts per
+        # category, the top MARKETPLACE_LEADERBOARD_SIZE available listings by
+        # purchases overall ('*') and per category, and order totals per
+        # listing. Readers cache them in memory and reload when version moves.
+        c.execute("SELECT 1 FROM sqlite_master WHERE name='marketplace_facets'")
+        stats_exist = c.fetchone() is not None
+        c.execute('''CREATE TABLE IF NOT EXISTS marketplace_facets
+                    (category TEXT PRIMARY KEY, listings INTEGER DEFAULT 0, available INTEGER DEFAULT 0,
+                     sold INTEGER DEFAULT 0, total_value REAL DEFAULT 0)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS marketplace_leaderboard
+                    (board TEXT, position INTEGER, listing_id INTEGER,
+                     PRIMARY KEY (board, position))''')
+        c.execute('''CREATE TABLE IF NOT EXISTS marketplace_listing_stats
+                    (listing_id INTEGER PRIMARY KEY, orders INTEGER DEFAULT 0,
+                     completed INTEGER DEFAULT 0, revenue REAL DEFAULT 0)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS marketplace_stats_version
+                    (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER DEFAULT 0)''')
+        c.execute("INSERT OR IGNORE INTO marketplace_stats_version (id, version) VALUES (1, 0)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_marketplace_rank ON marketplace_bots(status, purchases DESC, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_marketplace_category_rank ON marketplace_bots(status, category, purchases DESC, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_marketplace_listing_completed ON marketplace_listing_stats(completed DESC)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_marketplace_purchases_time ON marketplace_purchases(purchased_at)")
+        
+        facet_upsert = '''
+            INSERT INTO marketplace_facets (category, listings, available, sold, total_value)
+            VALUES (COALESCE({row}.category, 'general'), {sign}1, {sign}({row}.status = 'available'),
+                    {sign}({row}.status = 'sold'), {sign}COALESCE({row}.price, 0))
+            ON CONFLICT(category) DO UPDATE SET
+                listings = listings + excluded.listings, available = available + excluded.available,
+                sold = sold + excluded.sold, total_value = total_value + excluded.total_value;'''
+        board_rebuild = '''
+            DELETE FROM marketplace_leaderboard WHERE board IN ('*', {categories});
+            INSERT INTO marketplace_leaderboard (board, position, listing_id)
+            SELECT '*', ROW_NUMBER() OVER (ORDER BY purchases DESC, id), id FROM (
+                SELECT id, purchases FROM marketplace_bots WHERE status = 'available'
+                ORDER BY purchases DESC, id LIMIT {size});'''
+        category_board = '''
+            INSERT INTO marketplace_leaderboard (board, position, listing_id)
+            SELECT {row}.category, ROW_NUMBER() OVER (ORDER BY purchases DESC, id), id FROM (
+                SELECT id, purchases FROM marketplace_bots WHERE status = 'available' AND category = {row}.category
+                ORDER BY purchases DESC, id LIMIT {size}){where};'''
+        size = Config.MARKETPLACE_LEADERBOARD_SIZE
+        bump = "UPDATE marketplace_stats_version SET version = version + 1 WHERE id = 1;"
+        
+        # Recreated on every start so a changed leaderboard size applies
+        for name in ('marketplace_stats_insert', 'marketplace_stats_delete', 'marketplace_stats_update'):
+            c.execute(f"DROP TRIGGER IF EXISTS {name}")
+        c.execute(f'''CREATE TRIGGER marketplace_stats_insert AFTER INSERT ON marketplace_bots BEGIN
+                    {facet_upsert.format(row='new', sign='')}
+                    {board_rebuild.format(categories='new.category', size=size)}
+                    {category_board.format(row='new', size=size, where='')}
+                    {bump}
+                    END''')
+        c.execute(f'''CREATE TRIGGER marketplace_stats_delete AFTER DELETE ON marketplace_bots BEGIN
+                    {facet_upsert.format(row='old', sign='-')}
+                    {board_rebuild.format(categories='old.category', size=size)}
+                    {category_board.format(row='old', size=size, where='')}
+                    {bump}
+                    END''')
+        c.execute(f'''CREATE TRIGGER marketplace_stats_update
+                    AFTER UPDATE OF category, status, price, purchases ON marketplace_bots BEGIN
+                    {facet_upsert.format(row='old', sign='-')}
+                    {facet_upsert.format(row='new', sign='')}
+                    {board_rebuild.format(categories='old.category, new.category', size=size)}
+                    {category_board.format(row='new', size=size, where='')}
+                    {category_board.format(row='old', size=size, where=' WHERE old.category IS NOT new.category')}
+                    {bump}
+                    END''')
+        
+        listing_upsert = '''
+            INSERT INTO marketplace_listing_stats (listing_id, orders, completed, revenue)
+            VALUES ({row}.listing_id, {sign}1, {sign}({row}.status = 'completed'),
+                    {sign}(({row}.status = 'completed') * COALESCE({row}.price, 0)))
+            ON CONFLICT(listing_id) DO UPDATE SET
+                orders = orders + excluded.orders, completed = completed + excluded.completed,
+                revenue = revenue + excluded.revenue;'''
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS marketplace_orders_insert
+                    AFTER INSERT ON marketplace_purchases BEGIN
+                    {listing_upsert.format(row='new', sign='')}
+                    END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS marketplace_orders_delete
+                    AFTER DELETE ON marketplace_purchases BEGIN
+                    {listing_upsert.format(row='old', sign='-')}
+                    END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS marketplace_orders_update
+                    AFTER UPDATE OF listing_id, status, price ON marketplace_purchases BEGIN
+                    {listing_upsert.format(row='old', sign='-')}
+                    {listing_upsert.format(row='new', sign='')}
+                    END''')
+        
+        if not stats_exist:
+            c.execute('''INSERT INTO marketplace_facets (category, listings, available, sold, total_value)
+                        SELECT COALESCE(category, 'general'), COUNT(*), SUM(status = 'available'),
+                               SUM(status = 'sold'), COALESCE(SUM(price), 0)
+                        FROM marketplace_bots GROUP BY COALESCE(category, 'general')''')
+            c.execute(f'''INSERT INTO marketplace_leaderboard (board, position, listing_id)
+                        SELECT board, position, id FROM (
+                            SELECT '*' AS board, id,
+                                   ROW_NUMBER() OVER (ORDER BY purchases DESC, id) AS position
+                            FROM marketplace_bots WHERE status = 'available'
+                            UNION ALL
+                            SELECT category, id,
+                                   ROW_NUMBER() OVER (PARTITION BY category ORDER BY purchases DESC, id)
+                            FROM marketplace_bots WHERE status = 'available' AND category IS NOT NULL
+                        ) WHERE position <= {size}''')
+            c.execute('''INSERT INTO marketplace_listing_stats (listing_id, orders, completed, revenue)
+                        SELECT listing_id, COUNT(*), SUM(status = 'completed'),
+                               COALESCE(SUM(CASE WHEN status = 'completed' THEN price END), 0)
+                        FROM marketplace_purchases GROUP BY listing_id''')
+        
+        # Analytics rollups: day and month buckets kept by triggers (see rollups.py)
+        from rollups import rollup_trigger_sql, backfill_rollups
+        c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='analytics_rollups'")
+        rollups_exist = c.fetchone() is not None
+        c.execute('''CREATE TABLE IF NOT EXISTS analytics_rollups
+                    (period TEXT, bucket TEXT, metric TEXT, value REAL DEFAULT 0,
+                     PRIMARY KEY (period, bucket, metric))''')
+        c.execute("DELETE FROM system_analytics WHERE id NOT IN (SELECT MAX(id) FROM system_analytics GROUP BY date)")
+        c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_system_analytics_date ON system_analytics(date)")
+        for statement in rollup_trigger_sql():
+            c.execute(statement)
+        if not rollups_exist:
+            backfill_rollups(c)
+        
+        # Bot state transitions, whoever makes them, for the live broadcaster (see live.py)
+        c.execute('''CREATE TABLE IF NOT EXISTS bot_events
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, bot_id INTEGER, user_id INTEGER,
+                     status TEXT, previous TEXT, created_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS deployments_event_insert
+                    AFTER INSERT ON deployments BEGIN
+                    INSERT INTO bot_events (bot_id, user_id, status) VALUES (new.id, new.user_id, new.status);
+                    END''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS deployments_event_update
+                    AFTER UPDATE OF status ON deployments WHEN old.status IS NOT new.status BEGIN
+                    INSERT INTO bot_events (bot_id, user_id, status, previous)
+                    VALUES (new.id, new.user_id, new.status, old.status);
+                    END''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS deployments_event_delete
+                    AFTER DELETE ON deployments BEGIN
+                    INSERT INTO bot_events (bot_id, user_id, status, previous)
+                    VALUES (old.id, old.user_id, 'Deleted', old.status);
+                    END''')
+        
         # System settings table
         c.execute('''CREATE TABLE IF NOT EXISTS system_settings
                     (key TEXT PRIMARY KEY, value TEXT, description TEXT,
                      updated_at TEXT, updated_by INTEGER)''')
         
+        # Columns added after the first release
+        migrations = [
+            ('nodes', 'address', 'TEXT'),
+            ('nodes', 'heartbeat_latency', 'REAL'),
+            ('nodes', 'phi', 'REAL'),
+            ('backup_runs', 'checksum', 'TEXT'),
+            ('backup_runs', 'row_counts', 'TEXT'),
+            ('users', 'running_bots', 'INTEGER DEFAULT 0')
+        ]
+        for table, column, definition in migrations:
+            try:
+                c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            except sqlite3.OperationalError:
+                pass
+        
+        # Per-user bot counts, kept by triggers instead of aggregated per request;
+        # recounted on every start so they can't drift
+        c.execute("CREATE INDEX IF NOT EXISTS idx_deployments_user ON deployments(user_id, status)")
+        user_counts = '''
+            UPDATE users SET total_bots_deployed = COALESCE(total_bots_deployed, 0) {sign} 1,
+                             running_bots = COALESCE(running_bots, 0) {sign} ({row}.status = 'Running')
+            WHERE id = {row}.user_id;'''
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS deployments_user_counts_insert
+                    AFTER INSERT ON deployments BEGIN
+                    {user_counts.format(row='new', sign='+')}
+                    END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS deployments_user_counts_delete
+                    AFTER DELETE ON deployments BEGIN
+                    {user_counts.format(row='old', sign='-')}
+                    END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS deployments_user_counts_update
+                    AFTER UPDATE OF user_id, status ON deployments BEGIN
+                    {user_counts.format(row='old', sign='-')}
+                    {user_counts.format(row='new', sign='+')}
+                    END''')
+        c.execute('''UPDATE users SET
+                        total_bots_deployed = (SELECT COUNT(*) FROM deployments d WHERE d.user_id = users.id),
+                        running_bots = (SELECT COUNT(*) FROM deployments d
+                                        WHERE d.user_id = users.id AND d.status = 'Running')''')
+        
+        # Node load is the number of bots running there, kept from deployments by triggers
+        # so every process (worker, bot, web) sees the same value
+        c.execute("CREATE INDEX IF NOT EXISTS idx_deployments_node ON deployments(node_id, status)")
+        node_load = '''
+            UPDATE nodes SET current_load = COALESCE(current_load, 0) {sign} 1
+            WHERE id = {row}.node_id AND {row}.status = 'Running';'''
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS deployments_node_load_insert
+                    AFTER INSERT ON deployments BEGIN
+                    {node_load.format(row='new', sign='+')}
+                    END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS deployments_node_load_delete
+                    AFTER DELETE ON deployments BEGIN
+                    {node_load.format(row='old', sign='-')}
+                    END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS deployments_node_load_update
+                    AFTER UPDATE OF node_id, status ON deployments BEGIN
+                    {node_load.format(row='old', sign='-')}
+                    {node_load.format(row='new', sign='+')}
+                    END''')
+        c.execute('''UPDATE nodes SET current_load = (SELECT COUNT(*) FROM deployments d
+                                                      WHERE d.node_id = nodes.id AND d.status = 'Running')''')
+        
+        # Sort keys of the admin list views
+        c.execute("CREATE INDEX IF NOT EXISTS idx_payment_logs_time ON payment_logs(created_at, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_bot_trials_started ON bot_trials(started_at, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_marketplace_created ON marketplace_bots(created_at, id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_marketplace_purchases_status ON marketplace_purchases(status, purchased_at, id)")
+        
         # Check and insert default data
         c.execute("SELECT * FROM users WHERE id=?", (Config.ADMIN_ID,))
         if not c.fetchone():
@@ -247,6 +673,10 @@ def init_db():
                          (node['name'], node['status'], node['capacity'], 
                           datetime.now().strftime('%Y-%m-%d %H:%M:%S'), node['region']))
         
+        # Agent addresses come from the environment on every start
+        for node in Config.HOSTING_NODES:
+            c.execute("UPDATE nodes SET address=? WHERE name=?", (node.get('address'), node['name']))
+        
         # Default system settings
         default_settings = [
             ('system_name', 'ZEN X Host Bot v4.0', 'System display name'),
@@ -355,30 +785,76 @@ def get_available_nodes():
         logger.error(f"Error getting nodes: {e}")
         return []
 
-def assign_bot_to_node(user_id, bot_name):
-    """Assign bot to optimal node"""
-    nodes = get_available_nodes()
+def get_placement_engine():
+    """Get the placement engine, loading nodes and running bots on first use"""
+    global placement_engine
     
-    if not nodes:
-        return None
-    
-    # Find node with lowest load percentage
-    best_node = None
-    lowest_load = float('inf')
+    with placement_lock:
+        if placement_engine is None:
+            from placement import PlacementEngine
+            engine = PlacementEngine(Config.PLACEMENT_WEIGHTS, Config.PLACEMENT_ANTI_AFFINITY)
+            sync_placement_nodes(engine)
+            
+            running = execute_db("""
+                SELECT id, user_id, node_id, cpu_usage, ram_usage FROM deployments
+                WHERE status='Running' AND node_id IS NOT NULL
+            """, fetchall=True) or []
+            for bot in running:
+                if bot['node_id'] in engine.nodes:
+                    engine.reserve(bot['id'], bot['node_id'], bot['user_id'], get_bot_footprint(bot))
+            
+            placement_engine = engine
+        return placement_engine
+
+def sync_placement_nodes(engine):
+    """Refresh node status, capacity and addresses from the nodes table"""
+    specs = {node['name']: node for node in Config.HOSTING_NODES}
+    nodes = execute_db("SELECT * FROM nodes", fetchall=True) or []
     
     for node in nodes:
-        if node['capacity'] > 0:
-            load_percent = (node['current_load'] / node['capacity']) * 100
-            if load_percent < lowest_load:
-                lowest_load = load_percent
-                best_node = node
+        spec = specs.get(node['name'], {})
+        current = engine.nodes.get(node['id'])
+        engine.set_node(
+            node['id'], node['name'], node['capacity'] or 0, node['region'], node['status'],
+            # Keep heartbeat-measured capacity once an agent has reported it
+            current.cpu_capacity if current else spec.get('cpu_cores', 4) * 100.0,
+            current.memory_mb if current else float(spec.get('memory_mb', 4096)),
+            node['address']
+        )
+
+def get_bot_footprint(bot):
+    """Estimate a bot's CPU (percent of a core) and RAM (MB) from its last measured usage"""
+    from placement import DEFAULT_FOOTPRINT
     
-    return best_node
+    footprint = dict(DEFAULT_FOOTPRINT)
+    if bot['cpu_usage']:
+        footprint['cpu'] = float(bot['cpu_usage'])
+    if bot['ram_usage']:
+        # ram_usage is stored as a percent of the plan's memory limit
+        footprint['memory_mb'] = bot['ram_usage'] * get_plan_limits(bot['user_id'])['memory_mb'] / 100
+    return footprint
+
+def assign_bot_to_node(user_id, bot_name, bot_id=None, footprint=None, node_id=None):
+    """Pick the best node (or check node_id) for a bot, reserving capacity when bot_id is given"""
+    engine = get_placement_engine()
+    
+    if bot_id is None:
+        node = engine.choose(user_id, footprint, node_id=node_id)
+    else:
+        # Placing releases any stale reservation the bot still held
+        node = engine.place(bot_id, user_id, footprint, node_id=node_id)
+    
+    return node.to_dict() if node else None
+
+def release_bot_capacity(bot_id):
+    """Return a stopped or crashed bot's capacity to its node"""
+    return get_placement_engine().release(bot_id)
 
 # ==================== BOT DEPLOYMENT & MONITORING ====================
 
-def deploy_bot(bot_id, user_id):
-    """Deploy a bot to a hosting node"""
+def deploy_bot(bot_id, user_id, node_id=None):
+    """Deploy a bot to a hosting node (the best one unless node_id is given)"""
+    placed = False
     try:
         # Get bot information
         bot_info = execute_db("SELECT * FROM deployments WHERE id=?", (bot_id,), fetchone=True)
@@ -387,40 +863,26 @@ def deploy_bot(bot_id, user_id):
         
         # Check if already running
         if bot_info['status'] == 'Running' and bot_info['pid']:
-            try:
-                os.kill(bot_info['pid'], 0)
+            if is_pid_alive(bot_info['pid'], bot_id):
                 return False, "Bot is already running"
-            except:
-                pass
-        
-        # Assign to node
-        node = assign_bot_to_node(user_id, bot_info['bot_name'])
-        if not node:
-            return False, "No available nodes"
         
         # Check file exists
         file_path = Path(Config.PROJECT_DIR) / bot_info['filename']
         if not file_path.exists():
             return False, "Bot file not found"
         
-        # Start bot process
-        start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_file = Path(Config.LOGS_DIR) / f"bot_{bot_id}.log"
-        
-        with open(log_file, 'a') as f:
-            f.write(f"\n{'='*50}\nDeployment started at {start_time}\n{'='*50}\n")
-            proc = subprocess.Popen(
-                ['python', str(file_path)],
-                stdout=f,
-                stderr=subprocess.STDOUT,
-                start_new_session=True
-            )
-        
-        # Wait for process to stabilize
-        time.sleep(2)
+        # Assign to node and reserve the bot's footprint there
+        node = assign_bot_to_node(user_id, bot_info['bot_name'], bot_id, get_bot_footprint(bot_info), node_id)
+        if not node:
+            return False, "No available nodes" if node_id is None else "Node has no room for this bot"
+        placed = True
         
-        if proc.poll() is not None:
-            return False, "Bot failed to start. Check logs."
+        start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        success, result = start_bot_on_node(bot_id, bot_info, node, file_path, start_time)
+        if not success:
+            release_bot_capacity(bot_id)
+            return False, result
+        pid = result
         
         # Update database
         updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -428,47 +890,192 @@ def deploy_bot(bot_id, user_id):
             UPDATE deployments 
             SET pid=?, start_time=?, status='Running', node_id=?, last_active=?, updated_at=? 
             WHERE id=?
-        """, (proc.pid, start_time, node['id'], start_time, updated_at, bot_id), commit=True)
-        
-        # Update node load
-        execute_db("UPDATE nodes SET current_load=current_load+1 WHERE id=?", (node['id'],), commit=True)
+        """, (pid, start_time, node['id'], start_time, updated_at, bot_id), commit=True)
         
         # Log event
         log_event("DEPLOY", f"Bot {bot_info['bot_name']} deployed to {node['name']}", user_id)
         log_bot_event(bot_id, "DEPLOY_SUCCESS", f"Deployed to {node['name']}")
         
         # Start monitoring
-        start_bot_monitoring(bot_id, proc.pid, user_id)
+        start_bot_monitoring(bot_id, pid, user_id, node['address'])
+        
+        from events import publish
+        publish('bot_started', bot_id=bot_id, user_id=user_id, node=node['name'])
         
-        return True, f"Bot deployed successfully to {node['name']} (PID: {proc.pid})"
+        return True, f"Bot deployed successfully to {node['name']} (PID: {pid})"
         
     except Exception as e:
         logger.error(f"Deployment error for bot {bot_id}: {e}")
+        if placed:
+            release_bot_capacity(bot_id)
         return False, f"Deployment failed: {str(e)}"
 
-def start_bot_monitoring(bot_id, pid, user_id):
+def start_bot_on_node(bot_id, bot_info, node, file_path, start_time):
+    """Launch a bot on its assigned node; returns (True, pid) or (False, message)"""
+    address = node['address']
+    
+    # Use the shared environment for the project's requirements
+    python = None
+    if not address:
+        from deps import resolve_python
+        ok, python = resolve_python(file_path)
+        if not ok:
+            return False, python
+    
+    # Start bot process
+    log_file = Path(Config.LOGS_DIR) / f"bot_{bot_id}.log"
+    
+    with open(log_file, 'a') as f:
+        f.write(f"\n{'='*50}\nDeployment started at {start_time}\n{'='*50}\n")
+    
+    limits = get_plan_limits(bot_info['user_id'])
+    
+    if address:
+        # Remote node: the agent resolves dependencies and spawns the bot
+        from node_agent import send_command
+        reply = send_command(address, 'deploy', token=Config.NODE_TOKEN, bot_id=bot_id,
+                             script=str(file_path.resolve()), limits=limits)
+        if not reply.get('ok'):
+            return False, f"Node {node['name']} refused deployment: {reply.get('error')}"
+        pid = reply['pid']
+    else:
+        pid = launch_bot_process(bot_id, python, file_path, log_file, limits)
+    
+    # Wait for process to stabilize
+    time.sleep(2)
+    
+    if not is_bot_running(bot_id, pid, address):
+        return False, "Bot failed to start. Check logs."
+    
+    return True, pid
+
+def get_plan_limits(user_id):
+    """Get CPU, memory and process limits for a user's plan"""
+    plan = 'free' if check_prime_expiry(user_id)['expired'] else 'prime'
+    return dict(Config.PLAN_LIMITS[plan])
+
+def launch_bot_process(bot_id, python, file_path, log_file, limits=None, env=None, cgroup_limits=None):
+    """Start a bot process, forking from a warm interpreter when possible"""
+    from resource_control import create_bot_cgroup, apply_in_child
+    
+    file_path = Path(file_path).resolve()
+    cgroup_path = create_bot_cgroup(bot_id, cgroup_limits or limits, Config.CGROUP_ROOT) if limits else None
+    
+    if Config.USE_ZYGOTE:
+        from zygote import spawn_from_zygote
+        pid = spawn_from_zygote(python, str(file_path), str(file_path.parent), str(log_file), env=env,
+                                max_zygotes=Config.ZYGOTE_MAX, cgroup=cgroup_path, limits=limits)
+        if pid:
+            bot_processes.pop(bot_id, None)
+            return pid
+    
+    # Cold start fallback
+    with open(log_file, 'a') as f:
+        proc = subprocess.Popen(
+            [python, str(file_path)],
+            stdout=f,
+            stderr=subprocess.STDOUT,
+            cwd=str(file_path.parent),
+            env=env,
+            start_new_session=True,
+            preexec_fn=(lambda: apply_in_child(cgroup_path, limits)) if limits else None
+        )
+    
+    bot_processes[bot_id] = proc
+    return proc.pid
+
+def is_pid_alive(pid, bot_id=None):
+    """Check whether a bot process is still running"""
+    proc = bot_processes.get(bot_id)
+    if proc is not None and proc.pid == pid:
+        # poll() also reaps our own children so they don't linger as zombies
+        return proc.poll() is None
+    
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    
+    # An exited child we no longer track (e.g. the old side of a redeploy) is a zombie
+    try:
+        reaped, _ = os.waitpid(pid, os.WNOHANG)
+        return reaped == 0
+    except ChildProcessError:
+        return True
+
+def is_bot_running(bot_id, pid, address=None):
+    """Check a bot's process on whichever node runs it"""
+    if not address:
+        return is_pid_alive(pid, bot_id)
+    
+    from node_agent import send_command
+    try:
+        reply = send_command(address, 'status', token=Config.NODE_TOKEN, bot_id=bot_id)
+        return bool(reply.get('alive')) and reply.get('pid') == pid
+    except OSError as e:
+        # An unreachable node is not a crashed bot; node health decides that
+        logger.warning(f"Node {address} unreachable while checking bot {bot_id}: {e}")
+        return True
+
+def get_bot_usage(bot_id, pid, address=None):
+    """Read a bot's CPU time and memory on whichever node runs it"""
+    from resource_control import read_usage
+    
+    if not address:
+        return read_usage(bot_id, pid, Config.CGROUP_ROOT)
+    
+    from node_agent import send_command
+    try:
+        reply = send_command(address, 'status', token=Config.NODE_TOKEN, bot_id=bot_id)
+        return reply.get('usage')
+    except OSError:
+        return None
+
+def start_bot_monitoring(bot_id, pid, user_id, address=None):
     """Start monitoring a bot process"""
+    from resource_control import remove_bot_cgroup
+    
     def monitor():
         try:
             start_time = time.time()
             last_analytics_update = start_time
+            last_usage = get_bot_usage(bot_id, pid, address)
+            memory_limit = get_plan_limits(user_id)['memory_mb'] * 1024 * 1024
+            
+            me = threading.current_thread()
             
             while True:
+                # A stop or migration takes the bot away from this monitor
+                if bot_monitors.get(bot_id) is not me:
+                    break
+                
                 # Check if process is alive
-                try:
-                    os.kill(pid, 0)
-                except OSError:
+                if not is_bot_running(bot_id, pid, address):
+                    if bot_monitors.get(bot_id) is not me:
+                        break
                     # Process died
-                    handle_bot_crash(bot_id, user_id)
+                    if not address:
+                        remove_bot_cgroup(bot_id, Config.CGROUP_ROOT)
+                    release_bot_capacity(bot_id)
+                    # Let the restart below attach a fresh monitor
+                    bot_monitors.pop(bot_id, None)
+                    handle_bot_crash(bot_id, user_id, pid)
                     break
                 
                 # Update stats every 30 seconds
                 current_time = time.time()
                 if current_time - start_time > 30:
-                    stats = get_system_stats()
-                    execute_db("UPDATE deployments SET cpu_usage=?, ram_usage=?, last_active=? WHERE id=?",
-                              (stats['cpu_percent'], stats['ram_percent'], 
-                               datetime.now().strftime('%Y-%m-%d %H:%M:%S'), bot_id), commit=True)
+                    usage = get_bot_usage(bot_id, pid, address)
+                    if usage and last_usage:
+                        # CPU as percent of one core, RAM as percent of the plan limit
+                        cpu_percent = (usage['cpu_usec'] - last_usage['cpu_usec']) / ((current_time - start_time) * 10000)
+                        ram_percent = usage['memory_bytes'] * 100 / memory_limit
+                        execute_db("UPDATE deployments SET cpu_usage=?, ram_usage=?, last_active=? WHERE id=?",
+                                  (round(max(cpu_percent, 0), 2), round(ram_percent, 2),
+                                   datetime.now().strftime('%Y-%m-%d %H:%M:%S'), bot_id), commit=True)
+                        get_placement_engine().update_footprint(
+                            bot_id, max(cpu_percent, 0), usage['memory_bytes'] / (1024 * 1024))
+                    last_usage = usage
                     start_time = current_time
                 
                 # Update analytics every hour
@@ -484,16 +1091,30 @@ def start_bot_monitoring(bot_id, pid, user_id):
     # Start monitoring thread
     if bot_id not in bot_monitors:
         monitor_thread = threading.Thread(target=monitor, daemon=True)
-        monitor_thread.start()
+        # Registered before start so the monitor finds itself in bot_monitors
         bot_monitors[bot_id] = monitor_thread
+        monitor_thread.start()
 
-def handle_bot_crash(bot_id, user_id):
+def handle_bot_crash(bot_id, user_id, pid=None):
     """Handle bot crash with auto-recovery"""
     bot_info = execute_db("SELECT * FROM deployments WHERE id=?", (bot_id,), fetchone=True)
     
     if not bot_info:
         return
     
+    # Stopped, migrating or failing over on purpose (possibly from another process)
+    if bot_info['status'] != 'Running':
+        return
+    
+    # The bot was redeployed or migrated since this pid was started; its new process is fine
+    if pid is not None and bot_info['pid'] != pid:
+        return
+    
+    # Confirmed crash of the bot's current process: tell the owner and the live views
+    from events import publish
+    publish('bot_crashed', bot_id=bot_id, user_id=user_id, bot_name=bot_info['bot_name'],
+            auto_restart=bot_info['auto_restart'] == 1)
+    
     # Check auto-restart setting
     if bot_info['auto_restart'] == 1:
         # Try to restart
@@ -512,12 +1133,13 @@ def handle_bot_crash(bot_id, user_id):
             send_notification(user_id, f"Bot '{bot_info['bot_name']}' auto-restarted after crash")
             log_bot_event(bot_id, "AUTO_RESTART_SUCCESS", "Bot auto-restarted successfully")
         else:
-            execute_db("UPDATE deployments SET status='Stopped', pid=0 WHERE id=?", (bot_id,), commit=True)
+            # 'Crashed' (not 'Stopped') keeps it in the recovery sweep
+            execute_db("UPDATE deployments SET status='Crashed', pid=0 WHERE id=?", (bot_id,), commit=True)
             send_notification(user_id, f"Bot '{bot_info['bot_name']}' crashed and failed to restart")
             log_bot_event(bot_id, "AUTO_RESTART_FAILED", f"Auto-restart failed: {message}")
     else:
-        # Mark as stopped
-        execute_db("UPDATE deployments SET status='Stopped', pid=0 WHERE id=?", (bot_id,), commit=True)
+        # Mark as crashed; without auto-restart the recovery sweep leaves it alone
+        execute_db("UPDATE deployments SET status='Crashed', pid=0 WHERE id=?", (bot_id,), commit=True)
         send_notification(user_id, f"Bot '{bot_info['bot_name']}' has stopped")
         log_bot_event(bot_id, "CRASH_NO_RESTART", "Bot crashed, auto-restart disabled")
 
@@ -557,6 +1179,379 @@ def update_bot_analytics(bot_id):
     except Exception as e:
         logger.error(f"Error updating analytics for bot {bot_id}: {e}")
 
+# ==================== BOT LIFECYCLE ====================
+
+def is_group_alive(pid, bot_id=None):
+    """Check whether any process is left in a bot's process group"""
+    # Reaps our own exited child first so a zombie leader doesn't count
+    is_pid_alive(pid, bot_id)
+    try:
+        os.killpg(pid, 0)
+        return True
+    except OSError:
+        return False
+
+def stop_bot_process(bot_id, pid, address=None, grace=None, cgroup=True):
+    """Stop a bot's process group: SIGTERM, wait out the grace period, then SIGKILL
+
+    With cgroup=False the bot's cgroup is left alone because another version
+    of the bot still runs in it.
+    """
+    grace = Config.STOP_GRACE_PERIOD if grace is None else grace
+    
+    # Detach the monitor first so the exit isn't handled as a crash
+    bot_monitors.pop(bot_id, None)
+    
+    if address:
+        from node_agent import send_command
+        try:
+            reply = send_command(address, 'stop', token=Config.NODE_TOKEN, bot_id=bot_id,
+                                 grace=grace, timeout=grace + 10)
+            return bool(reply.get('ok'))
+        except OSError as e:
+            logger.error(f"Could not stop bot {bot_id} on {address}: {e}")
+            return False
+    
+    from resource_control import kill_bot_cgroup, remove_bot_cgroup
+    
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except OSError:
+        pass
+    
+    deadline = time.time() + grace
+    while time.time() < deadline and is_group_alive(pid, bot_id):
+        time.sleep(0.1)
+    
+    if is_group_alive(pid, bot_id):
+        logger.warning(f"Bot {bot_id} ignored SIGTERM for {grace}s, sending SIGKILL")
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    
+    # Also catches processes that escaped the group with setsid()
+    if cgroup:
+        kill_bot_cgroup(bot_id, Config.CGROUP_ROOT)
+    
+    deadline = time.time() + 5
+    while time.time() < deadline and is_group_alive(pid, bot_id):
+        time.sleep(0.05)
+    
+    proc = bot_processes.get(bot_id)
+    if proc is not None and proc.pid == pid:
+        bot_processes.pop(bot_id, None)
+    if cgroup:
+        remove_bot_cgroup(bot_id, Config.CGROUP_ROOT)
+    
+    if is_group_alive(pid, bot_id):
+        logger.error(f"Bot {bot_id} (PID: {pid}) did not exit after SIGKILL")
+        return False
+    return True
+
+def stop_bots(bot_ids, grace=None):
+    """Stop bots in parallel and record the result in one transaction"""
+    if not bot_ids:
+        return {}
+    
+    placeholders = ','.join('?' * len(bot_ids))
+    rows = execute_db(f"""
+        SELECT d.id, d.user_id, d.pid, d.status, n.address
+        FROM deployments d LEFT JOIN nodes n ON d.node_id = n.id
+        WHERE d.id IN ({placeholders})
+    """, tuple(bot_ids), fetchall=True) or []
+    
+    def stop_one(row):
+        if not row['pid'] or row['status'] == 'Stopped':
+            return True, "Bot is not running"
+        # Mark the intent first so no monitor treats the exit as a crash
+        execute_db("UPDATE deployments SET status='Stopping' WHERE id=?", (row['id'],), commit=True)
+        if stop_bot_process(row['id'], row['pid'], row['address'], grace):
+            return True, "Bot stopped"
+        return False, "Bot did not stop"
+    
+    found = [row['id'] for row in rows]
+    results = dict(zip(found, executor.map(stop_one, rows)))
+    stopped = [bot_id for bot_id in found if results[bot_id][0]]
+    failed = [bot_id for bot_id in found if not results[bot_id][0]]
+    
+    for bot_id in bot_ids:
+        results.setdefault(bot_id, (False, "Bot not found"))
+    
+    engine = get_placement_engine()
+    for bot_id in stopped:
+        engine.release(bot_id)
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with db_lock:
+        conn = get_db()
+        try:
+            c = conn.cursor()
+            c.executemany("UPDATE deployments SET status='Stopped', pid=0, updated_at=? WHERE id=?",
+                          [(now, bot_id) for bot_id in stopped])
+            # A bot that survived SIGKILL is still running: it keeps its earlier status
+            # (and its placement reservation, released only for stopped bots)
+            c.executemany("UPDATE deployments SET status=?, updated_at=? WHERE id=?",
+                          [(row['status'], now, row['id']) for row in rows if row['id'] in failed])
+            c.executemany("INSERT INTO bot_logs (bot_id, timestamp, log_type, message) VALUES (?, ?, ?, ?)",
+                          [(bot_id, now, 'STOP', results[bot_id][1]) for bot_id in stopped])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    # stop_bot_process detached their monitors; watch them again for crashes
+    for row in rows:
+        if row['id'] in failed:
+            start_bot_monitoring(row['id'], row['pid'], row['user_id'], row['address'])
+    
+    from events import publish
+    was_running = {row['id']: row['user_id'] for row in rows if row['pid'] and row['status'] != 'Stopped'}
+    for bot_id in stopped:
+        if bot_id in was_running:
+            publish('bot_stopped', bot_id=bot_id, user_id=was_running[bot_id])
+    
+    return results
+
+def stop_bot(bot_id, grace=None):
+    """Stop a single bot"""
+    return stop_bots([bot_id], grace)[bot_id]
+
+def restart_bot(bot_id, grace=None):
+    """Stop a bot and deploy it again"""
+    bot_info = execute_db("SELECT user_id, bot_name FROM deployments WHERE id=?", (bot_id,), fetchone=True)
+    if not bot_info:
+        return False, "Bot not found"
+    
+    success, message = stop_bot(bot_id, grace)
+    if not success:
+        return False, message
+    
+    success, message = deploy_bot(bot_id, bot_info['user_id'])
+    if success:
+        log_bot_event(bot_id, "RESTART", message)
+    return success, message
+
+def stop_all_bots(user_id=None, node_id=None, grace=None):
+    """Stop every running bot of a user and/or on a node; returns (stopped, failed)"""
+    conditions, params = ["status != 'Stopped'", "pid > 0"], []
+    if user_id is not None:
+        conditions.append("user_id=?")
+        params.append(user_id)
+    if node_id is not None:
+        conditions.append("node_id=?")
+        params.append(node_id)
+    
+    rows = execute_db(f"SELECT id FROM deployments WHERE {' AND '.join(conditions)}",
+                      tuple(params), fetchall=True) or []
+    results = stop_bots([row['id'] for row in rows], grace)
+    
+    stopped = sum(1 for ok, _ in results.values() if ok)
+    scope = ' '.join(filter(None, [f"user {user_id}" if user_id is not None else '',
+                                   f"node {node_id}" if node_id is not None else '']))
+    log_event("STOP_ALL", f"Stopped {stopped}/{len(results)} bots ({scope or 'all'})", user_id)
+    return stopped, len(results) - stopped
+
+# ==================== VERSIONS & REDEPLOY ====================
+
+def activate_bot_version(bot_id, filename):
+    """Make a script the current version of a bot; returns its version number"""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    file_path = Path(Config.PROJECT_DIR) / filename
+    sha256 = hashlib.sha256(file_path.read_bytes()).hexdigest() if file_path.is_file() else None
+    
+    with db_lock:
+        conn = get_db()
+        try:
+            c = conn.cursor()
+            # Keep exactly one previous version for rollback
+            c.execute("UPDATE bot_versions SET status='retired' WHERE bot_id=? AND status='previous' AND filename!=?",
+                      (bot_id, filename))
+            c.execute("UPDATE bot_versions SET status='previous' WHERE bot_id=? AND status='current' AND filename!=?",
+                      (bot_id, filename))
+            
+            c.execute("SELECT version FROM bot_versions WHERE bot_id=? AND filename=?", (bot_id, filename))
+            row = c.fetchone()
+            if row:
+                version = row['version']
+                c.execute("UPDATE bot_versions SET status='current', activated_at=? WHERE bot_id=? AND filename=?",
+                          (now, bot_id, filename))
+            else:
+                c.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM bot_versions WHERE bot_id=?", (bot_id,))
+                version = c.fetchone()[0]
+                c.execute("""
+                    INSERT INTO bot_versions (bot_id, version, filename, sha256, status, created_at, activated_at)
+                    VALUES (?, ?, ?, ?, 'current', ?, ?)
+                """, (bot_id, version, filename, sha256, now, now))
+            
+            c.execute("UPDATE deployments SET filename=?, updated_at=? WHERE id=?", (filename, now, bot_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    return version
+
+def get_bot_versions(bot_id):
+    """Version history of a bot, newest first"""
+    return execute_db("SELECT * FROM bot_versions WHERE bot_id=? ORDER BY version DESC",
+                      (bot_id,), fetchall=True) or []
+
+def blue_green_launch(bot_id, python, file_path, log_file, limits, old_pid, old_file=None):
+    """Start a new version of a running bot and retire the old process
+
+    Telegram answers getUpdates with 409 Conflict while two processes poll
+    one token, so the versions never poll at the same time. A script that
+    reads $ZENX_READY_FILE follows the handoff contract: it sets up, creates
+    that file, then waits for the file to be removed before it starts
+    polling. The old process is stopped in between, so the switch costs only
+    the old process's exit. Any other script starts once the old process has
+    exited and must survive REDEPLOY_WARMUP seconds, or old_file is started
+    again. Returns (ok, pid, error) where pid is whatever now serves the bot
+    (0 if nothing does).
+    """
+    from resource_control import create_bot_cgroup
+    
+    ready_file = (Path(Config.LOGS_DIR) / f".ready_{bot_id}_{time.time_ns()}").resolve()
+    env = dict(os.environ, ZENX_READY_FILE=str(ready_file))
+    handoff = 'ZENX_READY_FILE' in Path(file_path).read_text(errors='ignore')
+    old_proc = bot_processes.get(bot_id)
+    
+    def warm_up(pid):
+        deadline = time.time() + Config.REDEPLOY_WARMUP
+        while time.time() < deadline and not ready_file.exists():
+            if not is_pid_alive(pid, bot_id):
+                return False
+            time.sleep(0.05)
+        return is_pid_alive(pid, bot_id)
+    
+    try:
+        if handoff:
+            # The bot's cgroup is widened to hold both processes until the handoff
+            widened = {key: value * 2 for key, value in limits.items()} if limits else None
+            pid = launch_bot_process(bot_id, python, file_path, log_file, limits, env=env, cgroup_limits=widened)
+            if not warm_up(pid) or not ready_file.exists():
+                stop_bot_process(bot_id, pid, cgroup=False)
+                if old_proc is not None:
+                    bot_processes[bot_id] = old_proc
+                return False, old_pid, "New version did not signal ready during warm-up. Check logs."
+            
+            if not stop_bot_process(bot_id, old_pid, cgroup=False):
+                stop_bot_process(bot_id, pid, cgroup=False)
+                if old_proc is not None:
+                    bot_processes[bot_id] = old_proc
+                return False, old_pid, "Old version did not stop"
+            ready_file.unlink(missing_ok=True)  # the new version may poll now
+            return True, pid, None
+        
+        if not stop_bot_process(bot_id, old_pid):
+            return False, old_pid, "Old version did not stop"
+        pid = launch_bot_process(bot_id, python, file_path, log_file, limits, env=env)
+        if warm_up(pid):
+            return True, pid, None
+        
+        error = "New version exited during warm-up. Check logs."
+        if not old_file:
+            return False, 0, error
+        from deps import resolve_python
+        ok, old_python = resolve_python(Path(old_file))
+        if not ok:
+            return False, 0, f"{error} Previous version could not be restarted: {old_python}"
+        return False, launch_bot_process(bot_id, old_python, old_file, log_file, limits), error
+    
+    finally:
+        ready_file.unlink(missing_ok=True)
+        if handoff and limits:
+            create_bot_cgroup(bot_id, limits, Config.CGROUP_ROOT)
+
+def redeploy_bot(bot_id, filename):
+    """Switch a bot to a new script, handing over from the old process when it is running"""
+    try:
+        bot_info = execute_db("""
+            SELECT d.*, n.address, n.name AS node_name
+            FROM deployments d LEFT JOIN nodes n ON d.node_id = n.id
+            WHERE d.id=?
+        """, (bot_id,), fetchone=True)
+        if not bot_info:
+            return False, "Bot not found"
+        
+        file_path = Path(Config.PROJECT_DIR) / filename
+        if not file_path.is_file():
+            return False, "Bot file not found"
+        
+        # Bots from before version tracking start their history here
+        if not get_bot_versions(bot_id) and bot_info['filename']:
+            activate_bot_version(bot_id, bot_info['filename'])
+        
+        address = bot_info['address']
+        running = (bot_info['status'] == 'Running' and bot_info['pid']
+                   and is_bot_running(bot_id, bot_info['pid'], address))
+        if not running:
+            version = activate_bot_version(bot_id, filename)
+            log_bot_event(bot_id, "NEW_VERSION", f"Version {version} saved: {filename}")
+            return True, f"Version {version} saved. It will run on next deploy."
+        
+        # Keep crash handling and the old monitor out of the switchover
+        execute_db("UPDATE deployments SET status='Redeploying' WHERE id=?", (bot_id,), commit=True)
+        bot_monitors.pop(bot_id, None)
+        
+        log_file = Path(Config.LOGS_DIR) / f"bot_{bot_id}.log"
+        start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with open(log_file, 'a') as f:
+            f.write(f"\n{'='*50}\nRedeploy ({filename}) started at {start_time}\n{'='*50}\n")
+        
+        limits = get_plan_limits(bot_info['user_id'])
+        
+        if address:
+            from node_agent import send_command
+            reply = send_command(address, 'deploy', token=Config.NODE_TOKEN, bot_id=bot_id,
+                                 script=str(file_path.resolve()), limits=limits, replace=True,
+                                 timeout=Config.REDEPLOY_WARMUP + Config.STOP_GRACE_PERIOD + 30)
+            success, pid, error = reply.get('ok'), reply.get('pid', bot_info['pid']), reply.get('error')
+        else:
+            from deps import resolve_python
+            success, python = resolve_python(file_path)
+            pid, error = bot_info['pid'], python
+            if success:
+                old_file = Path(Config.PROJECT_DIR) / bot_info['filename'] if bot_info['filename'] else None
+                success, pid, error = blue_green_launch(bot_id, python, file_path, log_file, limits,
+                                                        bot_info['pid'], old_file)
+        
+        if not success:
+            log_bot_event(bot_id, "REDEPLOY_FAILED", f"{filename}: {error}")
+            if not pid:
+                execute_db("UPDATE deployments SET pid=0, status='Crashed' WHERE id=?", (bot_id,), commit=True)
+                return False, f"New version failed and the old version could not be restarted: {error}"
+            execute_db("UPDATE deployments SET pid=?, status='Running' WHERE id=?", (pid, bot_id), commit=True)
+            start_bot_monitoring(bot_id, pid, bot_info['user_id'], address)
+            return False, f"New version failed, old version still running: {error}"
+        
+        version = activate_bot_version(bot_id, filename)
+        execute_db("""
+            UPDATE deployments SET pid=?, status='Running', start_time=?, last_active=?, updated_at=? WHERE id=?
+        """, (pid, start_time, start_time, start_time, bot_id), commit=True)
+        start_bot_monitoring(bot_id, pid, bot_info['user_id'], address)
+        
+        log_event("REDEPLOY", f"Bot {bot_info['bot_name']} switched to version {version}", bot_info['user_id'])
+        log_bot_event(bot_id, "REDEPLOY_SUCCESS", f"Version {version} live on {bot_info['node_name']} (PID: {pid})")
+        return True, f"Version {version} is live on {bot_info['node_name']} (PID: {pid})"
+    
+    except Exception as e:
+        logger.error(f"Redeploy error for bot {bot_id}: {e}")
+        execute_db("UPDATE deployments SET status='Running' WHERE id=? AND status='Redeploying'",
+                   (bot_id,), commit=True)
+        return False, f"Redeploy failed: {str(e)}"
+
+def rollback_bot(bot_id):
+    """Switch a bot back to its previous version"""
+    previous = execute_db("SELECT * FROM bot_versions WHERE bot_id=? AND status='previous'",
+                          (bot_id,), fetchone=True)
+    if not previous:
+        return False, "No previous version to roll back to"
+    
+    success, message = redeploy_bot(bot_id, previous['filename'])
+    if success:
+        log_bot_event(bot_id, "ROLLBACK", f"Rolled back to version {previous['version']}")
+    return success, message
+
 # ==================== MARKETPLACE FUNCTIONS ====================
 
 def create_marketplace_listing(bot_id, title, description, price, category='general', tags=None):
@@ -589,6 +1584,9 @@ def create_marketplace_listing(bot_id, title, description, price, category='gene
         # Update bot to be public
         execute_db("UPDATE deployments SET is_public=1 WHERE id=?", (bot_id,), commit=True)
         
+        from marketplace import invalidate_marketplace_cache
+        invalidate_marketplace_cache()
+        
         log_event("MARKETPLACE_LIST", f"Bot {bot_id} listed as '{title}' for ${price}", bot_info['user_id'])
         
         return True, f"Listing created successfully! ID: {listing_id}"
@@ -634,6 +1632,13 @@ def purchase_bot_from_marketplace(listing_id, buyer_id, payment_method, transact
         # Update listing stats
         execute_db("UPDATE marketplace_bots SET purchases=purchases+1 WHERE id=?", (listing_id,), commit=True)
         
+        from marketplace import invalidate_marketplace_cache
+        invalidate_marketplace_cache()
+        
+        from events import publish
+        publish('purchase_created', purchase_id=purchase_id, listing_id=listing_id, buyer_id=buyer_id,
+                price=listing['price'], title=listing['title'])
+        
         # Notify seller
         send_notification(listing['seller_id'], 
                          f"New purchase: {listing['title']} for ${listing['price']:.2f}")
@@ -719,6 +1724,10 @@ def deliver_bot_to_buyer(purchase_id):
         send_notification(purchase['buyer_id'],
                          f"Bot delivered: {purchase['bot_name']}. You can now deploy it from 'My Bots'.")
         
+        from events import publish
+        publish('order_approved', purchase_id=purchase_id, buyer_id=purchase['buyer_id'],
+                bot_name=purchase['bot_name'], delivered=True)
+        
         return True, "Bot delivered successfully"
         
     except Exception as e:
@@ -840,170 +1849,44 @@ def use_trial_code(trial_code, user_id):
 # ==================== TESTING & BACKUP FUNCTIONS ====================
 
 def test_run_bot(bot_id, timeout=30):
-    """Test run a bot in safe mode"""
+    """Test run a bot in the sandbox and wait for the result"""
     try:
-        # Get bot information
-        bot_info = execute_db("SELECT * FROM deployments WHERE id=?", (bot_id,), fetchone=True)
-        if not bot_info:
-            return False, "Bot not found"
+        from test_runner import submit_test, format_test_result
         
-        # Check file exists
-        file_path = Path(Config.PROJECT_DIR) / bot_info['filename']
-        if not file_path.exists():
-            return False, "Bot file not found"
-        
-        # Create test environment
-        test_dir = Path(f"test_{bot_id}_{int(time.time())}")
-        test_dir.mkdir(exist_ok=True)
-        
-        # Copy bot file to test directory
-        test_file = test_dir / bot_info['filename']
-        shutil.copy2(file_path, test_file)
-        
-        # Create test config to prevent external calls
-        test_config = test_dir / "test_config.py"
-        test_config.write_text("""
-# Test environment configuration
-import os
-os.environ['TEST_MODE'] = 'true'
-os.environ['DISABLE_NETWORK'] = 'true'
-""")
-        
-        # Run bot with timeout
-        start_time = time.time()
-        result = subprocess.run(
-            ['python', str(test_file)],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            cwd=str(test_dir)
-        )
+        run, future = submit_test(bot_id, timeout=timeout)
+        if run is None:
+            return False, f"❌ {future}"
+        if future is not None:
+            run = future.result()
         
-        elapsed = time.time() - start_time
+        return run['status'] == 'passed', format_test_result(run)
         
-        # Cleanup test directory
-        shutil.rmtree(test_dir, ignore_errors=True)
-        
-        # Analyze output
-        output = result.stdout[:2000] + ("..." if len(result.stdout) > 2000 else "")
-        error = result.stderr[:2000] + ("..." if len(result.stderr) > 2000 else "")
-        
-        if result.returncode == 0:
-            return True, f"""
-✅ Test completed in {elapsed:.2f}s
-📊 Return code: {result.returncode}
-
-📝 Output (first 2000 chars):
-{output}
-
-{'⚠️ Warnings:' if error else '✅ No errors'}
-{error if error else ''}
-"""
-        else:
-            return False, f"""
-❌ Test failed in {elapsed:.2f}s
-📊 Return code: {result.returncode}
-
-📝 Output:
-{output}
-
-❌ Errors:
-{error}
-"""
-        
-    except subprocess.TimeoutExpired:
-        return False, f"❌ Test timed out after {timeout} seconds"
     except Exception as e:
         logger.error(f"Test run error: {e}")
         return False, f"❌ Test error: {str(e)}"
 
 def backup_bot_script(bot_id):
-    """Create a backup of bot script"""
+    """Back up a bot's script; returns a file object for the download, or None"""
     try:
-        # Get bot information
-        bot_info = execute_db("SELECT * FROM deployments WHERE id=?", (bot_id,), fetchone=True)
-        if not bot_info:
-            return None
+        from script_store import snapshot_bot, build_download
         
-        # Check file exists
-        file_path = Path(Config.PROJECT_DIR) / bot_info['filename']
-        if not file_path.exists():
+        backup, _ = snapshot_bot(bot_id)
+        if not backup:
             return None
         
-        # Create backup directory
-        backup_dir = Path(Config.SCRIPT_BACKUPS)
-        backup_dir.mkdir(exist_ok=True)
-        
-        # Create backup with metadata
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"bot_{bot_id}_{bot_info['bot_name']}_{timestamp}.py"
-        backup_path = backup_dir / backup_filename
-        
-        # Read original file
-        with open(file_path, 'r') as f:
-            content = f.read()
-        
-        # Add backup header
-        backup_header = f'''
-"""
-ZEN X HOST BOT - Script Backup
-Bot ID: {bot_id}
-Bot Name: {bot_info['bot_name']}
-Backup Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Original File: {bot_info['filename']}
-Owner: {bot_info['user_id']}
-Auto-Recovery: {'Enabled' if bot_info['auto_restart'] == 1 else 'Disabled'}
-"""
-\n\n'''
-        
-        # Write backup
-        with open(backup_path, 'w') as f:
-            f.write(backup_header + content)
-        
-        log_event("SCRIPT_BACKUP", f"Backup created for bot {bot_id}", bot_info['user_id'])
-        
-        return backup_path
+        name, data = build_download(backup['id'])
+        download = io.BytesIO(data)
+        download.name = name
+        return download
         
     except Exception as e:
         logger.error(f"Backup error: {e}")
         return None
 
 def backup_database():
-    """Create database backup"""
-    try:
-        backup_dir = Path(Config.BACKUP_DIR)
-        backup_dir.mkdir(exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"zenx_db_backup_{timestamp}.db"
-        backup_path = backup_dir / backup_filename
-        
-        # Copy database
-        with db_lock:
-            shutil.copy2(Config.DB_NAME, backup_path)
-        
-        # Compress backup
-        zip_filename = f"zenx_db_backup_{timestamp}.zip"
-        zip_path = backup_dir / zip_filename
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(backup_path, arcname=backup_filename)
-        
-        # Remove uncompressed backup
-        backup_path.unlink(missing_ok=True)
-        
-        # Clean old backups (keep last 30)
-        backup_files = sorted(backup_dir.glob("zenx_db_backup_*.zip"), 
-                            key=os.path.getmtime, reverse=True)
-        for old_backup in backup_files[30:]:
-            old_backup.unlink(missing_ok=True)
-        
-        logger.info(f"Database backup created: {zip_filename}")
-        return zip_path
-        
-    except Exception as e:
-        logger.error(f"Backup failed: {e}")
-        return None
+    """Create a verified database backup without blocking writers"""
+    from backup import run_backup
+    return run_backup()
 
 # ==================== HELPER FUNCTIONS ====================
 
@@ -1074,18 +1957,16 @@ def get_system_setting(key, default=None):
     return result['value'] if result else default
 
 def update_user_bot_count(user_id):
-    """Update user's bot count"""
-    count = execute_db("SELECT COUNT(*) FROM deployments WHERE user_id=?", (user_id,), fetchone=True)
-    count = count[0] if count else 0
-        
-    execute_db("UPDATE users SET total_bots_deployed=?, total_deployments=total_deployments+1 WHERE id=?", 
-              (count, user_id), commit=True)
+    """Count a new deployment; current bot counts are kept by the deployments triggers"""
+    execute_db("UPDATE users SET total_deployments=total_deployments+1 WHERE id=?", 
+              (user_id,), commit=True)
 
 def extract_zip_file(zip_path, extract_dir):
-    """Extract ZIP file"""
+    """Extract ZIP file with size, entry-count and path checks"""
+    from zip_ingest import safe_extract
+    
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
+        safe_extract(zip_path, extract_dir)
         return True
     except Exception as e:
         logger.error(f"Error extracting ZIP: {e}")
@@ -1138,11 +2019,14 @@ def auto_recovery_thread():
     while True:
         try:
             if Config.AUTO_RESTART_BOTS:
-                # Find bots that need recovery
+                # Find bots that need recovery: crashed or half-restarted ones, never
+                # bots stopped on purpose ('Stopped', 'Stopping') or mid-move elsewhere
                 bots = execute_db("""
                     SELECT id, user_id, bot_name, filename, auto_restart, restart_count 
                     FROM deployments 
-                    WHERE auto_restart=1 AND (status='Stopped' OR pid=0)
+                    WHERE auto_restart=1
+                    AND (status IN ('Crashed', 'Restarting')
+                         OR (pid=0 AND status NOT IN ('Stopped', 'Stopping', 'Redeploying', 'Failover')))
                     AND filename IS NOT NULL
                 """, fetchall=True) or []
                 
@@ -1170,7 +2054,8 @@ def auto_recovery_thread():
 def schedule_backups():
     """Schedule regular backups"""
     while True:
-        time.sleep(Config.BACKUP_INTERVAL)
+        # Incremental runs are cheap, so they double as point-in-time segments
+        time.sleep(Config.BACKUP_SEGMENT_INTERVAL if Config.BACKUP_INCREMENTAL else Config.BACKUP_INTERVAL)
         try:
             backup_path = backup_database()
             if backup_path:
@@ -1194,7 +2079,11 @@ def cleanup_thread():
                 if (datetime.now() - datetime.fromtimestamp(export_file.stat().st_mtime)).days > 7:
                     export_file.unlink()
             
-            # Clean old script backups (14 days)
+            # Old script backup versions and the objects only they used
+            from script_store import prune_script_store
+            prune_script_store()
+            
+            # Full copies written before the script store
             backups_dir = Path(Config.SCRIPT_BACKUPS)
             for backup_file in backups_dir.glob("*.py"):
                 if (datetime.now() - datetime.fromtimestamp(backup_file.stat().st_mtime)).days > 14:
@@ -1228,10 +2117,21 @@ def start_system():
     # Recover deployments
     recover_deployments()
     
+    # Hear from bot.py and the web app
+    from events import start_listener
+    start_listener()
+    
     # Start background threads
+    from rebalancer import rebalancer_thread
+    from node_health import node_heartbeat_thread
+    from rollups import rollup_thread
+    
     threads = [
         threading.Thread(target=auto_recovery_thread, daemon=True),
+        threading.Thread(target=node_heartbeat_thread, daemon=True),
+        threading.Thread(target=rebalancer_thread, daemon=True),
         threading.Thread(target=schedule_backups, daemon=True),
+        threading.Thread(target=rollup_thread, daemon=True),
         threading.Thread(target=cleanup_thread, daemon=True)
     ]
     
@@ -1244,6 +2144,10 @@ def start_system():
     return threads
 
 if __name__ == "__main__":
+    # Modules that "from main import" must share this module's state (bot_monitors,
+    # placement_engine, db_lock) instead of loading a second copy of main
+    sys.modules['main'] = sys.modules[__name__]
+    
     # Start system
     system_threads = start_system()
     
@@ -0,0 +1,278 @@
+"""
+ZEN X HOST BOT v4.0 - Marketplace Queries
+Keyset-paginated listing pages with a response cache and ETags
+
+Pages are ordered by one of SORTS with the listing id as tiebreaker, and
+the cursor is the (sort value, id) of the last row served, so deep pages
+cost the same as the first. Only PUBLIC_COLUMNS leave the database.
+Serialized pages are cached per (category, sort, cursor, limit) together
+with their ETag, so a client revalidating with If-None-Match gets its 304
+without a query. Listing and purchase changes clear the cache in this
+process and, through a marketplace_changed event, in the others; if an
+event is lost they show up within MARKETPLACE_CACHE_TTL seconds.
+
+Search goes through the marketplace_fts index (see init_db), with the
+last word matched as a prefix for search as you type. Every match is
+scored with BM25 and given a bounded boost from purchases and rating, so
+popularity reorders relevant results without swamping them, and the
+best-scoring page is returned whatever the listings' age.
+
+Featured listings, per-category top listings and category counts come
+from tables the init_db triggers keep current. Each process holds them in
+memory and re-reads them only when marketplace_stats_version has moved,
+checking at most every MARKETPLACE_STATS_CHECK_INTERVAL seconds.
+"""
+
+import re
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from main import Config, execute_db
+from events import publish, subscribe
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_COLUMNS = """
+    mb.id, mb.title, mb.description, mb.price, mb.category, mb.tags,
+    mb.views, mb.purchases, mb.created_at,
+    d.bot_name, u.username AS seller_username
+"""
+
+# sort name -> (sort key, descending). The columns are nullable and a NULL
+# compares as unknown, so keys are coalesced: NULL prices count as 0 and
+# undated listings sort as the oldest, and every row has a cursor value.
+SORTS = {
+    'newest': ("COALESCE(mb.created_at, '')", True),
+    'price_low': ('COALESCE(mb.price, 0)', False),
+    'price_high': ('COALESCE(mb.price, 0)', True),
+    'popular': ('COALESCE(mb.purchases, 0)', True),
+}
+
+# BM25 weights for title, description, tags
+SEARCH_WEIGHTS = (10.0, 2.0, 5.0)
+
+_cache = OrderedDict()  # key -> (expires, etag, body)
+_cache_lock = threading.Lock()
+
+_stats = {'version': None, 'checked': 0.0, 'snapshot': None}
+_stats_lock = threading.Lock()
+
+
+def encode_cursor(value, listing_id):
+    raw = json.dumps([value, listing_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(sort value, listing id) from a cursor; ValueError if it was tampered with"""
+    try:
+        value, listing_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(listing_id, int) or not isinstance(value, (int, float, str)):
+        raise ValueError("Invalid cursor")
+    return value, listing_id
+
+
+def query_listings(category=None, sort='newest', cursor=None, limit=None):
+    """One page of available listings: {'listings': [...], 'next_cursor': str or None}"""
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort '{sort}'")
+    limit = max(1, min(limit or Config.MARKETPLACE_PAGE_SIZE, Config.MARKETPLACE_MAX_PAGE_SIZE))
+    column, descending = SORTS[sort]
+    direction, compare = ('DESC', '<') if descending else ('ASC', '>')
+
+    where, params = ["mb.status = 'available'"], []
+    if category and category != 'all':
+        where.append("mb.category = ?")
+        params.append(category)
+    if cursor:
+        value, listing_id = decode_cursor(cursor)
+        where.append(f"({column}, mb.id) {compare} (?, ?)")
+        params += [value, listing_id]
+
+    # One row past the page tells whether there is a next page
+    rows = execute_db(f"""
+        SELECT {PUBLIC_COLUMNS}, {column} AS sort_value
+        FROM marketplace_bots mb
+        JOIN deployments d ON mb.bot_id = d.id
+        JOIN users u ON mb.seller_id = u.id
+        WHERE {' AND '.join(where)}
+        ORDER BY {column} {direction}, mb.id {direction}
+        LIMIT ?
+    """, tuple(params) + (limit + 1,), fetchall=True) or []
+
+    listings = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = listings[-1]
+        next_cursor = encode_cursor(last['sort_value'], last['id'])
+    for listing in listings:
+        del listing['sort_value']
+
+    return {'listings': listings, 'next_cursor': next_cursor}
+
+
+def cache_key(category, sort, cursor, limit):
+    return (category or 'all', sort, cursor or '', limit or Config.MARKETPLACE_PAGE_SIZE)
+
+
+def get_cached_page(key):
+    """(etag, body) of a cached page, or None"""
+    with _cache_lock:
+        entry = _cache.get(key)
+        if not entry:
+            return None
+        if entry[0] < time.monotonic():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return entry[1], entry[2]
+
+
+def get_listings_page(category=None, sort='newest', cursor=None, limit=None):
+    """Serialized page and its (unquoted) ETag, from the cache when possible"""
+    key = cache_key(category, sort, cursor, limit)
+    cached = get_cached_page(key)
+    if cached:
+        return cached
+
+    page = query_listings(category, sort, cursor, limit)
+    body = json.dumps(page, separators=(',', ':')).encode()
+    etag = hashlib.sha1(body).hexdigest()
+
+    with _cache_lock:
+        _cache[key] = (time.monotonic() + Config.MARKETPLACE_CACHE_TTL, etag, body)
+        _cache.move_to_end(key)
+        while len(_cache) > Config.MARKETPLACE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return etag, body
+
+
+def clear_marketplace_cache(event=None):
+    """Drop every cached page in this process"""
+    with _cache_lock:
+        _cache.clear()
+    # Leaderboards re-check their version on the next read
+    _stats['checked'] = 0.0
+
+
+def invalidate_marketplace_cache():
+    """Drop every cached page, here and in the other processes, after a listing or purchase change"""
+    clear_marketplace_cache()
+    publish('marketplace_changed')
+
+
+subscribe('marketplace_changed', clear_marketplace_cache)
+subscribe('purchase_created', clear_marketplace_cache)
+
+
+# ==================== SEARCH ====================
+
+def build_match_query(text):
+    """FTS5 MATCH expression for free text, or None if it has no searchable words"""
+    words = re.findall(r'\w+', text.lower())[:Config.MARKETPLACE_SEARCH_MAX_TERMS]
+    if not words:
+        return None
+    # Words are \w+ only, so quoting them is enough to keep FTS5 syntax out.
+    # Only the word being typed is a prefix: long prefixes can't use the
+    # prefix index and cost a full doclist merge each.
+    terms = [f'"{w}"' for w in words[:-1]]
+    terms.append(f'"{words[-1]}"*' if len(words[-1]) > 1 else f'"{words[-1]}"')
+    return ' '.join(terms)
+
+
+def search_listings(text, category=None, page=1, limit=None):
+    """Ranked search over available listings: {'results': [...], 'page': n, 'next_page': n or None}"""
+    limit = max(1, min(limit or Config.MARKETPLACE_PAGE_SIZE, Config.MARKETPLACE_MAX_PAGE_SIZE))
+    page = max(1, page or 1)
+    match = build_match_query(text or '')
+    if not match:
+        return {'results': [], 'page': page, 'next_page': None}
+
+    params = [Config.MARKETPLACE_SEARCH_PURCHASE_BOOST, Config.MARKETPLACE_SEARCH_RATING_BOOST, match]
+    category_filter = ''
+    if category and category != 'all':
+        category_filter = 'AND mb.category = ?'
+        params.append(category)
+    params += [limit + 1, (page - 1) * limit]
+
+    # bm25() is negative (lower is better), so the boost multiplies it.
+    # The whole match set is scored, so an older listing that is more
+    # relevant or more popular still ranks above newer ones.
+    rows = execute_db(f"""
+        SELECT {PUBLIC_COLUMNS}, mb.rating,
+               bm25(marketplace_fts, {', '.join(map(str, SEARCH_WEIGHTS))})
+                   * (1 + ? * mb.purchases / (mb.purchases + 10.0)
+                        + ? * MIN(MAX(mb.rating, 0), 5) / 5.0) AS score
+        FROM marketplace_fts
+        JOIN marketplace_bots mb ON mb.id = marketplace_fts.rowid
+        JOIN deployments d ON mb.bot_id = d.id
+        JOIN users u ON mb.seller_id = u.id
+        WHERE marketplace_fts MATCH ? {category_filter}
+        ORDER BY score, mb.id
+        LIMIT ? OFFSET ?
+    """, tuple(params), fetchall=True) or []
+
+    results = []
+    for row in rows[:limit]:
+        listing = dict(row)
+        listing['score'] = round(-listing['score'], 4)
+        results.append(listing)
+
+    return {'results': results, 'page': page, 'next_page': page + 1 if len(rows) > limit else None}
+
+
+# ==================== LEADERBOARDS ====================
+
+def load_marketplace_stats():
+    """Read the materialized facets and leaderboards into one snapshot"""
+    facets = [dict(row) for row in execute_db(
+        "SELECT * FROM marketplace_facets WHERE listings > 0 ORDER BY available DESC, category",
+        fetchall=True) or []]
+
+    boards = {}
+    for row in execute_db(f"""
+        SELECT l.board, {PUBLIC_COLUMNS}, mb.rating
+        FROM marketplace_leaderboard l
+        JOIN marketplace_bots mb ON mb.id = l.listing_id
+        JOIN deployments d ON mb.bot_id = d.id
+        JOIN users u ON mb.seller_id = u.id
+        ORDER BY l.board, l.position
+    """, fetchall=True) or []:
+        listing = dict(row)
+        boards.setdefault(listing.pop('board'), []).append(listing)
+
+    return {
+        'featured': boards.pop('*', []),
+        'top_by_category': boards,
+        'categories': facets,
+        'totals': {
+            'listings': sum(f['listings'] for f in facets),
+            'available': sum(f['available'] for f in facets),
+            'sold': sum(f['sold'] for f in facets),
+            'total_value': round(sum(f['total_value'] for f in facets), 2),
+        },
+    }
+
+
+def get_marketplace_stats():
+    """Featured listings, top listings per category and category counts, from memory"""
+    with _stats_lock:
+        now = time.monotonic()
+        if _stats['snapshot'] is not None and now - _stats['checked'] < Config.MARKETPLACE_STATS_CHECK_INTERVAL:
+            return _stats['snapshot']
+
+        row = execute_db("SELECT version FROM marketplace_stats_version WHERE id = 1", fetchone=True)
+        version = row['version'] if row else None
+        if _stats['snapshot'] is None or version is None or version != _stats['version']:
+            _stats['snapshot'] = load_marketplace_stats()
+            _stats['version'] = version
+        _stats['checked'] = now
+        return _stats['snapshot']
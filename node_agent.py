@@ -0,0 +1,345 @@
+"""
+ZEN X HOST BOT v4.0 - Node Agent
+Runs bots on one hosting node and takes deploy/stop commands from the control plane
+
+Protocol: one JSON object per line over TCP ("host:port") or a Unix socket
+("unix:/path"). Every request carries the shared token (ZENX_NODE_TOKEN;
+the agent will not start without one); every reply has "ok". Scripts must
+live under the node's PROJECT_DIR.
+
+    {"cmd": "ping"}
+    {"cmd": "deploy", "bot_id": 1, "script": "/abs/bot.py", "limits": {...}, "replace": false}
+    {"cmd": "stop", "bot_id": 1, "grace": 10}
+    {"cmd": "status", "bot_id": 1}
+    {"cmd": "stats"}
+
+Local testing with three nodes (project files must be at the same path on
+every node, which is trivially true when they share one machine):
+
+    export ZENX_NODE_TOKEN=$(python -c 'import secrets; print(secrets.token_hex(16))')
+    python node_agent.py --name Node-1 --listen 127.0.0.1:7101 &
+    python node_agent.py --name Node-2 --listen 127.0.0.1:7102 &
+    python node_agent.py --name Node-3 --listen 127.0.0.1:7103 &
+    ZENX_NODE_1_ADDR=127.0.0.1:7101 ZENX_NODE_2_ADDR=127.0.0.1:7102 \\
+    ZENX_NODE_3_ADDR=127.0.0.1:7103 python main.py
+
+The bot -> pid table is kept in a state file (--state), so an agent that
+restarts adopts the bots it started earlier instead of losing track of them.
+"""
+
+import os
+import hmac
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE = 1024 * 1024
+
+
+# ==================== CLIENT SIDE ====================
+
+def _connect(address, timeout):
+    """Open a socket to an agent address"""
+    if address.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(address[5:])
+        return sock
+
+    host, port = address.rsplit(':', 1)
+    return socket.create_connection((host, int(port)), timeout=timeout)
+
+
+def send_command(address, cmd, token=None, timeout=10, **params):
+    """Send one command to a node agent and return its reply dict"""
+    payload = dict(params, cmd=cmd, token=token or os.environ.get('ZENX_NODE_TOKEN', ''))
+
+    with _connect(address, timeout) as sock:
+        sock.sendall((json.dumps(payload) + '\n').encode())
+        with sock.makefile('rb') as reader:
+            line = reader.readline(MAX_LINE)
+
+    if not line:
+        raise ConnectionError(f"No reply from node agent at {address}")
+    return json.loads(line)
+
+
+# ==================== AGENT SIDE ====================
+
+def _memory_info():
+    """Host memory in MB from /proc/meminfo, for placement decisions"""
+    info = {}
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                if key == 'MemTotal':
+                    info['memory_total_mb'] = int(value.split()[0]) // 1024
+                elif key == 'MemAvailable':
+                    info['memory_available_mb'] = int(value.split()[0]) // 1024
+    except OSError:
+        pass
+    return info
+
+
+class NodeAgent:
+    """Bots running on this node and the commands that act on them"""
+
+    def __init__(self, name, token='', state_path=None):
+        self.name = name
+        self.token = token
+        self.state_path = Path(state_path) if state_path else None
+        self.started = time.time()
+        self.bots = {}  # bot_id -> {'pid', 'script', 'started'}
+        self.lock = threading.Lock()
+        self._adopt_bots()
+
+    def handle(self, request):
+        # No token configured means nobody is authorized, not everybody
+        if not self.token or not hmac.compare_digest(str(request.get('token') or ''), self.token):
+            return {'ok': False, 'error': 'unauthorized'}
+
+        handler = getattr(self, f"cmd_{request.get('cmd')}", None)
+        if not handler:
+            return {'ok': False, 'error': f"unknown command: {request.get('cmd')}"}
+
+        try:
+            return handler(request)
+        except Exception as e:
+            logger.error(f"Agent command {request.get('cmd')} failed: {e}")
+            return {'ok': False, 'error': str(e)}
+
+    def _save_bots(self):
+        """Write the bot table to the state file; call with self.lock held"""
+        if not self.state_path:
+            return
+        tmp = self.state_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({str(bot_id): info for bot_id, info in self.bots.items()}))
+        os.replace(tmp, self.state_path)
+
+    def _adopt_bots(self):
+        """Take over bots started by an earlier run of this agent that are still running"""
+        if not self.state_path or not self.state_path.exists():
+            return
+        try:
+            saved = json.loads(self.state_path.read_text())
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read agent state {self.state_path}: {e}")
+            return
+
+        with self.lock:
+            for bot_id, info in saved.items():
+                if _is_same_process(info):
+                    self.bots[int(bot_id)] = info
+            self._save_bots()
+        logger.info(f"[{self.name}] Adopted {len(self.bots)} of {len(saved)} bots from {self.state_path}")
+
+    def _alive_bots(self):
+        from main import is_pid_alive
+
+        with self.lock:
+            for bot_id, info in list(self.bots.items()):
+                if not is_pid_alive(info['pid'], bot_id):
+                    del self.bots[bot_id]
+            self._save_bots()
+            return dict(self.bots)
+
+    def cmd_ping(self, request):
+        bots = self._alive_bots()
+        load = os.getloadavg() if hasattr(os, 'getloadavg') else (0, 0, 0)
+        return dict({
+            'ok': True,
+            'node': self.name,
+            'time': time.time(),
+            'uptime': int(time.time() - self.started),
+            'bots': len(bots),
+            'loadavg': load[0],
+            'cpu_count': os.cpu_count()
+        }, **_memory_info())
+
+    def cmd_deploy(self, request):
+        from main import Config, launch_bot_process, blue_green_launch, is_pid_alive
+        from deps import resolve_python
+
+        bot_id = int(request['bot_id'])
+        script = Path(request['script']).resolve()
+        if Path(Config.PROJECT_DIR).resolve() not in script.parents:
+            return {'ok': False, 'error': 'Bot file is outside the project directory'}
+        if not script.is_file():
+            return {'ok': False, 'error': 'Bot file not found on node'}
+
+        with self.lock:
+            current = self.bots.get(bot_id)
+        running = current and is_pid_alive(current['pid'], bot_id)
+        if running and not request.get('replace'):
+            return {'ok': False, 'error': 'Bot is already running on this node'}
+
+        ok, python = resolve_python(script)
+        if not ok:
+            return {'ok': False, 'error': python}
+
+        log_file = Path(Config.LOGS_DIR) / f"bot_{bot_id}.log"
+        if running:
+            # The old process keeps serving until the new one takes over
+            ok, pid, error = blue_green_launch(bot_id, python, script, log_file, request.get('limits'),
+                                               current['pid'], current['script'])
+            if not ok:
+                with self.lock:
+                    if pid:
+                        self.bots[bot_id] = {'pid': pid, 'script': current['script'], 'started': time.time(),
+                                             'start_ticks': _process_start(pid)}
+                    else:
+                        self.bots.pop(bot_id, None)
+                    self._save_bots()
+                return {'ok': False, 'error': error, 'pid': pid}
+        else:
+            pid = launch_bot_process(bot_id, python, script, log_file, request.get('limits'))
+
+        with self.lock:
+            self.bots[bot_id] = {'pid': pid, 'script': str(script), 'started': time.time(),
+                                 'start_ticks': _process_start(pid)}
+            self._save_bots()
+
+        logger.info(f"[{self.name}] Bot {bot_id} started (PID: {pid})")
+        return {'ok': True, 'pid': pid}
+
+    def cmd_stop(self, request):
+        from main import stop_bot_process
+
+        bot_id = int(request['bot_id'])
+        grace = request.get('grace')
+
+        with self.lock:
+            info = self.bots.pop(bot_id, None)
+            self._save_bots()
+        if not info:
+            return {'ok': True, 'stopped': False}
+
+        if not stop_bot_process(bot_id, info['pid'], grace=float(grace) if grace is not None else None):
+            with self.lock:
+                self.bots[bot_id] = info
+                self._save_bots()
+            return {'ok': False, 'error': 'Bot did not exit after SIGKILL'}
+
+        return {'ok': True, 'stopped': True}
+
+    def cmd_status(self, request):
+        from main import Config, is_pid_alive
+        from resource_control import read_usage
+
+        bot_id = int(request['bot_id'])
+        with self.lock:
+            info = self.bots.get(bot_id)
+
+        if not info or not is_pid_alive(info['pid'], bot_id):
+            return {'ok': True, 'alive': False}
+
+        return {'ok': True, 'alive': True, 'pid': info['pid'],
+                'usage': read_usage(bot_id, info['pid'], Config.CGROUP_ROOT)}
+
+    def cmd_stats(self, request):
+        from main import Config
+        from resource_control import read_usage
+
+        stats = {}
+        for bot_id, info in self._alive_bots().items():
+            stats[str(bot_id)] = {
+                'pid': info['pid'],
+                'usage': read_usage(bot_id, info['pid'], Config.CGROUP_ROOT)
+            }
+        return {'ok': True, 'node': self.name, 'bots': stats}
+
+
+def _process_start(pid):
+    """Start time of a process in clock ticks since boot (None without /proc)"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # comm (field 2) may contain spaces; starttime is field 22
+            return int(f.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _is_same_process(info):
+    """Whether a saved bot's pid is alive and was not reused by another process"""
+    try:
+        os.kill(info['pid'], 0)
+    except OSError:
+        return False
+    # Zygote-forked bots share the zygote's cmdline, so compare start times instead
+    return info.get('start_ticks') is None or _process_start(info['pid']) == info['start_ticks']
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads JSON lines until the client disconnects"""
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_LINE)
+            if not line:
+                break
+            try:
+                reply = self.server.agent.handle(json.loads(line))
+            except ValueError:
+                reply = {'ok': False, 'error': 'invalid JSON'}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def run_agent(name, listen, token, state_path=None):
+    """Serve agent commands until interrupted"""
+    if not token:
+        raise ValueError("A node agent needs ZENX_NODE_TOKEN; it runs any script it is sent")
+    agent = NodeAgent(name, token, state_path)
+
+    if listen.startswith('unix:'):
+        path = listen[5:]
+        if os.path.exists(path):
+            os.unlink(path)
+        server = _UnixServer(path, _RequestHandler)
+    else:
+        host, port = listen.rsplit(':', 1)
+        server = _TCPServer((host, int(port)), _RequestHandler)
+
+    server.agent = agent
+    logger.info(f"Node agent {name} listening on {listen}")
+    print(f"🌐 Node agent {name} listening on {listen}", flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ZEN X hosting node agent')
+    parser.add_argument('--name', required=True, help='node name as in the nodes table')
+    parser.add_argument('--listen', required=True, help='host:port or unix:/path')
+    parser.add_argument('--state', help='bot table file (default: logs/node_agent_<name>.json)')
+    args = parser.parse_args()
+
+    token = os.environ.get('ZENX_NODE_TOKEN', '')
+    if not token:
+        parser.error('set ZENX_NODE_TOKEN to the token the control plane uses')
+
+    import main  # (configures logging and working directories)
+    run_agent(args.name, args.listen, token,
+              args.state or Path(main.Config.LOGS_DIR) / f"node_agent_{args.name}.json")
@@ -0,0 +1,224 @@
+"""
+ZEN X HOST BOT v4.0 - Node Health
+Heartbeats, phi-accrual failure detection and failover of a dead node's bots
+
+Every agent node is pinged each NODE_HEARTBEAT_INTERVAL seconds. Suspicion
+(phi) grows with the silence since the last reply, judged against that
+node's own heartbeat history. A node is declared down when phi passes
+NODE_PHI_THRESHOLD or the silence passes NODE_DOWN_TIMEOUT; its bots are
+then redeployed on healthy nodes, MAX_CONCURRENT_DEPLOYMENTS at a time.
+Nodes without an agent address run inside this worker and are always up.
+"""
+
+import math
+import time
+import logging
+import threading
+import statistics
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from main import (Config, execute_db, get_placement_engine, sync_placement_nodes, bot_monitors,
+                  release_bot_capacity, deploy_bot, log_event, log_bot_event, send_notification)
+
+logger = logging.getLogger(__name__)
+
+# node_id -> PhiAccrualDetector
+detectors = {}
+failovers_running = set()
+failover_lock = threading.Lock()
+
+
+class PhiAccrualDetector:
+    """Phi accrual failure detector over a window of heartbeat intervals"""
+
+    def __init__(self, expected_interval, min_std=2.0, acceptable_pause=0.0, window=100):
+        # Seed with the expected interval so a node that never answers is still judged
+        self.intervals = deque([float(expected_interval)], maxlen=window)
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        self.last = time.time()
+
+    def heartbeat(self, now=None):
+        now = now or time.time()
+        self.intervals.append(now - self.last)
+        self.last = now
+
+    def silence(self, now=None):
+        return (now or time.time()) - self.last
+
+    def phi(self, now=None):
+        """Suspicion level: phi = 8 means a 1e-8 chance the node is just slow"""
+        elapsed = self.silence(now)
+        mean = statistics.fmean(self.intervals) + self.acceptable_pause
+        std = max(statistics.pstdev(self.intervals), self.min_std)
+
+        # Logistic approximation of the normal CDF, clamped to stay finite
+        y = max(-10.0, min(10.0, (elapsed - mean) / std))
+        e = math.exp(-y * (1.5976 + 0.070566 * y * y))
+        if elapsed > mean:
+            return -math.log10(e / (1.0 + e))
+        return -math.log10(1.0 - 1.0 / (1.0 + e))
+
+
+def get_detector(node_id):
+    detector = detectors.get(node_id)
+    if detector is None:
+        detector = detectors[node_id] = PhiAccrualDetector(
+            Config.NODE_HEARTBEAT_INTERVAL, Config.NODE_PHI_MIN_STD, Config.NODE_ACCEPTABLE_PAUSE)
+    return detector
+
+
+def is_node_dead(detector):
+    return (detector.phi() >= Config.NODE_PHI_THRESHOLD
+            or detector.silence() >= Config.NODE_DOWN_TIMEOUT)
+
+
+# ==================== FAILOVER ====================
+
+def reschedule_bot(bot, node_name):
+    """Redeploy one bot from a dead node; returns True when it runs elsewhere"""
+    bot_id = bot['id']
+
+    # The old process is unreachable; forget it and free its slot. Status goes first so
+    # a monitor that already saw the bot vanish leaves the redeploy to us
+    execute_db("UPDATE deployments SET status='Failover' WHERE id=?", (bot_id,), commit=True)
+    bot_monitors.pop(bot_id, None)
+    release_bot_capacity(bot_id)
+
+    success, message = deploy_bot(bot_id, bot['user_id'])
+    if success:
+        log_bot_event(bot_id, "FAILOVER", f"{node_name} went down; {message}")
+        send_notification(bot['user_id'], f"Bot '{bot['bot_name']}' was moved off failed node {node_name}")
+        return True
+
+    execute_db("UPDATE deployments SET status='Crashed', pid=0 WHERE id=?", (bot_id,), commit=True)
+    log_bot_event(bot_id, "FAILOVER_FAILED", f"{node_name} went down; {message}")
+    send_notification(bot['user_id'], f"Bot '{bot['bot_name']}' stopped: node {node_name} failed ({message})")
+    return False
+
+
+def failover_node(node_id, node_name, phi):
+    """Mark a node down and move its bots to healthy nodes"""
+    try:
+        detected_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        execute_db("UPDATE nodes SET status='down' WHERE id=?", (node_id,), commit=True)
+        sync_placement_nodes(get_placement_engine())
+
+        bots = execute_db("""
+            SELECT id, user_id, bot_name FROM deployments
+            WHERE node_id=? AND status IN ('Running', 'Restarting')
+        """, (node_id,), fetchall=True) or []
+
+        execute_db("""
+            INSERT INTO node_failovers (node_id, detected_at, phi, bots)
+            VALUES (?, ?, ?, ?)
+        """, (node_id, detected_at, round(phi, 2), len(bots)), commit=True)
+
+        logger.error(f"Node {node_name} is down (phi {phi:.1f}), failing over {len(bots)} bots")
+        log_event("NODE_DOWN", f"{node_name} declared down (phi {phi:.1f}); {len(bots)} bots to move")
+
+        with ThreadPoolExecutor(max_workers=Config.MAX_CONCURRENT_DEPLOYMENTS) as pool:
+            results = list(pool.map(lambda bot: reschedule_bot(bot, node_name), bots))
+
+        moved = sum(results)
+        execute_db("""
+            UPDATE node_failovers SET moved=?, failed=?, finished_at=?
+            WHERE node_id=? AND detected_at=?
+        """, (moved, len(results) - moved, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+              node_id, detected_at), commit=True)
+
+        log_event("NODE_FAILOVER", f"{node_name}: moved {moved}/{len(results)} bots")
+
+    except Exception as e:
+        logger.error(f"Failover error for {node_name}: {e}")
+    finally:
+        with failover_lock:
+            failovers_running.discard(node_id)
+
+
+def recover_node(node, reply_time):
+    """Bring a node back after it answers again, stopping bots that moved away meanwhile"""
+    from node_agent import send_command
+
+    address = node['address']
+    try:
+        stats = send_command(address, 'stats', token=Config.NODE_TOKEN, timeout=10)
+        for bot_id in (stats.get('bots') or {}):
+            row = execute_db("SELECT node_id, status FROM deployments WHERE id=?", (int(bot_id),), fetchone=True)
+            if not row or row['node_id'] != node['id'] or row['status'] != 'Running':
+                send_command(address, 'stop', token=Config.NODE_TOKEN, bot_id=int(bot_id),
+                             grace=Config.STOP_GRACE_PERIOD, timeout=Config.STOP_GRACE_PERIOD + 10)
+    except OSError as e:
+        logger.warning(f"Could not clean up stale bots on {node['name']}: {e}")
+        return
+
+    execute_db("UPDATE nodes SET status='active' WHERE id=?", (node['id'],), commit=True)
+    execute_db("UPDATE node_failovers SET recovered_at=? WHERE node_id=? AND recovered_at IS NULL",
+               (reply_time, node['id']), commit=True)
+    sync_placement_nodes(get_placement_engine())
+
+    logger.info(f"Node {node['name']} recovered")
+    log_event("NODE_RECOVERED", f"{node['name']} is answering heartbeats again")
+
+
+# ==================== HEARTBEAT ====================
+
+def check_node(node, engine):
+    """Ping one node and act on its health"""
+    from node_agent import send_command
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    if not node['address']:
+        # Local node: this worker is the agent
+        execute_db("UPDATE nodes SET last_check=? WHERE id=?", (now, node['id']), commit=True)
+        return
+
+    detector = get_detector(node['id'])
+    started = time.time()
+    try:
+        reply = send_command(node['address'], 'ping', token=Config.NODE_TOKEN, timeout=5)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Heartbeat failed for {node['name']}: {e}")
+        reply = {}
+
+    if reply.get('ok'):
+        latency = (time.time() - started) * 1000
+        detector.heartbeat()
+        execute_db("UPDATE nodes SET last_check=?, heartbeat_latency=?, phi=0 WHERE id=?",
+                   (now, round(latency, 1), node['id']), commit=True)
+        engine.update_node_metrics(node['id'], reply.get('cpu_count'), reply.get('loadavg'),
+                                   reply.get('memory_total_mb'), reply.get('memory_available_mb'))
+        if node['status'] == 'down':
+            recover_node(node, now)
+        return
+
+    phi = detector.phi()
+    execute_db("UPDATE nodes SET phi=? WHERE id=?", (round(min(phi, 999), 2), node['id']), commit=True)
+
+    if node['status'] == 'active' and is_node_dead(detector):
+        with failover_lock:
+            if node['id'] in failovers_running:
+                return
+            failovers_running.add(node['id'])
+        threading.Thread(target=failover_node, args=(node['id'], node['name'], phi), daemon=True).start()
+
+
+def node_heartbeat_thread():
+    """Ping node agents, record their heartbeats and fail over dead nodes"""
+    while True:
+        try:
+            engine = get_placement_engine()
+            sync_placement_nodes(engine)
+            nodes = execute_db("SELECT id, name, address, status FROM nodes", fetchall=True) or []
+
+            for node in nodes:
+                check_node(node, engine)
+
+            time.sleep(Config.NODE_HEARTBEAT_INTERVAL)
+
+        except Exception as e:
+            logger.error(f"Node heartbeat thread error: {e}")
+            time.sleep(60)
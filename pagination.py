@@ -0,0 +1,128 @@
+"""
+ZEN X HOST BOT v4.0 - Keyset Pagination
+Cursor-paged admin lists with stable sort keys and cached totals
+
+A list is ordered by one or more key columns, all in the same direction,
+the last of which is unique (normally the row id). The leading keys may
+be nullable timestamps, so they are compared as COALESCE(key, ''): a row
+without one sorts as the oldest rather than ending or dropping out of the
+list, and a cursor never holds a NULL. A page continues from the keys of
+the row before it with a row-value comparison, so a deep page costs the
+same as the first and rows added meanwhile neither shift nor repeat
+entries. Cursors are opaque: the keys of the first or last row on a page,
+base64url-encoded. Totals are counted at most once per
+ADMIN_COUNT_CACHE_TTL seconds per query, so views show them as
+approximate.
+"""
+
+import json
+import time
+import base64
+import logging
+import threading
+
+from main import Config, execute_db
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursor(ValueError):
+    """A cursor that wasn't issued for this list"""
+
+
+_counts = {}  # (sql, params) -> (expires, value)
+_counts_lock = threading.Lock()
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Key values from a cursor; InvalidCursor if it doesn't fit the list"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if (not isinstance(values, list) or len(values) != size
+            or not all(isinstance(v, (int, float, str)) for v in values)):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def cached_row(sql, params=()):
+    """Result of an aggregate query, recomputed at most every ADMIN_COUNT_CACHE_TTL seconds"""
+    key = (sql, tuple(params))
+    now = time.monotonic()
+    with _counts_lock:
+        entry = _counts.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    row = execute_db(sql, tuple(params), fetchone=True)
+    value = dict(row) if row else {}
+
+    with _counts_lock:
+        if len(_counts) > 256:
+            _counts.clear()
+        _counts[key] = (now + Config.ADMIN_COUNT_CACHE_TTL, value)
+    return value
+
+
+def keyset_page(columns, source, keys, where=(), params=(), after=None, before=None,
+                limit=None, descending=True, count_source=None):
+    """One page of a list: {'rows', 'next', 'prev', 'total', 'per_page'}
+
+    keys are SQL expressions ending with a unique one; pass the 'next'
+    cursor as after= or the 'prev' cursor as before= to move on.
+    """
+    limit = max(1, min(limit or Config.ADMIN_PAGE_SIZE, Config.ADMIN_MAX_PAGE_SIZE))
+    keys = [f"COALESCE({key}, '')" for key in keys[:-1]] + list(keys[-1:])
+    conditions, values = list(where), list(params)
+
+    # Going back walks the list in reverse and flips the page afterwards
+    backwards = bool(before) and not after
+    cursor = before if backwards else after
+    reverse = descending != backwards
+    if cursor:
+        compare = '<' if reverse else '>'
+        conditions.append(f"({', '.join(keys)}) {compare} ({', '.join('?' * len(keys))})")
+        values += decode_cursor(cursor, len(keys))
+
+    key_columns = ', '.join(f"{key} AS _key{i}" for i, key in enumerate(keys))
+    direction = 'DESC' if reverse else 'ASC'
+    rows = execute_db(f"""
+        SELECT {columns}, {key_columns}
+        FROM {source}
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY {', '.join(f'{key} {direction}' for key in keys)}
+        LIMIT ?
+    """, tuple(values) + (limit + 1,), fetchall=True) or []
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    page, cursors = [], []
+    for row in rows:
+        item = dict(row)
+        cursors.append(encode_cursor(item.pop(f'_key{i}') for i in range(len(keys))))
+        page.append(item)
+
+    has_next = more if not backwards else True
+    has_prev = more if backwards else bool(cursor)
+
+    total = cached_row(f"""
+        SELECT COUNT(*) AS total FROM {count_source or source}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+    """, params).get('total', 0)
+
+    return {
+        'rows': page,
+        'next': cursors[-1] if page and has_next else None,
+        'prev': cursors[0] if page and has_prev else None,
+        'total': total,
+        'per_page': limit
+    }
@@ -0,0 +1,273 @@
+"""
+ZEN X HOST BOT v4.0 - Placement Engine
+Live in-memory view of node capacity and weighted bot placement
+
+Pure logic with no database access; main.py keeps it in sync with the
+nodes/deployments tables, and benchmarks can drive it directly.
+"""
+
+import copy
+import threading
+
+DEFAULT_WEIGHTS = {'cpu': 0.4, 'memory': 0.4, 'count': 0.2}
+DEFAULT_FOOTPRINT = {'cpu': 5.0, 'memory_mb': 64.0}
+
+
+class NodeState:
+    """Capacity and current occupants of one node"""
+
+    def __init__(self, node_id, name, capacity, region=None, status='active',
+                 cpu_capacity=400.0, memory_mb=4096.0, address=None):
+        self.id = node_id
+        self.name = name
+        self.capacity = capacity
+        self.region = region
+        self.status = status
+        self.address = address
+        self.cpu_capacity = cpu_capacity  # percent of one core, e.g. 4 cores = 400
+        self.memory_mb = memory_mb
+
+        self.bots = {}  # bot_id -> (user_id, footprint)
+        self.users = {}  # user_id -> bot count
+        self.cpu_reserved = 0.0
+        self.memory_reserved = 0.0
+
+        # Measured host usage from heartbeats; None until the first report
+        self.cpu_measured = None
+        self.memory_measured = None
+
+    @property
+    def count(self):
+        return len(self.bots)
+
+    def cpu_used(self):
+        return max(self.cpu_reserved, self.cpu_measured or 0.0)
+
+    def memory_used(self):
+        return max(self.memory_reserved, self.memory_measured or 0.0)
+
+    def utilization(self, weights=None):
+        """Weighted utilization in [0, 1+]"""
+        weights = weights or DEFAULT_WEIGHTS
+        return (weights['cpu'] * self.cpu_used() / self.cpu_capacity
+                + weights['memory'] * self.memory_used() / self.memory_mb
+                + weights['count'] * self.count / self.capacity)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'region': self.region,
+            'status': self.status,
+            'address': self.address,
+            'capacity': self.capacity,
+            'current_load': self.count,
+            'cpu_used': round(self.cpu_used(), 1),
+            'cpu_capacity': self.cpu_capacity,
+            'memory_used_mb': round(self.memory_used(), 1),
+            'memory_mb': self.memory_mb
+        }
+
+
+class PlacementEngine:
+    """Scores nodes by weighted CPU/RAM/count with per-user anti-affinity"""
+
+    def __init__(self, weights=None, anti_affinity=0.25):
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.anti_affinity = anti_affinity
+        self.nodes = {}
+        self.bot_nodes = {}  # bot_id -> node_id
+        self.lock = threading.RLock()
+
+    # ----- node bookkeeping -----
+
+    def set_node(self, node_id, name, capacity, region=None, status='active',
+                 cpu_capacity=400.0, memory_mb=4096.0, address=None):
+        """Add a node or refresh its static attributes, keeping its bots"""
+        with self.lock:
+            node = self.nodes.get(node_id)
+            if node is None:
+                node = NodeState(node_id, name, capacity, region, status, cpu_capacity, memory_mb, address)
+                self.nodes[node_id] = node
+            else:
+                node.name, node.capacity, node.region = name, capacity, region
+                node.status, node.address = status, address
+                node.cpu_capacity, node.memory_mb = cpu_capacity, memory_mb
+            return node
+
+    def update_node_metrics(self, node_id, cpu_count=None, loadavg=None,
+                            memory_total_mb=None, memory_available_mb=None):
+        """Fold a heartbeat's host measurements into the view"""
+        with self.lock:
+            node = self.nodes.get(node_id)
+            if not node:
+                return
+            if cpu_count:
+                node.cpu_capacity = cpu_count * 100.0
+            if loadavg is not None:
+                node.cpu_measured = loadavg * 100.0
+            if memory_total_mb:
+                node.memory_mb = float(memory_total_mb)
+                if memory_available_mb is not None:
+                    node.memory_measured = float(memory_total_mb - memory_available_mb)
+
+    # ----- placement -----
+
+    def _fits(self, node, footprint):
+        return (node.status == 'active'
+                and node.count < node.capacity
+                and node.cpu_used() + footprint['cpu'] <= node.cpu_capacity
+                and node.memory_used() + footprint['memory_mb'] <= node.memory_mb)
+
+    def score(self, node, user_id, footprint, region=None):
+        """Lower is better: projected utilization plus affinity penalties"""
+        w = self.weights
+        score = (w['cpu'] * (node.cpu_used() + footprint['cpu']) / node.cpu_capacity
+                 + w['memory'] * (node.memory_used() + footprint['memory_mb']) / node.memory_mb
+                 + w['count'] * (node.count + 1) / node.capacity)
+        score += self.anti_affinity * node.users.get(user_id, 0)
+        if region and node.region != region:
+            score += 0.5
+        return score
+
+    def choose(self, user_id, footprint=None, region=None, exclude=(), node_id=None):
+        """Pick the best node (or check the given one) without reserving it"""
+        footprint = footprint or DEFAULT_FOOTPRINT
+        with self.lock:
+            best, best_score = None, None
+            for node in self.nodes.values():
+                if node_id is not None and node.id != node_id:
+                    continue
+                if node.id in exclude or not self._fits(node, footprint):
+                    continue
+                s = self.score(node, user_id, footprint, region)
+                if best is None or s < best_score:
+                    best, best_score = node, s
+            return best
+
+    def reserve(self, bot_id, node_id, user_id, footprint=None):
+        """Record a bot on a node (releasing any previous placement)"""
+        footprint = dict(footprint or DEFAULT_FOOTPRINT)
+        with self.lock:
+            self.release(bot_id)
+            node = self.nodes[node_id]
+            node.bots[bot_id] = (user_id, footprint)
+            node.users[user_id] = node.users.get(user_id, 0) + 1
+            node.cpu_reserved += footprint['cpu']
+            node.memory_reserved += footprint['memory_mb']
+            self.bot_nodes[bot_id] = node_id
+            return node
+
+    def place(self, bot_id, user_id, footprint=None, region=None, exclude=(), node_id=None):
+        """Choose and reserve a node for a bot; returns the NodeState or None"""
+        with self.lock:
+            node = self.choose(user_id, footprint, region, exclude, node_id)
+            if node is None:
+                return None
+            return self.reserve(bot_id, node.id, user_id, footprint)
+
+    def release(self, bot_id):
+        """Free a bot's capacity; returns the node it was on, if any"""
+        with self.lock:
+            node_id = self.bot_nodes.pop(bot_id, None)
+            node = self.nodes.get(node_id)
+            if not node:
+                return None
+            user_id, footprint = node.bots.pop(bot_id)
+            node.users[user_id] -= 1
+            if node.users[user_id] <= 0:
+                del node.users[user_id]
+            node.cpu_reserved = max(0.0, node.cpu_reserved - footprint['cpu'])
+            node.memory_reserved = max(0.0, node.memory_reserved - footprint['memory_mb'])
+            return node
+
+    def update_footprint(self, bot_id, cpu=None, memory_mb=None):
+        """Replace a running bot's estimate with its measured usage"""
+        with self.lock:
+            node = self.nodes.get(self.bot_nodes.get(bot_id))
+            if not node:
+                return
+            user_id, footprint = node.bots[bot_id]
+            if cpu is not None:
+                node.cpu_reserved += cpu - footprint['cpu']
+                footprint['cpu'] = cpu
+            if memory_mb is not None:
+                node.memory_reserved += memory_mb - footprint['memory_mb']
+                footprint['memory_mb'] = memory_mb
+
+    def bot_weight(self, node, footprint):
+        """A bot's share of its node's CPU and RAM, weighted like utilization"""
+        return (self.weights['cpu'] * footprint['cpu'] / node.cpu_capacity
+                + self.weights['memory'] * footprint['memory_mb'] / node.memory_mb)
+
+    def clone(self):
+        """Independent copy for what-if planning"""
+        with self.lock:
+            lock, self.lock = self.lock, None
+            try:
+                other = copy.deepcopy(self)
+            finally:
+                self.lock = lock
+        other.lock = threading.RLock()
+        return other
+
+    def plan_moves(self, high_watermark, low_watermark, max_moves, movable=None):
+        """Plan migrations off inactive nodes and active nodes above the high watermark
+
+        Bots move heaviest first, only to nodes that stay at or below the low
+        watermark (the high one when draining an inactive node). Nodes that are
+        down are left to failover. Projections use reserved footprints, not
+        host measurements.
+
+        Returns (moves, projected snapshot); the live view is not changed.
+        """
+        sim = self.clone()
+        for node in sim.nodes.values():
+            node.cpu_measured = node.memory_measured = None
+
+        moves, exhausted = [], set()
+        while len(moves) < max_moves:
+            sources = [n for n in sim.nodes.values()
+                       if n.id not in exhausted and n.bots
+                       and (n.status == 'inactive'
+                            or (n.status == 'active' and n.utilization(sim.weights) > high_watermark))]
+            if not sources:
+                break
+
+            # Drain inactive nodes first, then the hottest
+            source = max(sources, key=lambda n: (n.status == 'inactive', n.utilization(sim.weights)))
+            moved_ids = {m['bot_id'] for m in moves}
+            candidates = sorted(
+                (bot_id for bot_id in source.bots
+                 if bot_id not in moved_ids and (movable is None or movable(bot_id))),
+                key=lambda b: sim.bot_weight(source, source.bots[b][1]), reverse=True)
+
+            limit = low_watermark if source.status == 'active' else high_watermark
+            for bot_id in candidates:
+                user_id, footprint = source.bots[bot_id]
+                target = sim.choose(user_id, footprint, exclude={source.id})
+                if target is None:
+                    continue
+                sim.reserve(bot_id, target.id, user_id, footprint)
+                if target.utilization(sim.weights) > limit:
+                    sim.reserve(bot_id, source.id, user_id, footprint)
+                    continue
+                moves.append({'bot_id': bot_id, 'user_id': user_id,
+                              'from': source.id, 'from_name': source.name,
+                              'to': target.id, 'to_name': target.name,
+                              'footprint': dict(footprint)})
+                break
+            else:
+                exhausted.add(source.id)
+
+        return moves, sim.snapshot()
+
+    def node_of(self, bot_id):
+        with self.lock:
+            return self.nodes.get(self.bot_nodes.get(bot_id))
+
+    def snapshot(self):
+        """Per-node view for admin pages and the rebalancer"""
+        with self.lock:
+            return [dict(node.to_dict(), utilization=round(node.utilization(self.weights), 3))
+                    for node in sorted(self.nodes.values(), key=lambda n: n.id)]
@@ -0,0 +1,327 @@
+"""
+ZEN X HOST BOT v4.0 - Pre-flight Analysis
+Static checks on uploaded scripts before they can be deployed
+
+Each script is parsed with ast (never executed) and checked for syntax
+errors, an entrypoint, banned constructs and the modules it imports. It
+runs at upload time only, so bots accepted under older rules keep
+deploying and auto-restarting. The per-file results depend only on the
+source, so they are cached by SHA-256: re-uploads of the same file skip
+the parse. Whether the imports are installed depends on the host, so
+that part is checked on each call.
+"""
+
+import ast
+import sys
+import posixpath
+import json
+import hashlib
+import logging
+import importlib.util
+from pathlib import Path
+from datetime import datetime
+
+from main import Config, execute_db
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rules change so cached results are recomputed
+ANALYZER_VERSION = 2
+
+# Modules and calls a hosted bot has no business using
+BANNED_MODULES = {
+    'ctypes': "loads native code",
+    'pty': "spawns terminals",
+    'marshal': "loads hidden bytecode",
+}
+BANNED_CALLS = {
+    'os.fork': "forks processes outside its limits",
+    'os.forkpty': "forks processes outside its limits",
+    'os.setuid': "changes user",
+    'os.setgid': "changes group",
+    'os.chroot': "changes root directory",
+    'os.killpg': "signals other processes",
+    'shutil.rmtree': None,  # only banned on absolute paths, see _check_call
+}
+# Wrapping decoded data in exec/eval is how obfuscated payloads hide
+DECODERS = {'base64.b64decode', 'base64.b32decode', 'base64.a85decode', 'binascii.unhexlify',
+            'zlib.decompress', 'bytes.fromhex', 'codecs.decode'}
+RISKY_CALLS = {
+    'os.system': "runs shell commands",
+    'os.popen': "runs shell commands",
+}
+# Host files no bot should touch (matched as whole path components)
+HOST_PATHS = ('/etc/shadow', '/etc/passwd', '/root', '/proc/1')
+
+ENTRYPOINT_RUNNERS = {'polling', 'infinity_polling', 'run', 'run_polling', 'start_polling', 'idle', 'main'}
+
+
+class ScriptVisitor(ast.NodeVisitor):
+    """Collect imports, entrypoint hints and banned constructs from one module"""
+
+    def __init__(self):
+        self.aliases = {}  # local name -> dotted module path
+        self.imports = set()
+        self.errors = []
+        self.warnings = []
+        self.has_main = False
+        self.has_main_guard = False
+        self.runs_at_module_level = False
+
+    def _error(self, node, message):
+        self.errors.append(f"line {node.lineno}: {message}")
+
+    def _warn(self, node, message):
+        self.warnings.append(f"line {node.lineno}: {message}")
+
+    def _check_module(self, node, name):
+        top = name.split('.')[0]
+        self.imports.add(top)
+        if top in BANNED_MODULES:
+            self._error(node, f"import of '{top}' is not allowed ({BANNED_MODULES[top]})")
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._check_module(node, alias.name)
+            if alias.asname:
+                self.aliases[alias.asname] = alias.name
+            else:
+                top = alias.name.split('.')[0]
+                self.aliases[top] = top
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node):
+        if node.level == 0 and node.module:
+            self._check_module(node, node.module)
+            for alias in node.names:
+                self.aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+        self.generic_visit(node)
+
+    def dotted(self, node):
+        """Resolve a call target like `sp.run` to `subprocess.run` through import aliases"""
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name):
+            return None
+        parts.append(self.aliases.get(node.id, node.id))
+        return '.'.join(reversed(parts))
+
+    def visit_Call(self, node):
+        name = self.dotted(node.func)
+        if name:
+            self._check_call(node, name)
+        self.generic_visit(node)
+
+    def _check_call(self, node, name):
+        if name == 'shutil.rmtree':
+            target = node.args[0] if node.args else None
+            if isinstance(target, ast.Constant) and isinstance(target.value, str) and target.value.startswith(('/', '~')):
+                self._error(node, f"shutil.rmtree('{target.value}') deletes files outside the project")
+        elif name in BANNED_CALLS:
+            self._error(node, f"{name}() is not allowed ({BANNED_CALLS[name]})")
+        elif name in RISKY_CALLS:
+            self._warn(node, f"{name}() {RISKY_CALLS[name]}")
+        elif name.startswith('subprocess.') and any(
+                kw.arg == 'shell' and isinstance(kw.value, ast.Constant) and kw.value.value for kw in node.keywords):
+            self._warn(node, f"{name}(shell=True) runs shell commands")
+        elif name in ('exec', 'eval', 'compile'):
+            for arg in ast.walk(node):
+                if isinstance(arg, ast.Call) and arg is not node and self.dotted(arg.func) in DECODERS:
+                    self._error(node, f"{name}() of decoded data (obfuscated code) is not allowed")
+                    break
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, str):
+            value = node.value
+            if _is_host_path(value) or value.startswith('../') or value.endswith(Config.DB_NAME):
+                self._error(node, f"access to '{value[:60]}' outside the project is not allowed")
+
+    def visit_FunctionDef(self, node):
+        if node.name == 'main' and node.col_offset == 0:
+            self.has_main = True
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Module(self, node):
+        for stmt in _module_level(node.body):
+            if isinstance(stmt, ast.If) and _is_main_guard(stmt.test):
+                self.has_main_guard = True
+            elif isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call):
+                func = stmt.value.func
+                name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+                if name in ENTRYPOINT_RUNNERS:
+                    self.runs_at_module_level = True
+        self.generic_visit(node)
+
+
+def _module_level(body):
+    """Statements that run on import: the body plus while/for/if/try/with blocks, not defs"""
+    for stmt in body:
+        yield stmt
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if isinstance(stmt, ast.If) and _is_main_guard(stmt.test):
+            continue
+        for field in ('body', 'orelse', 'finalbody'):
+            yield from _module_level(getattr(stmt, field, None) or [])
+        for handler in getattr(stmt, 'handlers', None) or []:
+            yield from _module_level(handler.body)
+        for case in getattr(stmt, 'cases', None) or []:
+            yield from _module_level(case.body)
+
+
+def _is_host_path(value):
+    """Whether a string is a path to host files; text with spaces is not a path"""
+    if not value.startswith('/') or any(c.isspace() for c in value):
+        return False
+    path = posixpath.normpath(value)
+    return any(path == host or path.startswith(host + '/') for host in HOST_PATHS)
+
+
+def _is_main_guard(test):
+    """`if __name__ == '__main__':` in either operand order"""
+    if not (isinstance(test, ast.Compare) and len(test.ops) == 1 and isinstance(test.ops[0], ast.Eq)):
+        return False
+    operands = [test.left, test.comparators[0]]
+    names = [o.id for o in operands if isinstance(o, ast.Name)]
+    values = [o.value for o in operands if isinstance(o, ast.Constant)]
+    return names == ['__name__'] and values == ['__main__']
+
+
+def source_hash(source):
+    return hashlib.sha256(f"preflight-v{ANALYZER_VERSION}\0".encode() + source).hexdigest()
+
+
+def analyze_source(source, filename='<upload>'):
+    """Analyze one module's source (bytes); the result depends only on the source"""
+    report = {'errors': [], 'warnings': [], 'imports': [], 'entrypoint': None, 'defines_main': False}
+
+    try:
+        tree = ast.parse(source, filename=filename)
+    except SyntaxError as e:
+        report['errors'].append(f"line {e.lineno}: syntax error: {e.msg}")
+        return report
+    except (ValueError, RecursionError) as e:
+        report['errors'].append(f"could not parse: {e}")
+        return report
+
+    visitor = ScriptVisitor()
+    visitor.visit(tree)
+
+    if visitor.has_main_guard:
+        report['entrypoint'] = "__main__ block"
+    elif visitor.runs_at_module_level:
+        report['entrypoint'] = "module level"
+    report['defines_main'] = visitor.has_main
+    report['errors'] = visitor.errors
+    report['warnings'] = visitor.warnings
+    report['imports'] = sorted(visitor.imports)
+    return report
+
+
+def analyze_file(path):
+    """Cached analyze_source for a file on disk"""
+    source = Path(path).read_bytes()
+    digest = source_hash(source)
+
+    row = execute_db("SELECT report FROM script_analysis WHERE sha256=?", (digest,), fetchone=True)
+    if row:
+        report = json.loads(row['report'])
+        report['cached'] = True
+        return report
+
+    report = analyze_source(source, str(path))
+    execute_db("INSERT OR REPLACE INTO script_analysis (sha256, ok, report, analyzed_at) VALUES (?, ?, ?, ?)",
+               (digest, int(not report['errors']), json.dumps(report),
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S')), commit=True)
+    report['cached'] = False
+    return report
+
+
+def local_modules(directory):
+    """Module names importable from a project's own files"""
+    names = set()
+    for path in Path(directory).iterdir():
+        if path.suffix == '.py':
+            names.add(path.stem)
+        elif path.is_dir() and ((path / '__init__.py').exists() or any(path.glob('*.py'))):
+            names.add(path.name)
+    return names
+
+
+def preflight_check(file_path):
+    """Check a bot before it may be deployed; returns (ok, report)"""
+    from deps import find_requirements, schedule_build
+
+    file_path = Path(file_path)
+    project_root = Path(Config.PROJECT_DIR).resolve()
+    project_dir = file_path.resolve().parent
+
+    entry = analyze_file(file_path)
+    report = {
+        'errors': list(entry['errors']),
+        'warnings': list(entry['warnings']),
+        'entrypoint': entry['entrypoint'],
+        'files': 1,
+        'cached': entry['cached'],
+        'deps_hash': None
+    }
+    imports = set(entry['imports'])
+    known = local_modules(project_dir)
+
+    if project_dir != project_root:
+        # ZIP project: the other modules must parse and be clean too
+        for path in sorted(project_dir.rglob('*.py')):
+            if path.resolve() == file_path.resolve() or '__MACOSX' in path.parts:
+                continue
+            result = analyze_file(path)
+            relative = path.relative_to(project_dir).as_posix()
+            report['errors'] += [f"{relative}: {e}" for e in result['errors']]
+            report['warnings'] += [f"{relative}: {w}" for w in result['warnings']]
+            report['cached'] = report['cached'] and result['cached']
+            report['files'] += 1
+            imports.update(result['imports'])
+            known.update(local_modules(path.parent))
+
+    if not report['entrypoint'] and not entry['errors']:
+        if entry['defines_main']:
+            report['errors'].append("main() is defined but never called; add `if __name__ == '__main__': main()`")
+        else:
+            report['errors'].append("no entrypoint: define main() and call it, or start the bot at module level")
+
+    third_party = sorted(
+        name for name in imports - known
+        if name not in sys.stdlib_module_names and name != '__future__'
+    )
+    report['imports'] = third_party
+
+    # Start installing requirements now so the first deploy doesn't wait
+    requirements = find_requirements(file_path)
+    if requirements:
+        try:
+            report['deps_hash'] = schedule_build(file_path)
+        except Exception as e:
+            report['errors'].append(f"could not read requirements.txt: {e}")
+    else:
+        # Without requirements.txt the bot runs with the host's packages
+        for name in third_party:
+            try:
+                installed = importlib.util.find_spec(name) is not None
+            except (ImportError, ValueError):
+                installed = False
+            if not installed:
+                report['errors'].append(
+                    f"module '{name}' is not installed; upload a ZIP with a requirements.txt that lists it")
+
+    return not report['errors'], report
+
+
+def format_preflight_errors(report, limit=5):
+    """Short list of problems for chat messages"""
+    lines = [f"• {e}" for e in report['errors'][:limit]]
+    if len(report['errors']) > limit:
+        lines.append(f"• ... and {len(report['errors']) - limit} more")
+    return '\n'.join(lines)
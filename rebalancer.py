@@ -0,0 +1,158 @@
+"""
+ZEN X HOST BOT v4.0 - Rebalancer
+Moves the heaviest bots off hot or inactive nodes onto cooler ones
+
+A move is stop -> start on the target -> verify; if the target fails the
+bot is redeployed wherever it fits. Set ZENX_REBALANCE_DRY_RUN=1 to only
+log planned moves, or preview a plan without touching any bot (safe to run
+next to a live system):
+
+    python rebalancer.py [--json]
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import datetime
+
+from main import (Config, execute_db, get_placement_engine, sync_placement_nodes,
+                  stop_bot_process, deploy_bot, log_event, log_bot_event, send_notification)
+
+logger = logging.getLogger(__name__)
+
+# bot_id -> time of its last migration
+last_moved = {}
+
+
+def get_movable_bots():
+    """Running bots that are past restart backoff and migration cooldown"""
+    now = time.time()
+    rows = execute_db("SELECT id, start_time FROM deployments WHERE status='Running'", fetchall=True) or []
+
+    movable = set()
+    for row in rows:
+        try:
+            started = datetime.strptime(row['start_time'], '%Y-%m-%d %H:%M:%S').timestamp()
+        except (TypeError, ValueError):
+            continue
+        if now - started < Config.REBALANCE_MIN_UPTIME:
+            continue
+        if now - last_moved.get(row['id'], 0) < Config.REBALANCE_BOT_COOLDOWN:
+            continue
+        movable.add(row['id'])
+    return movable
+
+
+def plan_rebalance():
+    """Planned moves with current and projected node load"""
+    engine = get_placement_engine()
+    sync_placement_nodes(engine)
+
+    movable = get_movable_bots()
+    moves, projected = engine.plan_moves(
+        Config.REBALANCE_HIGH_WATERMARK, Config.REBALANCE_LOW_WATERMARK,
+        Config.REBALANCE_MAX_MOVES, movable=movable.__contains__)
+
+    return {'moves': moves, 'current': engine.snapshot(), 'projected': projected}
+
+
+def migrate_bot(bot_id, target_node_id):
+    """Move a running bot to another node"""
+    bot = execute_db("""
+        SELECT d.id, d.user_id, d.bot_name, d.pid, d.status, d.node_id, n.address, n.name AS node_name
+        FROM deployments d LEFT JOIN nodes n ON d.node_id = n.id
+        WHERE d.id=?
+    """, (bot_id,), fetchone=True)
+
+    if not bot or bot['status'] != 'Running':
+        return False, "Bot is not running"
+    if bot['node_id'] == target_node_id:
+        return False, "Bot is already on that node"
+
+    execute_db("UPDATE deployments SET status='Migrating' WHERE id=?", (bot_id,), commit=True)
+
+    if not stop_bot_process(bot_id, bot['pid'], bot['address']):
+        execute_db("UPDATE deployments SET status='Running' WHERE id=?", (bot_id,), commit=True)
+        return False, f"Could not stop bot on {bot['node_name']}"
+
+    last_moved[bot_id] = time.time()
+    success, message = deploy_bot(bot_id, bot['user_id'], node_id=target_node_id)
+    if success:
+        log_bot_event(bot_id, "MIGRATED", f"Moved from {bot['node_name']}: {message}")
+        return True, message
+
+    # Target refused or the bot didn't come up there; put it back anywhere
+    logger.warning(f"Migration of bot {bot_id} failed ({message}), redeploying")
+    success, fallback = deploy_bot(bot_id, bot['user_id'])
+    if success:
+        log_bot_event(bot_id, "MIGRATION_FAILED", f"{message}; redeployed: {fallback}")
+        return False, message
+
+    execute_db("UPDATE deployments SET status='Crashed', pid=0 WHERE id=?", (bot_id,), commit=True)
+    log_bot_event(bot_id, "MIGRATION_FAILED", f"{message}; redeploy failed: {fallback}")
+    send_notification(bot['user_id'], f"Bot '{bot['bot_name']}' stopped during node maintenance: {fallback}")
+    return False, message
+
+
+def rebalance_nodes(dry_run=False):
+    """Run one rebalancing pass; with dry_run only the plan is returned"""
+    plan = plan_rebalance()
+    plan['dry_run'] = dry_run
+
+    if dry_run or not plan['moves']:
+        for move in plan['moves']:
+            logger.info(f"[dry-run] Bot {move['bot_id']}: {move['from_name']} -> {move['to_name']}")
+        return plan
+
+    results = []
+    for i, move in enumerate(plan['moves']):
+        if i:
+            time.sleep(Config.REBALANCE_MOVE_DELAY)
+        success, message = migrate_bot(move['bot_id'], move['to'])
+        results.append(dict(move, success=success, message=message))
+
+    moved = sum(1 for r in results if r['success'])
+    log_event("REBALANCE", f"Moved {moved}/{len(results)} bots off hot nodes")
+    plan['results'] = results
+    return plan
+
+
+def rebalancer_thread():
+    """Rebalance nodes in the background"""
+    while True:
+        time.sleep(Config.REBALANCE_INTERVAL)
+        try:
+            rebalance_nodes(dry_run=Config.REBALANCE_DRY_RUN)
+        except Exception as e:
+            logger.error(f"Rebalancer error: {e}")
+
+
+def print_plan(plan):
+    projected = {n['id']: n for n in plan['projected']}
+    print("Node load (weighted utilization): current -> projected")
+    for node in plan['current']:
+        after = projected[node['id']]
+        print(f"  {node['name']:<10} {node['status']:<8} {node['utilization']:6.3f} -> {after['utilization']:6.3f}  "
+              f"bots {node['current_load']} -> {after['current_load']}")
+
+    if not plan['moves']:
+        print("No moves needed")
+    for move in plan['moves']:
+        print(f"  bot {move['bot_id']:>5} (user {move['user_id']}): {move['from_name']} -> {move['to_name']}  "
+              f"cpu {move['footprint']['cpu']:.1f}%  ram {move['footprint']['memory_mb']:.0f} MB")
+
+
+if __name__ == '__main__':
+    # Moves only run inside the main process, which owns the bot monitors
+    parser = argparse.ArgumentParser(description='Report planned rebalancing moves and projected node load')
+    parser.add_argument('--json', action='store_true', help='print the plan as JSON')
+    args = parser.parse_args()
+
+    plan = rebalance_nodes(dry_run=True)
+    if args.json:
+        json.dump(plan, sys.stdout, indent=2)
+        print()
+    else:
+        print_plan(plan)
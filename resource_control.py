@@ -0,0 +1,197 @@
+"""
+ZEN X HOST BOT v4.0 - Bot Resource Controller
+Per-bot cgroup v2 limits and accounting, with setrlimit fallback
+
+Only stdlib is imported at module level so forked bots can apply their
+own limits without pulling in main.py.
+"""
+
+import os
+import logging
+import resource
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CGROUP_MOUNT = Path('/sys/fs/cgroup')
+CPU_PERIOD_USEC = 100000
+CONTROLLERS = ('cpu', 'memory', 'pids')
+
+_cgroup_state = {'checked': False, 'root': None}
+_cgroup_lock = threading.Lock()
+
+
+# ==================== CGROUP DETECTION ====================
+
+def _write(path, value):
+    with open(path, 'w') as f:
+        f.write(str(value))
+
+
+def _enable_controllers(cgroup_dir):
+    """Turn on cpu/memory/pids for children of a cgroup (best effort)"""
+    control = cgroup_dir / 'cgroup.subtree_control'
+    try:
+        enabled = control.read_text().split()
+    except OSError:
+        return False
+
+    for name in CONTROLLERS:
+        if name not in enabled:
+            try:
+                _write(control, f"+{name}")
+            except OSError:
+                return False
+    return True
+
+
+def get_cgroup_root(configured=None):
+    """Return the delegated cgroup directory for bots, or None if unavailable"""
+    with _cgroup_lock:
+        if _cgroup_state['checked']:
+            return _cgroup_state['root']
+        _cgroup_state['checked'] = True
+
+        if not (CGROUP_MOUNT / 'cgroup.controllers').exists():
+            logger.info("cgroup v2 not mounted, using rlimits for bot limits")
+            return None
+
+        root = Path(configured) if configured else CGROUP_MOUNT / 'zenx'
+        try:
+            root.mkdir(exist_ok=True)
+            # The parent must delegate the controllers before root can use them
+            _enable_controllers(root.parent)
+            if not _enable_controllers(root):
+                raise PermissionError("controllers not delegated")
+            probe = root / '.probe'
+            probe.mkdir(exist_ok=True)
+            probe.rmdir()
+        except OSError as e:
+            logger.info(f"cgroup delegation unavailable at {root} ({e}), using rlimits")
+            return None
+
+        _cgroup_state['root'] = root
+        logger.info(f"Bot cgroups enabled under {root}")
+        return root
+
+
+# ==================== LIMITS ====================
+
+def create_bot_cgroup(bot_id, limits, configured_root=None):
+    """Create (or reset) the cgroup for a bot and apply its limits"""
+    root = get_cgroup_root(configured_root)
+    if not root:
+        return None
+
+    cgroup_dir = root / f"bot_{bot_id}"
+    try:
+        cgroup_dir.mkdir(exist_ok=True)
+
+        quota = int(CPU_PERIOD_USEC * limits['cpu_percent'] / 100)
+        _write(cgroup_dir / 'cpu.max', f"{quota} {CPU_PERIOD_USEC}")
+        _write(cgroup_dir / 'memory.max', limits['memory_mb'] * 1024 * 1024)
+        _write(cgroup_dir / 'pids.max', limits['pids'])
+        try:
+            _write(cgroup_dir / 'memory.swap.max', 0)
+        except OSError:
+            pass
+
+        return str(cgroup_dir)
+    except OSError as e:
+        logger.error(f"Could not configure cgroup for bot {bot_id}: {e}")
+        return None
+
+
+def kill_bot_cgroup(bot_id, configured_root=None):
+    """SIGKILL every process in a bot's cgroup, including ones that left its process group"""
+    root = get_cgroup_root(configured_root)
+    if not root:
+        return False
+
+    try:
+        # cgroup.kill needs Linux 5.14+
+        _write(root / f"bot_{bot_id}" / 'cgroup.kill', 1)
+        return True
+    except OSError:
+        return False
+
+
+def remove_bot_cgroup(bot_id, configured_root=None):
+    """Remove a bot's cgroup once all of its processes have exited"""
+    root = get_cgroup_root(configured_root)
+    if not root:
+        return
+
+    try:
+        (root / f"bot_{bot_id}").rmdir()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.debug(f"cgroup for bot {bot_id} still busy: {e}")
+
+
+def apply_in_child(cgroup_path, limits):
+    """Run in the bot process before its code starts: join the cgroup or set rlimits"""
+    if cgroup_path:
+        try:
+            _write(Path(cgroup_path) / 'cgroup.procs', 0)
+            return
+        except OSError:
+            pass
+
+    if not limits:
+        return
+
+    # RLIMIT_DATA counts heap and anonymous mappings, a close stand-in for memory.max
+    memory = limits['memory_mb'] * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_DATA, (memory, memory))
+    except (ValueError, OSError):
+        pass
+
+    # No per-bot CPU quota or pids cap without cgroups; lower priority instead.
+    # RLIMIT_NPROC is per-user, so it would count every bot and is not used.
+    if limits['cpu_percent'] < 100:
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+# ==================== ACCOUNTING ====================
+
+def _read_proc_usage(pid):
+    """CPU time and RSS of a single process from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu_usec = (int(fields[11]) + int(fields[12])) * 1000000 // ticks
+
+    with open(f"/proc/{pid}/statm") as f:
+        rss_pages = int(f.read().split()[1])
+
+    return cpu_usec, rss_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def read_usage(bot_id, pid, configured_root=None):
+    """Return {'cpu_usec', 'memory_bytes', 'source'} for a bot, or None if it is gone"""
+    root = get_cgroup_root(configured_root)
+    if root:
+        cgroup_dir = root / f"bot_{bot_id}"
+        try:
+            cpu_usec = 0
+            for line in (cgroup_dir / 'cpu.stat').read_text().splitlines():
+                if line.startswith('usage_usec'):
+                    cpu_usec = int(line.split()[1])
+                    break
+            memory = int((cgroup_dir / 'memory.current').read_text())
+            return {'cpu_usec': cpu_usec, 'memory_bytes': memory, 'source': 'cgroup'}
+        except (OSError, ValueError):
+            pass
+
+    try:
+        cpu_usec, memory = _read_proc_usage(pid)
+        return {'cpu_usec': cpu_usec, 'memory_bytes': memory, 'source': 'proc'}
+    except (OSError, ValueError, IndexError):
+        return None
@@ -0,0 +1,223 @@
+"""
+ZEN X HOST BOT v4.0 - Analytics Rollups
+Per-day and per-month counters and daily system snapshots for admin analytics
+
+Triggers created by init_db add every signup, deployment and completed
+payment to its day and month bucket in analytics_rollups as it is
+written, and take it back out when the row is deleted or its status
+changes, so the analytics page reads a few dozen rows instead of grouping
+raw tables by DATE(). The worker records point-in-time gauges (users,
+active users, bots, running bots) into system_analytics every
+ROLLUP_INTERVAL seconds. Data written before the triggers existed is
+picked up by a backfill:
+
+    python rollups.py backfill
+"""
+
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+from main import Config, execute_db, get_db, db_lock
+
+logger = logging.getLogger(__name__)
+
+# metric -> (table, timestamp column, condition, value); {row} is new/old in triggers
+ROLLUP_SOURCES = {
+    'signups': ('users', 'join_date', None, '1'),
+    'deployments': ('deployments', 'created_at', None, '1'),
+    'payments': ('payment_logs', 'created_at', "{row}.status = 'completed'", '1'),
+    'revenue': ('payment_logs', 'created_at', "{row}.status = 'completed'", 'COALESCE({row}.amount, 0)'),
+}
+
+# table -> columns whose change can move a row between buckets
+ROLLUP_TABLES = {
+    'users': 'join_date',
+    'deployments': 'created_at',
+    'payment_logs': 'created_at, status, amount',
+}
+
+# Timestamps are stored as text ('2024-05-01 12:00:00' or ISO with a 'T');
+# the bucket is their leading characters
+PERIODS = {'day': 10, 'month': 7}
+
+
+# ==================== TRIGGERS ====================
+
+def bucket_upserts(table, row, sign):
+    """Statements adding (or with sign '-', removing) one row of table to its buckets"""
+    statements = []
+    for metric, (source, column, condition, value) in ROLLUP_SOURCES.items():
+        if source != table:
+            continue
+        where = f"{row}.{column} IS NOT NULL"
+        if condition:
+            where += f" AND {condition.format(row=row)}"
+        for period, length in PERIODS.items():
+            statements.append(f"""
+                INSERT INTO analytics_rollups (period, bucket, metric, value)
+                SELECT '{period}', substr({row}.{column}, 1, {length}), '{metric}', {sign}({value.format(row=row)})
+                WHERE {where}
+                ON CONFLICT(period, bucket, metric) DO UPDATE SET value = value + excluded.value;""")
+    return ''.join(statements)
+
+
+def rollup_trigger_sql():
+    """CREATE TRIGGER statements that keep analytics_rollups current"""
+    statements = []
+    for table, columns in ROLLUP_TABLES.items():
+        statements.append(f"""CREATE TRIGGER IF NOT EXISTS {table}_rollup_insert AFTER INSERT ON {table} BEGIN
+            {bucket_upserts(table, 'new', '')}
+            END""")
+        statements.append(f"""CREATE TRIGGER IF NOT EXISTS {table}_rollup_delete AFTER DELETE ON {table} BEGIN
+            {bucket_upserts(table, 'old', '-')}
+            END""")
+        statements.append(f"""CREATE TRIGGER IF NOT EXISTS {table}_rollup_update
+            AFTER UPDATE OF {columns} ON {table} BEGIN
+            {bucket_upserts(table, 'old', '-')}
+            {bucket_upserts(table, 'new', '')}
+            END""")
+    return statements
+
+
+# ==================== BACKFILL & SNAPSHOTS ====================
+
+def backfill_rollups(cursor=None):
+    """Rebuild every bucket, and system_analytics days never recorded, from the raw tables"""
+    if cursor is None:
+        with db_lock:
+            conn = get_db()
+            try:
+                # Holds off writers so no trigger update lands mid-rebuild
+                conn.execute("BEGIN IMMEDIATE")
+                backfill_rollups(conn.cursor())
+                conn.commit()
+            finally:
+                conn.close()
+        return
+
+    cursor.execute("DELETE FROM analytics_rollups")
+    for metric, (table, column, condition, value) in ROLLUP_SOURCES.items():
+        where = f"{column} IS NOT NULL"
+        if condition:
+            where += f" AND {condition.format(row=table)}"
+        for period, length in PERIODS.items():
+            cursor.execute(f"""
+                INSERT INTO analytics_rollups (period, bucket, metric, value)
+                SELECT '{period}', substr({column}, 1, {length}), '{metric}', SUM({value.format(row=table)})
+                FROM {table}
+                WHERE {where}
+                GROUP BY 2
+            """)
+
+    # Past days get running totals of signups and deployments; live gauges
+    # (active users, running bots) were never observed, so they stay empty
+    cursor.execute("""
+        INSERT OR IGNORE INTO system_analytics (date, total_users, total_bots, revenue, new_signups)
+        SELECT bucket,
+               SUM(signups) OVER (ORDER BY bucket),
+               SUM(deployments) OVER (ORDER BY bucket),
+               revenue, signups
+        FROM (
+            SELECT bucket,
+                   SUM(CASE WHEN metric = 'signups' THEN value ELSE 0 END) AS signups,
+                   SUM(CASE WHEN metric = 'deployments' THEN value ELSE 0 END) AS deployments,
+                   SUM(CASE WHEN metric = 'revenue' THEN value ELSE 0 END) AS revenue
+            FROM analytics_rollups
+            WHERE period = 'day'
+            GROUP BY bucket
+        )
+    """)
+
+
+def record_system_snapshot():
+    """Write today's system_analytics row from live gauges and today's buckets"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    gauges = execute_db("""
+        SELECT (SELECT COUNT(*) FROM users) AS total_users,
+               (SELECT COUNT(*) FROM users WHERE running_bots > 0) AS active_users,
+               (SELECT COUNT(*) FROM deployments) AS total_bots,
+               (SELECT COALESCE(SUM(running_bots), 0) FROM users) AS running_bots,
+               (SELECT COALESCE(SUM(CASE WHEN metric = 'revenue' THEN value END), 0)
+                FROM analytics_rollups WHERE period = 'day' AND bucket = ?) AS revenue,
+               (SELECT COALESCE(SUM(CASE WHEN metric = 'signups' THEN value END), 0)
+                FROM analytics_rollups WHERE period = 'day' AND bucket = ?) AS new_signups
+    """, (today, today), fetchone=True)
+    if not gauges:
+        return None
+
+    snapshot = dict(gauges)
+    execute_db("""
+        INSERT INTO system_analytics (date, total_users, active_users, total_bots, running_bots, revenue, new_signups)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(date) DO UPDATE SET
+            total_users = excluded.total_users, active_users = excluded.active_users,
+            total_bots = excluded.total_bots, running_bots = excluded.running_bots,
+            revenue = excluded.revenue, new_signups = excluded.new_signups
+    """, (today, snapshot['total_users'], snapshot['active_users'], snapshot['total_bots'],
+          snapshot['running_bots'], snapshot['revenue'], int(snapshot['new_signups'])), commit=True)
+    return snapshot
+
+
+def rollup_thread():
+    """Record system snapshots in the background"""
+    while True:
+        try:
+            record_system_snapshot()
+        except Exception as e:
+            logger.error(f"Rollup error: {e}")
+        time.sleep(Config.ROLLUP_INTERVAL)
+
+
+# ==================== QUERIES ====================
+
+def get_analytics(days=None, months=None):
+    """Daily signups and deployments, monthly revenue and system history for the analytics page"""
+    days = days or Config.ANALYTICS_DAYS
+    months = months or Config.ANALYTICS_MONTHS
+    since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+    daily = execute_db("""
+        SELECT bucket, metric, value FROM analytics_rollups
+        WHERE period = 'day' AND metric IN ('signups', 'deployments') AND bucket >= ? AND ROUND(value, 2) != 0
+        ORDER BY bucket
+    """, (since,), fetchall=True) or []
+
+    monthly_revenue = execute_db("""
+        SELECT bucket AS month, value AS revenue FROM (
+            SELECT bucket, value FROM analytics_rollups
+            WHERE period = 'month' AND metric = 'revenue' AND ROUND(value, 2) != 0
+            ORDER BY bucket DESC
+            LIMIT ?
+        ) ORDER BY month
+    """, (months,), fetchall=True) or []
+
+    system = execute_db("SELECT * FROM system_analytics WHERE date >= ? ORDER BY date",
+                        (since,), fetchall=True) or []
+
+    return {
+        'signups': [{'date': r['bucket'], 'count': int(r['value'])} for r in daily if r['metric'] == 'signups'],
+        'deployments': [{'date': r['bucket'], 'count': int(r['value'])} for r in daily if r['metric'] == 'deployments'],
+        'monthly_revenue': [dict(r) for r in monthly_revenue],
+        'system': [dict(r) for r in system]
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Analytics rollups")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('backfill', help='rebuild all buckets from the raw tables')
+    sub.add_parser('snapshot', help="record today's system_analytics row now")
+    args = parser.parse_args()
+
+    from main import init_db
+    init_db()
+
+    if args.command == 'backfill':
+        start = time.perf_counter()
+        backfill_rollups()
+        buckets = execute_db("SELECT COUNT(*) FROM analytics_rollups", fetchone=True)[0]
+        print(f"Rebuilt {buckets} buckets in {time.perf_counter() - start:.2f}s")
+    else:
+        print(record_system_snapshot())
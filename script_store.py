@@ -0,0 +1,284 @@
+"""
+ZEN X HOST BOT v4.0 - Script Store
+Deduplicated, versioned backups of bot scripts and projects
+
+Every file is stored once under its SHA-256, zlib-compressed, in
+SCRIPT_BACKUPS/objects. A backup version is a manifest: the list of
+(path, hash) pairs that made up the bot at that moment, so backing up an
+unchanged bot adds nothing. With SCRIPT_STORE_DELTAS on, a text file that
+changed a little is stored as a line delta against the same file's
+previous version, up to SCRIPT_STORE_MAX_CHAIN deltas deep. Download files
+(the script with a header, or a ZIP of the project) are built on demand.
+"""
+
+import io
+import os
+import json
+import zlib
+import difflib
+import hashlib
+import logging
+import zipfile
+import tempfile
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from main import Config, execute_db, get_db, db_lock, log_event
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== OBJECTS ====================
+
+def object_path(sha256):
+    return Path(Config.SCRIPT_BACKUPS) / 'objects' / sha256[:2] / sha256[2:]
+
+
+def make_delta(base, data):
+    """Line delta turning base into data: [[0, i1, i2] copy base lines, [1, text] insert], or None"""
+    try:
+        base_lines = base.decode('utf-8').splitlines(keepends=True)
+        new_lines = data.decode('utf-8').splitlines(keepends=True)
+    except UnicodeDecodeError:
+        return None
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([0, i1, i2])
+        elif j2 > j1:
+            ops.append([1, ''.join(new_lines[j1:j2])])
+    return json.dumps(ops, separators=(',', ':')).encode()
+
+
+def apply_delta(base, delta):
+    base_lines = base.decode('utf-8').splitlines(keepends=True)
+    out = []
+    for op in json.loads(delta):
+        if op[0] == 0:
+            out.extend(base_lines[op[1]:op[2]])
+        else:
+            out.append(op[1])
+    return ''.join(out).encode('utf-8')
+
+
+def store_blob(data, base_sha256=None):
+    """Store content once; returns its SHA-256"""
+    sha256 = hashlib.sha256(data).hexdigest()
+    if execute_db("SELECT 1 FROM script_objects WHERE sha256=?", (sha256,), fetchone=True):
+        return sha256
+
+    payload, kind, depth = zlib.compress(data, 9), 'full', 0
+    base_sha256 = base_sha256 if Config.SCRIPT_STORE_DELTAS and base_sha256 != sha256 else None
+
+    if base_sha256:
+        base = execute_db("SELECT depth FROM script_objects WHERE sha256=?", (base_sha256,), fetchone=True)
+        if base and base['depth'] < Config.SCRIPT_STORE_MAX_CHAIN:
+            delta = make_delta(read_blob(base_sha256), data)
+            if delta is not None:
+                compressed = zlib.compress(delta, 9)
+                # Only worth it if clearly smaller than the file on its own
+                if len(compressed) < len(payload) // 2:
+                    payload, kind, depth = compressed, 'delta', base['depth'] + 1
+
+    # Each writer stages its own temp file; only the one whose row goes in moves it into
+    # place, so the object file always matches its row's kind (full or delta)
+    path = object_path(sha256)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, partial = tempfile.mkstemp(prefix=path.name, suffix='.partial', dir=path.parent)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(payload)
+
+    conn = get_db()
+    try:
+        # Holds off other writers (in any process) from the check until the file is in place
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM script_objects WHERE sha256=?", (sha256,)).fetchone():
+            conn.rollback()
+            return sha256
+        conn.execute("""
+            INSERT INTO script_objects (sha256, size, stored_size, kind, base_sha256, depth, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (sha256, len(data), len(payload), kind, base_sha256 if kind == 'delta' else None, depth,
+              datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        os.replace(partial, path)
+        conn.commit()
+    finally:
+        conn.close()
+        if os.path.exists(partial):
+            os.unlink(partial)
+    return sha256
+
+
+def read_blob(sha256):
+    """Content of a stored object, resolving delta chains"""
+    row = execute_db("SELECT kind, base_sha256 FROM script_objects WHERE sha256=?", (sha256,), fetchone=True)
+    if not row:
+        raise KeyError(f"Unknown script object {sha256}")
+
+    data = zlib.decompress(object_path(sha256).read_bytes())
+    if row['kind'] == 'delta':
+        data = apply_delta(read_blob(row['base_sha256']), data)
+
+    if hashlib.sha256(data).hexdigest() != sha256:
+        raise ValueError(f"Script object {sha256} is corrupted")
+    return data
+
+
+# ==================== VERSIONS ====================
+
+def bot_files(filename):
+    """(relative path, absolute path) of every file that makes up a bot"""
+    file_path = Path(Config.PROJECT_DIR) / filename
+    project_root = Path(Config.PROJECT_DIR).resolve()
+
+    if file_path.resolve().parent == project_root:
+        return [(file_path.name, file_path)]
+
+    # ZIP project: the whole directory the entrypoint lives in
+    project_dir = file_path.resolve().parent
+    return sorted(
+        (p.relative_to(project_dir).as_posix(), p)
+        for p in project_dir.rglob('*')
+        if p.is_file() and '__pycache__' not in p.parts
+    )
+
+
+def snapshot_bot(bot_id):
+    """Back up a bot's current files; returns (version row, created) or (None, error)"""
+    bot_info = execute_db("SELECT * FROM deployments WHERE id=?", (bot_id,), fetchone=True)
+    if not bot_info:
+        return None, "Bot not found"
+
+    file_path = Path(Config.PROJECT_DIR) / bot_info['filename']
+    if not file_path.is_file():
+        return None, "Bot file not found"
+
+    latest = execute_db("SELECT * FROM script_backups WHERE bot_id=? ORDER BY id DESC LIMIT 1",
+                        (bot_id,), fetchone=True)
+    previous = {path: sha for path, sha in json.loads(latest['manifest'])} if latest else {}
+
+    # Deltas are taken against the same path in the previous version
+    manifest = [[path, store_blob(abs_path.read_bytes(), previous.get(path))]
+                for path, abs_path in bot_files(bot_info['filename'])]
+
+    if latest and json.loads(latest['manifest']) == manifest and latest['entrypoint'] == file_path.name:
+        return dict(latest), False
+
+    with db_lock:
+        conn = get_db()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM script_backups WHERE bot_id=?", (bot_id,))
+            version = c.fetchone()[0]
+            c.execute("""
+                INSERT INTO script_backups (bot_id, version, entrypoint, manifest, size, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (bot_id, version, file_path.name, json.dumps(manifest),
+                  sum(p.stat().st_size for _, p in bot_files(bot_info['filename'])),
+                  datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            backup_id = c.lastrowid
+            conn.commit()
+        finally:
+            conn.close()
+
+    log_event("SCRIPT_BACKUP", f"Backup v{version} stored for bot {bot_id}", bot_info['user_id'])
+    return dict(execute_db("SELECT * FROM script_backups WHERE id=?", (backup_id,), fetchone=True)), True
+
+
+def list_script_backups(bot_id):
+    """Backup versions of a bot, newest first"""
+    return execute_db("SELECT * FROM script_backups WHERE bot_id=? ORDER BY version DESC",
+                      (bot_id,), fetchall=True) or []
+
+
+def build_download(backup_id):
+    """Assemble a backup version as (download name, bytes)"""
+    backup = execute_db("""
+        SELECT b.*, d.bot_name, d.user_id, d.auto_restart
+        FROM script_backups b LEFT JOIN deployments d ON b.bot_id = d.id
+        WHERE b.id=?
+    """, (backup_id,), fetchone=True)
+    if not backup:
+        raise KeyError(f"Unknown script backup {backup_id}")
+
+    manifest = json.loads(backup['manifest'])
+    stem = f"bot_{backup['bot_id']}_v{backup['version']}"
+
+    if len(manifest) == 1 and manifest[0][0].endswith('.py'):
+        header = f'''"""
+ZEN X HOST BOT - Script Backup
+Bot ID: {backup['bot_id']}
+Bot Name: {backup['bot_name']}
+Version: {backup['version']}
+Backup Time: {backup['created_at']}
+Original File: {backup['entrypoint']}
+Owner: {backup['user_id']}
+Auto-Recovery: {'Enabled' if backup['auto_restart'] == 1 else 'Disabled'}
+"""
+
+'''
+        return f"{stem}.py", header.encode() + read_blob(manifest[0][1])
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for path, sha256 in manifest:
+            zf.writestr(path, read_blob(sha256))
+    return f"{stem}.zip", buffer.getvalue()
+
+
+# ==================== MAINTENANCE ====================
+
+def prune_script_store(max_age_days=None, keep=None):
+    """Drop old versions (always keeping each bot's newest few) and objects nothing uses"""
+    max_age_days = max_age_days if max_age_days is not None else Config.SCRIPT_BACKUP_MAX_AGE
+    keep = keep if keep is not None else Config.SCRIPT_BACKUP_KEEP
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    execute_db("""
+        DELETE FROM script_backups
+        WHERE created_at < ?
+          AND id NOT IN (
+              SELECT id FROM (
+                  SELECT id, ROW_NUMBER() OVER (PARTITION BY bot_id ORDER BY version DESC) AS rank
+                  FROM script_backups
+              ) WHERE rank <= ?
+          )
+    """, (cutoff, keep), commit=True)
+
+    # Everything still referenced, plus the bases its deltas are built on
+    live = set()
+    for row in execute_db("SELECT manifest FROM script_backups", fetchall=True) or []:
+        live.update(sha for _, sha in json.loads(row['manifest']))
+    bases = {row['sha256']: row['base_sha256'] for row in
+             execute_db("SELECT sha256, base_sha256 FROM script_objects", fetchall=True) or []}
+    for sha in list(live):
+        while bases.get(sha) and bases[sha] not in live:
+            sha = bases[sha]
+            live.add(sha)
+
+    removed = 0
+    for sha in set(bases) - live:
+        object_path(sha).unlink(missing_ok=True)
+        execute_db("DELETE FROM script_objects WHERE sha256=?", (sha,), commit=True)
+        removed += 1
+    return removed
+
+
+def get_store_stats():
+    """Logical vs stored bytes, for admin views"""
+    objects = execute_db("""
+        SELECT COUNT(*) AS objects, COALESCE(SUM(stored_size), 0) AS stored,
+               COUNT(CASE WHEN kind='delta' THEN 1 END) AS deltas
+        FROM script_objects
+    """, fetchone=True)
+    versions = execute_db("SELECT COUNT(*) AS versions, COALESCE(SUM(size), 0) AS logical FROM script_backups",
+                          fetchone=True)
+    return {
+        'versions': versions['versions'],
+        'objects': objects['objects'],
+        'deltas': objects['deltas'],
+        'logical_bytes': versions['logical'],
+        'stored_bytes': objects['stored']
+    }
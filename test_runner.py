@@ -0,0 +1,295 @@
+"""
+ZEN X HOST BOT v4.0 - Test Runner
+Sandboxed test runs in a bounded worker pool, cached by script hash
+
+Each run copies the bot into a scratch directory on tmpfs and runs it with
+CPU/memory/file-size rlimits, a wall-clock timeout and, when the kernel
+allows unprivileged namespaces, no network at all. Output is streamed to an
+optional callback and every run is stored in the test_runs table; a script
+that hasn't changed since a finished run is answered from that run.
+"""
+
+import os
+import sys
+import time
+import shutil
+import signal
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from main import Config, execute_db, get_db, db_lock
+
+logger = logging.getLogger(__name__)
+
+test_executor = ThreadPoolExecutor(max_workers=Config.TEST_WORKERS)
+_netns = {'probed': False, 'inline': False, 'command': []}
+
+
+# ==================== SANDBOX ====================
+
+def get_scratch_root():
+    """tmpfs when available, so test files never touch the disk"""
+    if Config.TEST_SCRATCH_DIR:
+        return Config.TEST_SCRATCH_DIR
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def _probe(command):
+    try:
+        return subprocess.run(command, capture_output=True, timeout=5).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def probe_netns():
+    """Find out once how (and whether) this host can drop a test's network access"""
+    if not _netns['probed']:
+        # os.unshare (Python 3.12+) in the child, else the unshare(1) command
+        if hasattr(os, 'unshare') and _probe(
+                [sys.executable, '-c', 'import os; os.unshare(os.CLONE_NEWUSER | os.CLONE_NEWNET)']):
+            _netns['inline'] = True
+        elif shutil.which('unshare') and _probe(['unshare', '-rn', 'true']):
+            _netns['command'] = ['unshare', '-rn']
+        _netns['probed'] = True
+    return _netns
+
+
+def get_netns_prefix():
+    """Command prefix that runs a program without network access, or [] if not needed or unsupported"""
+    return probe_netns()['command']
+
+
+def _limit_child(timeout, netns=False):
+    """preexec_fn for test processes: new session, rlimits and (with netns) a private network namespace"""
+    import resource
+
+    os.setsid()
+    memory = Config.TEST_MEMORY_MB * 1024 * 1024
+    for limit, value in ((resource.RLIMIT_CPU, min(Config.TEST_CPU_SECONDS, int(timeout) + 1)),
+                         (resource.RLIMIT_AS, memory),
+                         (resource.RLIMIT_FSIZE, Config.TEST_FILE_SIZE_MB * 1024 * 1024),
+                         (resource.RLIMIT_CORE, 0)):
+        try:
+            resource.setrlimit(limit, (value, value))
+        except (ValueError, OSError):
+            pass
+
+    if netns:
+        # Raising fails the run: a test reported as offline must never get the network
+        os.unshare(os.CLONE_NEWUSER | os.CLONE_NEWNET)
+
+
+def network_isolated():
+    netns = probe_netns()
+    return netns['inline'] or bool(netns['command'])
+
+
+def script_hash(file_path, python):
+    """Hash of everything a test run depends on: the project files and the interpreter"""
+    file_path = Path(file_path).resolve()
+    project_root = Path(Config.PROJECT_DIR).resolve()
+
+    digest = hashlib.sha256(f"{python}\n{file_path.name}\n".encode())
+    if file_path.parent != project_root:
+        # ZIP project: every file in the project directory can change behaviour
+        for path in sorted(p for p in file_path.parent.rglob('*') if p.is_file()):
+            digest.update(str(path.relative_to(file_path.parent)).encode() + b'\0')
+            digest.update(path.read_bytes())
+    else:
+        digest.update(file_path.read_bytes())
+    return digest.hexdigest()
+
+
+# ==================== RUNS ====================
+
+def _execute(run_id, file_path, timeout, on_output):
+    """Run one test in a fresh scratch directory and store the result"""
+    from deps import resolve_python
+
+    file_path = Path(file_path).resolve()
+    project_root = Path(Config.PROJECT_DIR).resolve()
+    scratch = Path(tempfile.mkdtemp(prefix=f"zenx_test_{run_id}_", dir=get_scratch_root()))
+
+    status, returncode, output = 'error', None, ''
+    started = time.time()
+
+    try:
+        # Waits here, in the pool, if the bot's dependencies are still installing
+        ok, python = resolve_python(file_path)
+        if not ok:
+            raise RuntimeError(python)
+        started = time.time()
+
+        if file_path.parent != project_root:
+            shutil.copytree(file_path.parent, scratch / 'project')
+            workdir = scratch / 'project'
+        else:
+            workdir = scratch / 'project'
+            workdir.mkdir()
+            shutil.copy2(file_path, workdir / file_path.name)
+
+        env = {
+            'PATH': os.environ.get('PATH', '/usr/bin:/bin'),
+            'HOME': str(scratch),
+            'TMPDIR': str(scratch),
+            'PYTHONUNBUFFERED': '1',
+            'TEST_MODE': 'true'
+        }
+
+        execute_db("UPDATE test_runs SET status='running', sandbox=? WHERE id=?",
+                   ('netns' if network_isolated() else 'rlimits', run_id), commit=True)
+        inline_netns = probe_netns()['inline']
+
+        proc = subprocess.Popen(
+            get_netns_prefix() + [python, str(workdir / file_path.name)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            cwd=str(workdir),
+            env=env,
+            preexec_fn=lambda: _limit_child(timeout, inline_netns)
+        )
+
+        timed_out = threading.Event()
+
+        def kill_on_timeout():
+            timed_out.set()
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        timer = threading.Timer(timeout, kill_on_timeout)
+        timer.start()
+
+        chunks, size, last_push = [], 0, 0
+        try:
+            for line in iter(proc.stdout.readline, b''):
+                if size < Config.TEST_OUTPUT_LIMIT:
+                    chunks.append(line)
+                    size += len(line)
+                if time.time() - last_push >= 1:
+                    # Output so far, at most once a second, for pollers and the callback
+                    last_push = time.time()
+                    partial = b''.join(chunks).decode(errors='replace')
+                    execute_db("UPDATE test_runs SET output=? WHERE id=?", (partial, run_id), commit=True)
+                    if on_output:
+                        try:
+                            on_output(partial)
+                        except Exception:
+                            pass
+            returncode = proc.wait()
+        finally:
+            timer.cancel()
+            proc.stdout.close()
+
+        output = b''.join(chunks).decode(errors='replace')
+        if size >= Config.TEST_OUTPUT_LIMIT:
+            output += "\n... (output truncated)"
+
+        if timed_out.is_set():
+            status = 'timeout'
+        else:
+            status = 'passed' if returncode == 0 else 'failed'
+
+    except Exception as e:
+        logger.error(f"Test run {run_id} error: {e}")
+        output = f"{output}\n{e}" if output else str(e)
+
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    elapsed = time.time() - started
+    execute_db("""
+        UPDATE test_runs SET status=?, returncode=?, elapsed=?, output=?, finished_at=? WHERE id=?
+    """, (status, returncode, round(elapsed, 2), output, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+          run_id), commit=True)
+
+    if on_output:
+        try:
+            on_output(output)
+        except Exception:
+            pass
+
+    return get_test_run(run_id)
+
+
+def submit_test(bot_id, timeout=None, on_output=None, use_cache=True):
+    """Queue a test run; returns (run, future) where future is None for cached results"""
+    from deps import planned_python
+
+    bot_info = execute_db("SELECT * FROM deployments WHERE id=?", (bot_id,), fetchone=True)
+    if not bot_info:
+        return None, "Bot not found"
+
+    file_path = Path(Config.PROJECT_DIR) / bot_info['filename']
+    if not file_path.is_file():
+        return None, "Bot file not found"
+
+    try:
+        python = planned_python(file_path)
+    except Exception as e:
+        return None, f"Could not read requirements: {e}"
+
+    timeout = timeout or Config.TEST_TIMEOUT
+    digest = script_hash(file_path, python)
+
+    if use_cache:
+        cached = execute_db("""
+            SELECT * FROM test_runs
+            WHERE script_hash=? AND status IN ('passed', 'failed', 'timeout')
+            ORDER BY id DESC LIMIT 1
+        """, (digest,), fetchone=True)
+        if cached:
+            return dict(cached, cached=True), None
+
+    with db_lock:
+        conn = get_db()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO test_runs (bot_id, script_hash, status, created_at) VALUES (?, ?, 'queued', ?)",
+                (bot_id, digest, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            run_id = cursor.lastrowid
+            conn.commit()
+        finally:
+            conn.close()
+
+    future = test_executor.submit(_execute, run_id, file_path, timeout, on_output)
+    return get_test_run(run_id), future
+
+
+def get_test_run(run_id):
+    row = execute_db("SELECT * FROM test_runs WHERE id=?", (run_id,), fetchone=True)
+    return dict(row, cached=False) if row else None
+
+
+def format_test_result(run, limit=2000):
+    """Human-readable summary of a finished run"""
+    output = run['output'] or ''
+    if len(output) > limit:
+        output = output[:limit] + "..."
+
+    cached = " (cached result)" if run.get('cached') else ""
+    if run['status'] == 'timeout':
+        return f"❌ Test timed out after {run['elapsed']:.0f} seconds{cached}\n\n📝 Output:\n{output}"
+    if run['status'] == 'error':
+        return f"❌ Test error: {output}"
+
+    icon, word = ("✅", "completed") if run['status'] == 'passed' else ("❌", "failed")
+    network = "🔒 No network" if run['sandbox'] == 'netns' else "⚠️ Network not isolated"
+    return f"""
+{icon} Test {word} in {run['elapsed']:.2f}s{cached}
+📊 Return code: {run['returncode']}
+{network}
+
+📝 Output (first {limit} chars):
+{output}
+"""
@@ -0,0 +1,90 @@
+"""
+ZEN X HOST BOT v4.0 - ZIP Ingestion Tests
+Crafted archives that inspect_zip must refuse before anything is written
+
+Usage: python -m pytest tests  (or python -m unittest discover tests)
+"""
+
+import io
+import os
+import sys
+import stat
+import zipfile
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# main creates its data directories in the working directory on import
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix='zenx_tests_'))
+try:
+    from zip_ingest import inspect_zip, ZipLimitError  # noqa: E402
+finally:
+    os.chdir(_cwd)
+
+
+def build_zip(*entries, compression=zipfile.ZIP_DEFLATED):
+    """In-memory archive of (name or ZipInfo, data) entries"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+def open_zip(data):
+    return zipfile.ZipFile(io.BytesIO(data), 'r')
+
+
+class InspectZipTest(unittest.TestCase):
+
+    def assertRejected(self, data, message):
+        with open_zip(data) as zf:
+            with self.assertRaisesRegex(ZipLimitError, message):
+                inspect_zip(zf)
+
+    def test_accepts_plain_project(self):
+        data = build_zip(('bot.py', "print('hi')\n"), ('lib/util.py', "X = 1\n"))
+        with open_zip(data) as zf:
+            members, total = inspect_zip(zf)
+        self.assertEqual([path.as_posix() for _, path in members], ['bot.py', 'lib/util.py'])
+        self.assertEqual(total, len("print('hi')\n") + len("X = 1\n"))
+
+    def test_rejects_parent_traversal(self):
+        self.assertRejected(build_zip(('bot.py', ''), ('../evil.py', 'x')), 'Path traversal')
+        self.assertRejected(build_zip(('lib/../../evil.py', 'x')), 'Path traversal')
+        self.assertRejected(build_zip(('lib\\..\\..\\evil.py', 'x')), 'Path traversal')
+
+    def test_rejects_absolute_path(self):
+        self.assertRejected(build_zip(('/etc/cron.d/evil', 'x')), 'Absolute path')
+        self.assertRejected(build_zip(('C:/Windows/evil.py', 'x')), 'Drive path')
+
+    def test_rejects_symlink(self):
+        link = zipfile.ZipInfo('config.py')
+        link.external_attr = (stat.S_IFLNK | 0o777) << 16
+        self.assertRejected(build_zip(('bot.py', ''), (link, '/etc/passwd')), 'Symlink')
+
+    def test_rejects_zip_bomb(self):
+        # 8MB of zeros deflates to a few KB, far past ZIP_MAX_RATIO
+        self.assertRejected(build_zip(('bot.py', ''), ('data.bin', b'\0' * (8 * 1024 * 1024))),
+                            'compression ratio')
+
+    def test_rejects_oversized_archive(self):
+        # Each entry is fine on its own but together they exceed ZIP_MAX_TOTAL_SIZE
+        chunk = os.urandom(16 * 1024 * 1024)
+        data = build_zip(*((f'part{i}.bin', chunk) for i in range(4)), compression=zipfile.ZIP_STORED)
+        self.assertRejected(data, 'exceeds')
+
+    def test_rejects_encrypted_entry(self):
+        data = bytearray(build_zip(('bot.py', "print('hi')\n")))
+        # Set the "encrypted" general purpose flag in the local and central headers
+        for signature, offset in ((b'PK\x03\x04', 6), (b'PK\x01\x02', 8)):
+            data[data.index(signature) + offset] |= 0x1
+        self.assertRejected(bytes(data), 'Encrypted')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,11 +9,8 @@ from pathlib import Path
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Import Flask app
-from app import create_app
-
-# Create application
-app = create_app()
+# Import Flask app (SocketIO hooks into app.wsgi_app, so serving app serves both)
+from app import app
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
@@ -0,0 +1,231 @@
+"""
+ZEN X HOST BOT v4.0 - ZIP Project Ingestion
+Streaming ZIP extraction with size/ratio caps, path checks and entrypoint detection
+"""
+
+import os
+import stat
+import time
+import shutil
+import zipfile
+import logging
+import threading
+from pathlib import Path, PurePosixPath
+from concurrent.futures import ThreadPoolExecutor
+
+from main import Config
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+RATIO_CHECK_MIN_SIZE = 1024 * 1024
+ENTRYPOINT_NAMES = ['main.py', 'bot.py', 'app.py', 'run.py', 'start.py', '__main__.py']
+
+
+class ZipLimitError(Exception):
+    """Archive violates an ingestion limit or contains an unsafe entry"""
+
+
+class _Budget:
+    """Thread-safe counter of bytes actually written across all workers"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def take(self, amount):
+        with self.lock:
+            self.used += amount
+            if self.used > self.limit:
+                raise ZipLimitError(f"Archive exceeds {self.limit // (1024 * 1024)}MB uncompressed")
+            return self.used
+
+
+def _safe_member_path(name):
+    """Validate an archive member name and return it as a relative path"""
+    normalized = name.replace('\\', '/')
+    path = PurePosixPath(normalized)
+
+    if path.is_absolute() or normalized.startswith('/'):
+        raise ZipLimitError(f"Absolute path in archive: {name}")
+    if any(part == '..' for part in path.parts):
+        raise ZipLimitError(f"Path traversal in archive: {name}")
+    if path.parts and ':' in path.parts[0]:
+        raise ZipLimitError(f"Drive path in archive: {name}")
+
+    return path
+
+
+def inspect_zip(zf):
+    """Check every entry against the limits before anything is written"""
+    infos = zf.infolist()
+    if len(infos) > Config.ZIP_MAX_ENTRIES:
+        raise ZipLimitError(f"Too many entries ({len(infos)} > {Config.ZIP_MAX_ENTRIES})")
+
+    members = []
+    total_size = 0
+
+    for info in infos:
+        rel_path = _safe_member_path(info.filename)
+        if info.is_dir():
+            continue
+
+        mode = (info.external_attr >> 16) & 0o170000
+        if mode == stat.S_IFLNK:
+            raise ZipLimitError(f"Symlink in archive: {info.filename}")
+        if info.flag_bits & 0x1:
+            raise ZipLimitError(f"Encrypted entry: {info.filename}")
+        if info.file_size > Config.ZIP_MAX_FILE_SIZE:
+            raise ZipLimitError(f"Entry too large: {info.filename}")
+        # Small files may legitimately compress very well; only large ones are bomb candidates
+        if (info.file_size > RATIO_CHECK_MIN_SIZE and info.compress_size
+                and info.file_size / info.compress_size > Config.ZIP_MAX_RATIO):
+            raise ZipLimitError(f"Suspicious compression ratio: {info.filename}")
+
+        total_size += info.file_size
+        members.append((info, rel_path))
+
+    if total_size > Config.ZIP_MAX_TOTAL_SIZE:
+        raise ZipLimitError(f"Archive exceeds {Config.ZIP_MAX_TOTAL_SIZE // (1024 * 1024)}MB uncompressed")
+
+    return members, total_size
+
+
+def _extract_member(zip_path, info, target, budget):
+    """Stream one entry to disk, trusting only the bytes actually inflated"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+
+    # Each worker gets its own handle so inflation runs without a shared file lock
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        with zf.open(info, 'r') as src, open(target, 'wb') as dst:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > info.file_size:
+                    raise ZipLimitError(f"Entry larger than declared: {info.filename}")
+                budget.take(len(chunk))
+                dst.write(chunk)
+
+    return written
+
+
+def safe_extract(zip_path, extract_dir, progress=None):
+    """Extract a ZIP file with limits; returns (files, bytes) or raises ZipLimitError"""
+    extract_dir = Path(extract_dir)
+    extract_dir.mkdir(parents=True, exist_ok=True)
+    root = extract_dir.resolve()
+
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        members, total_size = inspect_zip(zf)
+
+    targets = []
+    for info, rel_path in members:
+        target = (extract_dir / Path(*rel_path.parts)).resolve()
+        if root not in target.parents:
+            raise ZipLimitError(f"Entry escapes project directory: {info.filename}")
+        targets.append((info, target))
+
+    budget = _Budget(Config.ZIP_MAX_TOTAL_SIZE)
+    done = 0
+    last_report = 0
+
+    def report(final=False):
+        nonlocal last_report
+        if not progress or not total_size:
+            return
+        if final or time.time() - last_report >= 1:
+            last_report = time.time()
+            try:
+                progress(100 if final else int(done * 100 / total_size))
+            except Exception as e:
+                logger.error(f"ZIP progress callback error: {e}")
+
+    if total_size >= Config.ZIP_PARALLEL_THRESHOLD and len(targets) > 1:
+        # zlib releases the GIL, so large archives inflate across threads
+        with ThreadPoolExecutor(max_workers=Config.ZIP_WORKERS) as pool:
+            futures = [pool.submit(_extract_member, zip_path, info, target, budget)
+                       for info, target in targets]
+            for future in futures:
+                done += future.result()
+                report()
+    else:
+        for info, target in targets:
+            done += _extract_member(zip_path, info, target, budget)
+            report()
+
+    report(final=True)
+
+    return len(targets), done
+
+
+def detect_entrypoint(project_dir):
+    """Find the script to run inside an extracted project"""
+    project_dir = Path(project_dir)
+
+    # Unwrap archives that contain a single top-level folder
+    children = [p for p in project_dir.iterdir() if p.name != '__MACOSX']
+    base = children[0] if len(children) == 1 and children[0].is_dir() else project_dir
+
+    for name in ENTRYPOINT_NAMES:
+        if (base / name).is_file():
+            return (base / name).relative_to(project_dir)
+
+    scripts = sorted(base.glob('*.py'))
+    if len(scripts) == 1:
+        return scripts[0].relative_to(project_dir)
+
+    for script in scripts:
+        try:
+            source = script.read_text(errors='ignore')
+        except OSError:
+            continue
+        if "__name__" in source and "__main__" in source:
+            return script.relative_to(project_dir)
+
+    return None
+
+
+def ingest_zip_project(zip_path, project_name, progress=None):
+    """Extract an uploaded ZIP into the project directory and locate its entrypoint"""
+    project_root = Path(Config.PROJECT_DIR)
+
+    # Pick a free directory name, like single-file uploads do
+    dir_name = project_name
+    counter = 1
+    while (project_root / dir_name).exists():
+        dir_name = f"{project_name}_{counter}"
+        counter += 1
+
+    staging_dir = project_root / f".staging_{dir_name}_{int(time.time())}"
+
+    try:
+        files, size = safe_extract(zip_path, staging_dir, progress)
+
+        entrypoint = detect_entrypoint(staging_dir)
+        if not entrypoint:
+            raise ZipLimitError("No entrypoint found (expected main.py, bot.py or app.py)")
+
+        final_dir = project_root / dir_name
+        os.replace(staging_dir, final_dir)
+
+        logger.info(f"ZIP project ingested: {dir_name} ({files} files, {size} bytes)")
+
+        return True, {
+            'project_dir': dir_name,
+            'entrypoint': entrypoint.as_posix(),
+            'filename': f"{dir_name}/{entrypoint.as_posix()}",
+            'files': files,
+            'size': size
+        }
+
+    except (ZipLimitError, zipfile.BadZipFile) as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return False, str(e)
+    except Exception as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        logger.error(f"ZIP ingestion error: {e}")
+        return False, f"Extraction failed: {str(e)}"
@@ -0,0 +1,258 @@
+"""
+ZEN X HOST BOT v4.0 - Warm Interpreter Launcher
+Fork-server that keeps common bot libraries imported and forks bots on request
+"""
+
+import os
+import sys
+import json
+import runpy
+import signal
+import socket
+import hashlib
+import logging
+import tempfile
+import threading
+import traceback
+import importlib
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREIMPORTS = [
+    'telebot', 'requests', 'json', 'sqlite3', 'ssl', 'http.client',
+    'urllib.request', 'logging', 'threading', 'datetime', 'asyncio'
+]
+
+# Running zygotes keyed by interpreter path
+zygotes = {}
+zygote_lock = threading.Lock()
+
+
+# ==================== SERVER SIDE ====================
+
+def _read_line(conn, limit=1024 * 1024):
+    """Read one JSON line from a socket"""
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > limit:
+            raise ValueError("Request too large")
+    return data.decode()
+
+
+def _preimport(modules):
+    """Import shared libraries once so every forked bot inherits them"""
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+
+def _run_child(request, server, conn):
+    """Body of a forked bot process; never returns"""
+    code = 1
+    try:
+        server.close()
+        conn.close()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        os.setsid()
+
+        if request.get('limits'):
+            import resource_control
+            resource_control.apply_in_child(request.get('cgroup'), request['limits'])
+            # Don't let our module shadow a bot's own `resource_control` import
+            sys.modules.pop('resource_control', None)
+
+        os.chdir(request['cwd'])
+        log_fd = os.open(request['log'], os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        null_fd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null_fd, 0)
+        os.dup2(log_fd, 1)
+        os.dup2(log_fd, 2)
+        os.close(null_fd)
+        os.close(log_fd)
+
+        if request.get('env') is not None:
+            os.environ.clear()
+            os.environ.update(request['env'])
+
+        script = request['script']
+        sys.argv = [script] + list(request.get('args') or [])
+        sys.path[0] = os.path.dirname(script)
+
+        runpy.run_path(script, run_name='__main__')
+        code = 0
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def serve(sock_path, modules):
+    """Run the fork-server loop until the parent process goes away"""
+    loaded = _preimport(modules)
+
+    # Forked bots are reaped automatically; liveness is checked by PID
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    if os.path.exists(sock_path):
+        os.unlink(sock_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(sock_path)
+    os.chmod(sock_path, 0o600)
+    server.listen(64)
+    server.settimeout(5)
+
+    parent = os.getppid()
+    print(json.dumps({'ready': True, 'preloaded': loaded}), flush=True)
+
+    try:
+        while os.getppid() == parent:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+
+            with conn:
+                try:
+                    request = json.loads(_read_line(conn))
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    pid = os.fork()
+                    if pid == 0:
+                        _run_child(request, server, conn)
+                    reply = {'pid': pid}
+                except Exception as e:
+                    reply = {'error': str(e)}
+                conn.sendall((json.dumps(reply) + '\n').encode())
+    finally:
+        server.close()
+        if os.path.exists(sock_path):
+            os.unlink(sock_path)
+
+
+# ==================== CLIENT SIDE ====================
+
+def _socket_path(python):
+    """Per-interpreter socket path, short enough for AF_UNIX"""
+    digest = hashlib.sha1(python.encode()).hexdigest()[:10]
+    return os.path.join(tempfile.gettempdir(), f"zenx_zygote_{os.getpid()}_{digest}.sock")
+
+
+def start_zygote(python, modules=None, timeout=30):
+    """Start a warm interpreter for `python` and wait until it is accepting"""
+    sock_path = _socket_path(python)
+    modules = modules or DEFAULT_PREIMPORTS
+
+    proc = subprocess.Popen(
+        [python, os.path.abspath(__file__), sock_path, ','.join(modules)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        stdin=subprocess.DEVNULL,
+        text=True
+    )
+
+    # The ready line is printed after imports finish and the socket is bound
+    result = {}
+
+    def wait_ready():
+        line = proc.stdout.readline()
+        if line:
+            result.update(json.loads(line))
+
+    waiter = threading.Thread(target=wait_ready, daemon=True)
+    waiter.start()
+    waiter.join(timeout)
+
+    if not result.get('ready'):
+        proc.kill()
+        logger.error(f"Zygote for {python} failed to start")
+        return None
+
+    logger.info(f"Zygote ready for {python} (preloaded: {', '.join(result['preloaded'])})")
+    return {'proc': proc, 'socket': sock_path, 'preloaded': result['preloaded']}
+
+
+def get_zygote(python, max_zygotes=8):
+    """Return a running zygote for an interpreter, starting one if there is room"""
+    with zygote_lock:
+        zygote = zygotes.get(python)
+        if zygote and zygote['proc'].poll() is None:
+            return zygote
+
+        alive = [z for z in zygotes.values() if z['proc'].poll() is None]
+        if len(alive) >= max_zygotes:
+            return None
+
+        zygote = start_zygote(python)
+        if zygote:
+            zygotes[python] = zygote
+        return zygote
+
+
+def spawn_from_zygote(python, script, cwd, log_path, env=None, max_zygotes=8, timeout=10,
+                      cgroup=None, limits=None):
+    """Fork a bot from a warm interpreter; returns its PID or None to fall back"""
+    zygote = get_zygote(python, max_zygotes)
+    if not zygote:
+        return None
+
+    request = {
+        'script': script,
+        'cwd': cwd,
+        'log': os.path.abspath(log_path),
+        'env': dict(os.environ) if env is None else env,
+        'cgroup': cgroup,
+        'limits': limits
+    }
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(zygote['socket'])
+            conn.sendall((json.dumps(request) + '\n').encode())
+            reply = json.loads(_read_line(conn))
+    except Exception as e:
+        logger.error(f"Zygote spawn failed for {script}: {e}")
+        return None
+
+    if 'error' in reply:
+        logger.error(f"Zygote rejected {script}: {reply['error']}")
+        return None
+
+    return reply['pid']
+
+
+def shutdown_zygotes():
+    """Stop all warm interpreters (running bots are unaffected)"""
+    with zygote_lock:
+        for zygote in zygotes.values():
+            if zygote['proc'].poll() is None:
+                zygote['proc'].terminate()
+        zygotes.clear()
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1], [m for m in sys.argv[2].split(',') if m] if len(sys.argv) > 2 else DEFAULT_PREIMPORTS)